@@ -81,6 +81,7 @@
 
 
 #Geral
+import joblib
 import pandas as pd
 import pathlib
 import numpy as np
@@ -89,6 +90,14 @@ import matplotlib.pyplot as plt
 import plotly.express as px
 import timeit
 
+#Projeto
+from carregamento import carregar_base
+from preparacao import limites, filtrar_outliers, ajustar_categorias, agrupar_categorias
+from preparacao import converter_moeda, contar_amenities, otimizar_tipos
+from preparacao import preparar_bases, limpar_base, separar_treino_teste, colunas_codificadas, PreparacaoAnuncios, PASTA_CACHE
+from modelagem import comparar_modelos, montar_hgb
+from perfil import PerfilExecucao, tabela_etapas
+
 #Machine Learning
 from sklearn.metrics import r2_score, mean_squared_error
 from sklearn.linear_model import LinearRegression
@@ -100,31 +109,51 @@ from sklearn.model_selection import train_test_split
 # 
 # Aqui é realizado o processo de consulta a pasta "dataset" e aos arquivos nela contidos. 
 # Todos os arquivos são lidos e agrupados em um unico DataFrame, mantendo a informação do Mês e Ano em que foram extraídas as informações.
+# 
+# A leitura é feita pelo módulo "carregamento.py". Cada arquivo é lido em blocos (chunks) e somente com as colunas usadas no projeto, já com seus tipos definidos. 
+# Os DataFrames de cada mês são agrupados com um único pd.concat no final, ao invés de um append a cada mês (que copiava a base inteira a cada arquivo).
+# 
+# Como cada arquivo é independente, eles são lidos em paralelo (um processo por arquivo). O número de processos pode ser ajustado com o parâmetro "n_processos".
+# 
+# As etapas mais demoradas do notebook (leitura, comparação dos modelos, seleção das features e exportação) são medidas com o módulo perfil.py: tempo, tempo de CPU, pico de memória e linhas de cada etapa. A tabela com as medições é exibida no final do notebook.
 
 # In[69]:
 
 
-#Dicionário dos meses do ano
-meses = {'jan': 1, 'fev': 2,'mar': 3,'abr': 4,'mai': 5,'jun': 6,'jul': 7,'ago': 8,'set': 9,'out': 10,'nov': 11,'dez': 12,}
 caminho_base = pathlib.Path('dataset')
 
-base_airbnb = pd.DataFrame()
-
-for arquivo in caminho_base.iterdir():
-    nome_mes = arquivo.name[:3]
-    mes = meses[nome_mes]
-    
-    ano = arquivo.name[-8:]
-    ano = int(ano.replace(".csv",""))
-    
-    df = pd.read_csv(caminho_base / arquivo.name) # <-- para o pathlib, usa-se a "/" para concatenar caminhos
-    df['Ano'] = ano
-    df['Mes'] = mes
-    base_airbnb = base_airbnb.append(df)
+perfil_notebook = PerfilExecucao('notebook')
+with perfil_notebook.etapa('leitura') as registro:
+    base_airbnb = carregar_base(caminho_base, n_processos=None, pasta_cache=PASTA_CACHE)
+    registro['linhas_saida'] = base_airbnb.shape[0]
     
 display(base_airbnb)
 
 
+# #### Atalho: bases tratadas em cache
+# 
+# A função preparar_bases (módulo preparacao.py) executa a mesma limpeza das próximas sessões e salva a base tratada (base_airbnb) em cache, no formato Parquet (pasta "cache"). O encoding não é salvo: as features são montadas direto da base tratada (ver sessão MACHINE LEARNING). 
+# O cache é identificado pelos nomes, tamanhos e datas de modificação dos arquivos da pasta "dataset" e pelos parâmetros de limpeza (preparacao.PARAMETROS_LIMPEZA).
+# Somente preparar_bases grava e lê esse cache: a base tratada passo a passo neste notebook não é salva nele.
+# 
+# Pode-se executar a célula abaixo e seguir direto para a sessão MACHINE LEARNING. Se nada mudou desde a última execução, as bases são lidas do cache. 
+# Caso um novo arquivo mensal seja adicionado, somente ele é lido do CSV; os demais meses são lidos do cache.
+
+# In[ ]:
+
+
+#base_airbnb = preparar_bases(caminho_base)
+
+
+# - Para medir o tempo de cada passo da limpeza (nulos, moeda, outliers, categorias, amenities e tipos), a mesma limpeza pode ser executada com a função limpar_base, informando o perfil:
+
+# In[ ]:
+
+
+#base_airbnb, _ = limpar_base(base_airbnb, perfil=perfil_notebook)
+#display(tabela_etapas(perfil_notebook.relatorio()))
+
+
 # #### Limpeza de atributos desnecessários
 
 # - Devido a quantidade de linhas e colunas dos dados, fica difícil ter uma visão clara e rápida de toda a perspectiva da tabela
@@ -175,9 +204,7 @@ colunas = ['space','id','listing_url','scrape_id','last_scraped','name','summary
            'number_of_reviews_ltm','calculated_host_listings_count_entire_homes',
            'calculated_host_listings_count_private_rooms','calculated_host_listings_count_shared_rooms']
 
-
-for col in colunas:
-    base_airbnb =  base_airbnb.drop(col, axis=1)
+# Essas colunas já não são lidas dos arquivos: o carregamento usa somente as colunas listadas em "carregamento.tipos_colunas"
 
 
 base_airbnb.info()
@@ -227,6 +254,9 @@ print(base_airbnb.isnull().sum())
 # - Problemas detectados:
 #     1. 'price' como texto ao invés de float
 #     2. 'extra_people' como texto ao invés de float
+# 
+# A conversão é feita pela função "converter_moeda" (módulo preparacao.py), que transforma valores como "$1,234.00" em float32 em uma única passada, sem criar colunas de texto intermediárias. 
+# Os valores que não puderem ser convertidos ficam como NaN e são retornados para conferência.
 
 # In[76]:
 
@@ -234,17 +264,13 @@ print(base_airbnb.isnull().sum())
 print(base_airbnb.iloc[0]) # imprime a primeira linha pra ajuda na analise
 
 #-------------------------------------------------------------------------------#
-base_airbnb['price'] = base_airbnb['price'].astype(str)
+base_airbnb['price'], invalidos = converter_moeda(base_airbnb['price'])
+print('price - valores não convertidos: {}'.format(len(invalidos)))
 
-base_airbnb['price'] = base_airbnb['price'].str.replace('$','')
-base_airbnb['price'] = base_airbnb['price'].str.replace(',','')
-base_airbnb['price'] = base_airbnb['price'].astype(np.float32, copy=False)
+base_airbnb['extra_people'], invalidos = converter_moeda(base_airbnb['extra_people'])
+print('extra_people - valores não convertidos: {}'.format(len(invalidos)))
 
-base_airbnb['extra_people'] = base_airbnb['extra_people'].astype(str)
-
-base_airbnb['extra_people'] = base_airbnb['extra_people'].str.replace('$','')
-base_airbnb['extra_people'] = base_airbnb['extra_people'].str.replace(',','')
-base_airbnb['extra_people'] = base_airbnb['extra_people'].astype(np.float32, copy=False)
+base_airbnb = base_airbnb.dropna(subset=['price', 'extra_people'])
 
 
 print(base_airbnb.dtypes) # Cria uma lista com os tipos de dados
@@ -292,13 +318,15 @@ sns.heatmap(base_airbnb.corr(), annot=True, cmap='Greens')
 
 
 # define os limites de uma coluna do DF
-def limites(coluna):
-    q1 = coluna.quantile(0.25)
-    q3 = coluna.quantile(0.75)
-    amplitude = q3-q1
-    limite_inferior = q1-1.5*amplitude
-    limite_superior = q3+1.5*amplitude
-    return (limite_inferior, limite_superior)
+# A função "limites" está no módulo preparacao.py, pois também é usada no tratamento da base fora do notebook:
+#
+# def limites(coluna):
+#     q1 = coluna.quantile(0.25)
+#     q3 = coluna.quantile(0.75)
+#     amplitude = q3-q1
+#     limite_inferior = q1-1.5*amplitude
+#     limite_superior = q3+1.5*amplitude
+#     return (limite_inferior, limite_superior)
 
 
 # ### Criando função de definição e criação de gráfico para análise dos limites
@@ -350,13 +378,19 @@ histograma(base_airbnb['price'])
 
 # Determinar função de exclusão de outliers
 # Retornará um dataframe sem outliers e o num de linhas excluidas
-
-def excluir_outliers(df, nome_coluna):
-    qtd_linhas = df.shape[0]
-    lim_inf, lim_sup = limites(df[nome_coluna])    
-    df = df.loc[(df[nome_coluna]>=lim_inf) & (df[nome_coluna]<=lim_sup) , :]  # --> Pra filtrar usamos:  df.loc[linhas, colunas] 
-    linhas_removidas = qtd_linhas-df.shape[0]
-    return (df, linhas_removidas)
+# Assim como "limites", a função está no módulo preparacao.py:
+#
+# def excluir_outliers(df, nome_coluna):
+#     qtd_linhas = df.shape[0]
+#     lim_inf, lim_sup = limites(df[nome_coluna])    
+#     df = df.loc[(df[nome_coluna]>=lim_inf) & (df[nome_coluna]<=lim_sup) , :]  # --> Pra filtrar usamos:  df.loc[linhas, colunas] 
+#     linhas_removidas = qtd_linhas-df.shape[0]
+#     return (df, linhas_removidas)
+#
+# Como serão avaliadas várias colunas, ao invés de gerar uma nova cópia filtrada da base a cada coluna, 
+# usaremos a função "filtrar_outliers" (também no módulo preparacao.py). Ela retorna uma máscara (True para as linhas mantidas) 
+# e um relatório com os limites e a quantidade de linhas removidas. A cada coluna avaliada a máscara é atualizada, 
+# e a base só é filtrada uma vez, ao final da análise das colunas.
 
 
 # ### Removendo os outliers
@@ -373,14 +407,14 @@ def excluir_outliers(df, nome_coluna):
 # In[82]:
 
 
-base_airbnb, qtd_linhas = excluir_outliers(base_airbnb, 'price')
+mascara, relatorio = filtrar_outliers(base_airbnb, ['price'])
 
 
 # In[83]:
 
 
-print('Linhas removidas: {}'.format(qtd_linhas))
-base_airbnb.info()
+print('Linhas removidas: {}'.format(relatorio.loc['price', 'linhas_removidas']))
+print('Linhas restantes: {}'.format(mascara.sum()))
 
 
 # Após a exclusão dos outliers, reduzimos nossa base em aproximadamente 10% de seu tamanho original. Ainda que seja um valor considerável (mais de 87 mil itens), dado nossa população de mais de 800 mil registros e o objetivo final que é construir uma solução que permita prever os preços dos imóveis AirBnB na cidade do Rio de Janeiro, excluindo os itens de super luxo, então tornou a decisão de excluir estes registros como aceitável para o correto treinamento do algoritmo.
@@ -388,7 +422,7 @@ base_airbnb.info()
 # In[84]:
 
 
-histograma(base_airbnb['price'])
+histograma(base_airbnb.loc[mascara, 'price'])
 
 
 # #### extra_people
@@ -397,17 +431,15 @@ histograma(base_airbnb['price'])
 
 
 # Primeiro passo: Avaliar a distribuição das informações
-diagrama_caixa(base_airbnb['extra_people'])
-histograma(base_airbnb['extra_people'])
+diagrama_caixa(base_airbnb.loc[mascara, 'extra_people'])
+histograma(base_airbnb.loc[mascara, 'extra_people'])
 
 
 # In[86]:
 
 
-base_airbnb_previa, qtd_linhas = excluir_outliers(base_airbnb, 'extra_people')
-print('Linhas removidas: {}'.format(qtd_linhas))
-
-base_airbnb = base_airbnb_previa
+mascara, relatorio = filtrar_outliers(base_airbnb, ['extra_people'], mascara=mascara)
+print('Linhas removidas: {}'.format(relatorio.loc['extra_people', 'linhas_removidas']))
 
 
 # Com a remoção dos outliers do campo "extra_people" foram excluídos 59.194 registros da nossa análise. 
@@ -419,8 +451,8 @@ base_airbnb = base_airbnb_previa
 # In[87]:
 
 
-diagrama_caixa(base_airbnb['host_listings_count'])
-grafico_barra(base_airbnb['host_listings_count'])
+diagrama_caixa(base_airbnb.loc[mascara, 'host_listings_count'])
+grafico_barra(base_airbnb.loc[mascara, 'host_listings_count'])
 
 
 # Removemos os clientes com mais de 6 imóveis pois esse perfil de cliente não fará parte do escopo do nosso projto inicialmente. Pessoas com mais de 6 propriedades podem representar 
@@ -428,9 +460,8 @@ grafico_barra(base_airbnb['host_listings_count'])
 # In[88]:
 
 
-base_airbnb_previa, qtd_linhas = excluir_outliers(base_airbnb, 'host_listings_count')
-print('Linhas removidas: {}'.format(qtd_linhas))
-base_airbnb = base_airbnb_previa
+mascara, relatorio = filtrar_outliers(base_airbnb, ['host_listings_count'], mascara=mascara)
+print('Linhas removidas: {}'.format(relatorio.loc['host_listings_count', 'linhas_removidas']))
 
 
 # #### accommodates
@@ -438,17 +469,15 @@ base_airbnb = base_airbnb_previa
 # In[89]:
 
 
-diagrama_caixa(base_airbnb['accommodates'])
-grafico_barra(base_airbnb['accommodates'])
+diagrama_caixa(base_airbnb.loc[mascara, 'accommodates'])
+grafico_barra(base_airbnb.loc[mascara, 'accommodates'])
 
 
 # In[90]:
 
 
-base_airbnb_previa, qtd_linhas = excluir_outliers(base_airbnb, 'accommodates')
-print('Linhas removidas: {}'.format(qtd_linhas))
-
-base_airbnb = base_airbnb_previa
+mascara, relatorio = filtrar_outliers(base_airbnb, ['accommodates'], mascara=mascara)
+print('Linhas removidas: {}'.format(relatorio.loc['accommodates', 'linhas_removidas']))
 
 
 # #### bathrooms
@@ -456,17 +485,15 @@ base_airbnb = base_airbnb_previa
 # In[91]:
 
 
-diagrama_caixa(base_airbnb['bathrooms'])
-histograma(base_airbnb['bathrooms'])
+diagrama_caixa(base_airbnb.loc[mascara, 'bathrooms'])
+histograma(base_airbnb.loc[mascara, 'bathrooms'])
 
 
 # In[92]:
 
 
-base_airbnb_previa, qtd_linhas = excluir_outliers(base_airbnb, 'bathrooms')
-print('Linhas removidas: {}'.format(qtd_linhas))
-
-base_airbnb = base_airbnb_previa
+mascara, relatorio = filtrar_outliers(base_airbnb, ['bathrooms'], mascara=mascara)
+print('Linhas removidas: {}'.format(relatorio.loc['bathrooms', 'linhas_removidas']))
 
 
 # #### bedrooms
@@ -474,17 +501,15 @@ base_airbnb = base_airbnb_previa
 # In[93]:
 
 
-diagrama_caixa(base_airbnb['bedrooms'])
-grafico_barra(base_airbnb['bedrooms'])
+diagrama_caixa(base_airbnb.loc[mascara, 'bedrooms'])
+grafico_barra(base_airbnb.loc[mascara, 'bedrooms'])
 
 
 # In[94]:
 
 
-base_airbnb_previa, qtd_linhas = excluir_outliers(base_airbnb, 'bedrooms')
-print('Linhas removidas: {}'.format(qtd_linhas))
-
-base_airbnb = base_airbnb_previa
+mascara, relatorio = filtrar_outliers(base_airbnb, ['bedrooms'], mascara=mascara)
+print('Linhas removidas: {}'.format(relatorio.loc['bedrooms', 'linhas_removidas']))
 
 
 # #### beds
@@ -492,17 +517,19 @@ base_airbnb = base_airbnb_previa
 # In[95]:
 
 
-diagrama_caixa(base_airbnb['beds'])
-grafico_barra(base_airbnb['beds'])
+diagrama_caixa(base_airbnb.loc[mascara, 'beds'])
+grafico_barra(base_airbnb.loc[mascara, 'beds'])
 
 
 # In[96]:
 
 
-base_airbnb_previa, qtd_linhas = excluir_outliers(base_airbnb, 'beds')
-print('Linhas removidas: {}'.format(qtd_linhas))
+mascara, relatorio = filtrar_outliers(base_airbnb, ['beds'], mascara=mascara)
+print('Linhas removidas: {}'.format(relatorio.loc['beds', 'linhas_removidas']))
 
-base_airbnb = base_airbnb_previa
+# Aplicando a máscara: a base é filtrada uma única vez, com todas as colunas avaliadas
+base_airbnb = base_airbnb.loc[mascara, :]
+print(base_airbnb.shape)
 
 
 # #### number_of_reviews
@@ -550,22 +577,21 @@ def avaliar_categorias(coluna):
     grafico.tick_params(axis='x', rotation=90)
     
 #Função que faz a mudança de valores abaixo de um limiar para "OUTROS"
-def ajuste_categorias(coluna, limiar):
-    base_count = base_airbnb[coluna].value_counts()
-    colunas_agrupar = []
-    base_count.index
-
-    for tipo in base_count.index:
-        if base_count[tipo]<limiar:
-            colunas_agrupar.append(tipo)
+# As categorias mantidas de cada coluna ficam guardadas em "categorias_mantidas", para que o mesmo agrupamento 
+# possa ser aplicado em novos dados (funções ajustar_categorias e agrupar_categorias do módulo preparacao.py)
+categorias_mantidas = {}
 
+def ajuste_categorias(base, coluna, limiar):
+    categorias_mantidas[coluna] = ajustar_categorias(base[coluna], limiar)
+    
+    colunas_agrupar = [tipo for tipo in base[coluna].unique() if tipo not in categorias_mantidas[coluna]]
     print(colunas_agrupar)
     print('-'*100)  
 
-    for tipo in colunas_agrupar:
-        base_airbnb.loc[base_airbnb[coluna]== tipo, coluna] = 'Outros'
+    base = agrupar_categorias(base, coluna, categorias_mantidas[coluna])
 
-    print(base_airbnb[coluna].value_counts())
+    print(base[coluna].value_counts())
+    return base
 
 
 # #### property_type
@@ -579,7 +605,7 @@ avaliar_categorias('property_type')
 # In[104]:
 
 
-ajuste_categorias('property_type', 2000)
+base_airbnb = ajuste_categorias(base_airbnb, 'property_type', 2000)
 
 
 # #### room_type
@@ -601,7 +627,7 @@ avaliar_categorias('bed_type')
 # In[107]:
 
 
-ajuste_categorias('bed_type', 10000)
+base_airbnb = ajuste_categorias(base_airbnb, 'bed_type', 10000)
 
 
 # #### amenities
@@ -613,7 +639,11 @@ ajuste_categorias('bed_type', 10000)
 print(base_airbnb['amenities'].iloc[1].split(','))
 print(len(base_airbnb['amenities'].iloc[1].split(',')))
 
-base_airbnb['numero_amenities'] = base_airbnb['amenities'].str.split(',').apply(len)
+# A contagem é feita pelas vírgulas de cada texto (função "contar_amenities" do módulo preparacao.py), 
+# sem criar uma lista para cada linha. Imóveis sem amenities ("{}") ficam com 0.
+# ATENÇÃO!!! Na versão anterior deste notebook, "{}" contava como 1 amenity (o str.split(',') de "{}" tem um item). 
+# O modelo exportado com a contagem antiga deve ser treinado e exportado novamente (preparacao.VERSAO_MODELO).
+base_airbnb['numero_amenities'] = contar_amenities(base_airbnb['amenities'])
 
 
 # In[110]:
@@ -644,10 +674,10 @@ grafico_barra(base_airbnb['numero_amenities'])
 # In[125]:
 
 
-base_airbnb_previa, qtd_linhas = excluir_outliers(base_airbnb, 'numero_amenities')
-print('Linhas removidas: {}'.format(qtd_linhas))
+mascara, relatorio = filtrar_outliers(base_airbnb, ['numero_amenities'])
+print('Linhas removidas: {}'.format(relatorio.loc['numero_amenities', 'linhas_removidas']))
 
-base_airbnb = base_airbnb_previa
+base_airbnb = base_airbnb.loc[mascara, :]
 
 
 # ### Tratamento dos dados de mapas (latitude e longitude)
@@ -692,29 +722,45 @@ grafico.show()
 # a2  0 | 1 | 0<br>
 # 
 
-# In[127]:
+# *Otimização de memória*
+# 
+# Antes do encoding, os tipos das colunas são ajustados para ocupar menos memória (função "otimizar_tipos" do módulo preparacao.py):
+# 
+# - Colunas "t"/"f" viram bool
+# - Colunas textuais com poucos valores distintos (property_type, room_type, bed_type) viram category
+# - Quantidades (accommodates, bedrooms, beds, etc.) viram o menor tipo inteiro que comporta os valores
+
+# In[ ]:
 
 
-#Alterando os valores booleanos
 colunas_boolean = ['host_is_superhost','instant_bookable' ]
 
-base_airbnb_cod = base_airbnb.copy()
+base_airbnb, relatorio_memoria = otimizar_tipos(base_airbnb, colunas_boolean)
 
-for coluna in colunas_boolean:
-    base_airbnb_cod.loc[base_airbnb_cod[coluna]=='t' , coluna]= 1
-    base_airbnb_cod.loc[base_airbnb_cod[coluna]=='f' , coluna]= 0
+display(relatorio_memoria)
+print('Memória antes: {:.1f} MB'.format(relatorio_memoria['memoria_antes'].sum() / 1024**2))
+print('Memória depois: {:.1f} MB'.format(relatorio_memoria['memoria_depois'].sum() / 1024**2))
 
 
-# In[128]:
+# In[127]:
+
+
+#Alterando os valores booleanos e categóricos
+# As colunas booleanas viram 1 / 0 e as categóricas viram variáveis dummies ("coluna_valor"), como no pd.get_dummies.
+# O encoding não é feito em uma cópia da base: o pré-processamento (PreparacaoAnuncios, do módulo preparacao.py)
+# escreve as features direto da base tratada, na montagem da matriz de treino e no deploy.
+# Aqui ficam somente os nomes das colunas do encoding, na mesma ordem que o pd.get_dummies geraria
 
+colunas_x = colunas_codificadas(base_airbnb)
+print(list(colunas_x))
 
-# Alterando valores categóricos
-colunas_categorias = ['property_type','room_type','bed_type']
 
-# Usando o método do Pandas, torna-se fácil a criação das variáveis dummies
-base_airbnb_cod = pd.get_dummies(data=base_airbnb_cod, columns=colunas_categorias)
+# In[128]:
+
 
-print(base_airbnb_cod.iloc[1])
+# Conferindo o encoding de um anúncio
+preparacao_x = PreparacaoAnuncios(colunas=tuple(colunas_x)).fit(base_airbnb)
+print(preparacao_x.transform(base_airbnb.iloc[[1]]).iloc[0])
 
 
 # # MACHINE LEARNING
@@ -842,6 +888,7 @@ def avaliar_modelo(nome_modelo, y_teste, previsao):
 #     1. RandomForest
 #     2. LinearRegression
 #     3. ExtraTree
+#     4. HistGradientBoosting (usa property_type, room_type e bed_type diretamente, sem dummies)
 
 # In[130]:
 
@@ -860,26 +907,43 @@ modelos = {'RandomForest':modelo_rf,
 # In[131]:
 
 
-y = base_airbnb_cod['price']
-x = base_airbnb_cod.drop('price', axis=1)
-
-x_train, x_test, y_train, y_test = train_test_split(x, y, random_state=10)
+# As features (colunas_x) são escritas direto da base tratada em uma única matriz float32 (preparacao.separar_treino_teste),
+# já na ordem treino + teste: x_train e x_test são partes da mesma matriz, sem a base com encoding, o drop('price')
+# e as cópias do train_test_split. A separação é a mesma de train_test_split(x, y, random_state=10)
+# Para comparar o pico de memória: python -m benchmark.memoria_treino
+x_train, x_test, y_train, y_test = separar_treino_teste(base_airbnb, colunas_x, semente=10)
 
 
 # In[132]:
 
 
-for nome_modelo, modelo in modelos.items():
-    inicio = timeit.default_timer()
+# Os modelos são treinados em paralelo (um processo por modelo, árvores divididas entre os núcleos restantes),
+# sempre com a mesma semente. A tabela mostra o R², o RSME, os tempos de treino e previsão (s),
+# o aumento de memória durante o treino e o tamanho do arquivo de cada modelo (MB)
+# Cada processo salva o seu modelo treinado na pasta "cache/modelos", de onde os modelos são lidos
+with perfil_notebook.etapa('comparacao_modelos', x_train.shape[0]):
+    resultados_modelos, caminhos_modelos = comparar_modelos(modelos, x_train, y_train, x_test, y_test,
+                                                            pasta_modelos=PASTA_CACHE / 'modelos')
+
+# O HistGradientBoosting (modelagem.montar_hgb) é um Pipeline que recebe a base tratada sem encoding, como no deploy.
+# É treinado e avaliado com as mesmas linhas de x_train e x_test
+modelo_hgb = montar_hgb(base_airbnb.columns.drop('price'))
+with perfil_notebook.etapa('comparacao_hgb', x_train.shape[0]):
+    resultados_hgb, caminhos_hgb = comparar_modelos({'HistGradientBoosting': modelo_hgb},
+                                                    base_airbnb.loc[x_train.index], y_train,
+                                                    base_airbnb.loc[x_test.index], y_test,
+                                                    pasta_modelos=PASTA_CACHE / 'modelos')
+resultados_modelos = pd.concat([resultados_modelos, resultados_hgb])
+caminhos_modelos.update(caminhos_hgb)
+
+modelos = {nome_modelo: joblib.load(caminho) for nome_modelo, caminho in caminhos_modelos.items()}
+modelo_rf, modelo_lr, modelo_et = modelos['RandomForest'], modelos['LinearRegression'], modelos['ExtraTrees']
+modelo_hgb = modelos['HistGradientBoosting']
 
-    #treinar
-    modelo.fit(x_train, y_train)
-    
-    #testar
-    previsao = modelo.predict(x_test)
-    print(avaliar_modelo(nome_modelo, y_test, previsao))
-    fim = timeit.default_timer()
-    print ('duracao: %f' % (fim - inicio))
+for nome_modelo, modelo in modelos.items():
+    x_avaliacao = base_airbnb.loc[x_test.index] if nome_modelo == 'HistGradientBoosting' else x_test
+    print(avaliar_modelo(nome_modelo, y_test, modelo.predict(x_avaliacao)))
+display(resultados_modelos)
 
 
 # **Resultado da avaliação dos modelos**
@@ -919,8 +983,9 @@ for nome_modelo, modelo in modelos.items():
 
 #print(modelo_et.feature_importances_)
 
-def desenha_grafico_feature(modelo, x_train):   
-    importancia_features = pd.DataFrame(modelo.feature_importances_, x_train.columns )
+# colunas: features usadas no treino do modelo, na mesma ordem
+def desenha_grafico_feature(modelo, colunas):   
+    importancia_features = pd.DataFrame(modelo.feature_importances_, colunas)
     importancia_features = importancia_features.sort_values(by=0, ascending=False)
     
     plt.figure(figsize=(15,5))
@@ -929,7 +994,7 @@ def desenha_grafico_feature(modelo, x_train):
     return importancia_features
 
 
-importancia_features = desenha_grafico_feature(modelo_et, x_train)
+importancia_features = desenha_grafico_feature(modelo_et, x_train.columns)
 display(importancia_features)
 
 
@@ -944,42 +1009,8 @@ display(importancia_features)
 # 
 
 # ### Ajustes finais do modelo
-
-# In[134]:
-
-
-# Metodo de treino e teste do modelo selecionado
-def testar_modelo(nome_modelo, modelo, base, r ): 
-    y = base['price']
-    x = base.drop('price', axis=1)
-    x_train, x_test, y_train, y_test = train_test_split(x, y, random_state=r)
-    
-    inicio = timeit.default_timer()
-
-    #treinar
-    modelo.fit(x_train, y_train)
-    
-    #testar
-    previsao = modelo.predict(x_test)
-    print(avaliar_modelo(nome_modelo, y_test, previsao))
-    fim = timeit.default_timer()
-    print ('duracao: %f' % (fim - inicio))
-    print(f'num_features: {base_otimizada.shape[1]}')
-    
-    return (x_train, x, y)
-
-
-# In[135]:
-
-
-#Remoção dos atributos com relevância menor que 1%
-base_otimizada = base_airbnb_cod.drop(importancia_features.loc[importancia_features[0]<0.01].index, axis=1)
-
-#Treinar o melhor modelo na pase reduzida e otimizada.
-novo_x_train, novo_x, novo_y = testar_modelo('ExtraTrees', modelo_et, base_otimizada, 10)
-
-
-# **Comparação de resultados entre algoritmos**
+# 
+# Em uma versão anterior do projeto, os ajustes eram feitos à mão, treinando o ExtraTrees com a base inteira a cada rodada:
 # 
 # 1. ExtraTreesRegressor - Base Original<br>
 #     - R²: 97.51%
@@ -987,65 +1018,68 @@ novo_x_train, novo_x, novo_y = testar_modelo('ExtraTrees', modelo_et, base_otimi
 #     - duracao: 269.343048
 #     - num_features: 36<br>
 #     <br>
-# 2. ExtraTreesRegressor  -Base Otimizada<br>
+# 2. ExtraTreesRegressor - Base Otimizada (remoção dos atributos com relevância menor que 1%)<br>
 #     - R²: 97.41%
 #     - RSME: 42.69
 #     - duracao: 191.168789
-#     - num_features: 18
+#     - num_features: 18<br>
+#     <br>
+# 3. ExtraTreesRegressor - Otimização v2 (remoção das dummies que ficaram "fracionadas" e de 'host_is_superhost')<br>
+#     - R²: 97.27%
+#     - RSME: 43.79
+#     - duracao: 139.266511
+#     - num_features: 12
 # 
 # <br>
 # 
 # **Considerações**
 # 
-# Visto que ao remover features com menos de 1% de relevância, resultou em uma avaliação bem próxima ao modelo original, porém com uma grande diferença no tamanho da base (36 original para 18 na base otimizada) configurando uma redução de 50% de atributos avaliados e de mais de 30% no tempo de execução, **considera-se o modelo otimizado como melhor opção**
-
-# In[136]:
-
-
-importancia_features = desenha_grafico_feature(modelo_et, novo_x_train)
-display(importancia_features)
-
+# Ao remover as features com menos de 1% de relevância, a avaliação ficou bem próxima à do modelo original, com metade dos atributos e mais de 30% a menos no tempo de execução. Com 12 features, o R² se manteve, em um modelo mais simples.
 
 # ### ATENÇÃO!!!
 # 
 # Ainda que o algoritmo tenha se mostrado mais rápido e com o mesmo nível de eviciência, precisamos nos atentar ao fato de que não podemos eliminar somente parte de atributos "dummie" ou seja, itens como property_type, room_type, etc, não devem ser "partcialmente" eliminados. A recomendação neste caso, seria agrupar os outros itens que não tiveram relevância sob a algunha de "OUTROS" ou estratégia semelhante. Também é possível remover todo o elemento, ficando a critério da análise julgar se é viável ou não.
 # 
 
-# ### Otimização v2
-# 
-# Vamos testar eliminando as colunas que ficaram "fracionadas" após nossa ultima alteração.
-# Também será aproveitado para remover o elemento 'host_is_superhost'. Ainda que a remoção de  vários atributos de uma vez não seja o recomendado. Neste caso já foram realizados estudos anteriores que sugerem que essa remoção não causará problemas ao nosso modelo
+# - Seleção automática das features
 # 
+# A mesma análise é feita sem treinar o modelo com a base inteira a cada rodada (módulo selecao.py):
+# em uma amostra da base de treino, a feature de menor importância (por permutação) é removida uma a uma,
+# formando a curva do R² conforme as features são removidas. As dummies de uma mesma coluna são removidas juntas.
+# O conjunto escolhido é o menor com R² a até 0,5 ponto percentual do melhor, e somente o modelo final
+# é treinado com a base de treino inteira. Esse é o modelo exportado para o deploy.
 
-# In[138]:
+# In[134]:
 
 
-base_otimizada = base_otimizada.drop(['room_type_Entire home/apt','property_type_Apartment'], axis=1)
-base_otimizada = base_otimizada.drop('host_is_superhost', axis=1)
+from selecao import selecionar_e_treinar
 
-novo_x_train, novo_x, novo_y = testar_modelo('ExtraTrees', modelo_et, base_otimizada, 10)
-display(desenha_grafico_feature(modelo_et, novo_x_train))
+with perfil_notebook.etapa('selecao_features', x_train.shape[0]):
+    features_selecionadas, curva_features, modelo_selecionado, resultado_selecao = selecionar_e_treinar(
+        x_train, y_train, x_test, y_test)
+display(curva_features.drop(columns='features'))
+print(f'Features escolhidas ({len(features_selecionadas)}): {features_selecionadas}')
+# Ranking das features (as dummies de uma coluna juntas), do mais importante ao menos importante
+print(f"Ranking: {resultado_selecao['ranking']}")
+print(resultado_selecao)
 
+plt.figure(figsize=(15,5))
+ax = sns.lineplot(x=curva_features['n_features'], y=curva_features['r2'], marker='o')
+ax.invert_xaxis()
+
+
+# In[135]:
+
+
+importancia_features = desenha_grafico_feature(modelo_selecionado, pd.Index(features_selecionadas))
+display(importancia_features)
 
-# #### Consideração da Otimização v2
-# 
-# Ao testar nosso modelo, obtivemos os seguintes resultados:<br>
-# 
-# Modelo: ExtraTrees<br>
-# R²: 97.27%<br>
-# RSME: 43.79<br>
-# duracao: 139.266511<br>
-# num_features: 12<br>
-# <br>
-# Como pode-se observar, com 12 features conseguimos manter o R² e diminuir o RSME, sendo um modelo mais simples e com melhor previsão do que as versões anteriores. 
-# 
-# 
 
 # # Deploy do projeto
 # 
 # **Passo a Passo do deploy**
 # 
-# 1. Criar arquivo do modelo joblib
+# 1. Criar arquivo do modelo joblib (modelo + pré-processamento em um único Pipeline)
 # 2. Escolher a forma de deploy:
 #     - Apresentação por meio do Streamlit
 #     - Repositório do Github
@@ -1060,10 +1094,37 @@ display(desenha_grafico_feature(modelo_et, novo_x_train))
 
 
 import joblib
+from preparacao import montar_pipeline
+from floresta_plana import exportar_modelo_mmap
+
+# Modelo exportado: 'ExtraTrees' (com as features da seleção automática) ou 'HistGradientBoosting' (da comparação de modelos)
+# A página do deploy pede as entradas do modelo exportado (servico.entradas_modelo): as features escolhidas na seleção
+# ou, no HistGradientBoosting, também as colunas property_type, room_type e bed_type
+modelo_deploy = 'ExtraTrees'
+
+# O modelo é salvo junto com o pré-processamento, em um Pipeline do scikit-learn.
+# O pré-processamento (PreparacaoAnuncios, do módulo preparacao.py) recebe os dados no formato original 
+# (t/f ou Sim/Não, valores como "$10.00", etc.) e monta as features sempre na mesma ordem usada no treino (features_selecionadas).
+# Assim, o deploy não precisa reproduzir o tratamento dos dados nem se preocupar com a ordem das colunas.
+if modelo_deploy == 'HistGradientBoosting':
+    # O HistGradientBoosting já foi treinado como Pipeline, com o pré-processamento
+    pipeline = modelo_hgb
+else:
+    pipeline = montar_pipeline(modelo_selecionado, base_airbnb, features_selecionadas)
+
+    # Conferindo: o Pipeline, recebendo a base sem encoding, deve prever o mesmo que o modelo
+    amostra_teste = x_test[features_selecionadas].sample(n=1000, random_state=10)
+    print(np.allclose(pipeline.predict(base_airbnb.loc[amostra_teste.index]), modelo_selecionado.predict(amostra_teste)))
 
 # Salva o modelo treinado em um arquivo para utilização futura.
 #Com isso, dispensamos a necessidade de realizar o treinamento novamente.
-joblib.dump(modelo_et, 'deploy/modelo.joblib')
+# 
+# As árvores são salvas como arrays contínuos (FlorestaPlana, módulo floresta_plana.py), em um arquivo sem compressão.
+# No deploy, o arquivo é carregado com mmap_mode='r': a carga é quase instantânea e os processos do servidor 
+# compartilham a memória do modelo, ao invés de cada um ter sua própria cópia.
+# Para medir: python -m benchmark.memoria_modelo deploy/modelo.joblib --processos 4
+with perfil_notebook.etapa('exportacao'):
+    exportar_modelo_mmap(pipeline, 'deploy/modelo.joblib')
 
 
 # # Fim do projeto de Ciência de Dados
@@ -1076,7 +1137,16 @@ joblib.dump(modelo_et, 'deploy/modelo.joblib')
 
 
 # Nossa lista de features final
-novo_x.columns
+features_selecionadas
+
+
+# - Tempo, tempo de CPU, pico de memória e linhas das etapas medidas no notebook. O relatório é gravado em "cache/perfil", junto com os relatórios do treino.py e do benchmark
+
+# In[142]:
+
+
+display(tabela_etapas(perfil_notebook.relatorio())[['linhas_entrada', 'linhas_saida', 'tempo_s', 'cpu_s', 'pico_rss_mb']].round(3))
+print('Relatório: {}'.format(perfil_notebook.salvar()))
 
 
 # In[ ]:
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# API HTTP de previsão (ASGI), sem interface, para ser usada junto com o WebApp do Streamlit.
+#
+# Rotas:
+#     POST /predict       -> um anúncio (objeto JSON)            -> {"preco": 123.45}
+#     POST /predict/lote  -> vários anúncios (lista de objetos)  -> {"precos": [...], "erros": [...]}
+#     GET  /saude         -> modelo carregado e contadores das previsões e do cache
+#
+# Os anúncios usam as mesmas colunas do arquivo da precificação em lote (ver lote.py).
+#
+# O modelo é carregado uma única vez pelo servico.carregar_modelo e compartilhado por todas as requisições.
+# Requisições que chegam quase ao mesmo tempo são agrupadas (micro-lotes): o pré-processamento e a previsão são
+# feitos uma única vez para todos os anúncios do lote. O lote roda em uma thread separada, então o servidor
+# continua recebendo requisições enquanto o modelo calcula.
+#
+# Anúncios já previstos são respondidos pelo cache de previsões (ver cache_previsoes.py), sem passar pelo modelo.
+# O cache é configurado pelas variáveis de ambiente CACHE_TAMANHO, CACHE_VALIDADE (segundos) e CACHE_CASAS_DECIMAIS.
+#
+# Uso:
+#     uvicorn api:app --port 8000
+#     python api.py --porta 8000
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache_previsoes import CASAS_DECIMAIS, TAMANHO_CACHE, VALIDADE_CACHE, CachePrevisoes
+from lote import coagir_lote, colunas_entrada
+from servico import CAMINHO_MODELO, carregar_modelo
+
+
+# Tempo máximo que uma previsão espera por outras para formar um lote, em segundos
+ESPERA_LOTE = 0.002
+# Quantidade máxima de anúncios em uma chamada ao modelo
+TAMANHO_MAXIMO_LOTE = 10000
+
+
+class ErroRequisicao(Exception):
+
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+# Agrupa as previsões pedidas quase ao mesmo tempo em uma única chamada ao modelo
+# O pré-processamento também é feito uma vez por lote, já que custa mais que a previsão de poucos anúncios
+class AgrupadorPrevisoes:
+
+    def __init__(self, caminho_modelo=CAMINHO_MODELO, espera=ESPERA_LOTE, tamanho_maximo=TAMANHO_MAXIMO_LOTE,
+                 cache=None):
+        self.caminho_modelo = caminho_modelo
+        self.cache = cache
+        self.espera = espera
+        self.tamanho_maximo = tamanho_maximo
+        self.fila = None
+        self.tarefa = None
+        self.contadores = {'requisicoes': 0, 'anuncios': 0, 'lotes': 0}
+
+    def iniciar(self):
+        self.fila = asyncio.Queue()
+        self.tarefa = asyncio.get_running_loop().create_task(self.processar())
+
+    async def parar(self):
+        if self.tarefa is None:
+            return
+        self.tarefa.cancel()
+        try:
+            await self.tarefa
+        except asyncio.CancelledError:
+            pass
+        self.fila, self.tarefa = None, None
+
+    # anuncios: lista de dicts. Retorna (precos, erros), um item por anúncio
+    async def prever(self, anuncios):
+        # Sem o lifespan (uvicorn --lifespan off), a fila é criada na primeira previsão
+        if self.tarefa is None or self.tarefa.done():
+            self.iniciar()
+        futuro = asyncio.get_running_loop().create_future()
+        await self.fila.put((anuncios, futuro))
+        return await futuro
+
+    async def processar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pedidos = [await self.fila.get()]
+            linhas = len(pedidos[0][0])
+            limite = loop.time() + self.espera
+            while linhas < self.tamanho_maximo:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    pedido = await asyncio.wait_for(self.fila.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+                pedidos.append(pedido)
+                linhas += len(pedido[0])
+
+            # Anúncios com as mesmas colunas são processados juntos
+            grupos = {}
+            for pedido in pedidos:
+                colunas = frozenset().union(*pedido[0])
+                grupos.setdefault(colunas, []).append(pedido)
+
+            for grupo in grupos.values():
+                try:
+                    resultado = await loop.run_in_executor(None, self.prever_lote,
+                                                           [anuncios for anuncios, _ in grupo])
+                except Exception as erro:
+                    for _, futuro in grupo:
+                        if not futuro.done():
+                            futuro.set_exception(erro)
+                    continue
+                for (_, futuro), precos_erros in zip(grupo, resultado):
+                    if not futuro.done():
+                        futuro.set_result(precos_erros)
+
+            self.contadores['requisicoes'] += len(pedidos)
+            self.contadores['anuncios'] += linhas
+            self.contadores['lotes'] += len(grupos)
+
+    # Pré-processa e prevê os anúncios de várias requisições juntos. Retorna (precos, erros) de cada requisição
+    def prever_lote(self, pedidos):
+        anuncios = [anuncio for pedido in pedidos for anuncio in pedido]
+        modelo = carregar_modelo(self.caminho_modelo)
+        x, validas, erros = preparar_anuncios(anuncios, modelo)
+        precos = np.full(len(anuncios), np.nan)
+        if validas.any() and self.cache is not None:
+            precos[validas] = self.cache.prever(modelo.steps[-1][1], x)
+        elif validas.any():
+            precos[validas] = modelo.steps[-1][1].predict(x)
+        precos = [None if np.isnan(preco) else round(float(preco), 2) for preco in precos]
+
+        resultado, inicio = [], 0
+        for pedido in pedidos:
+            resultado.append((precos[inicio:inicio + len(pedido)], erros[inicio:inicio + len(pedido)]))
+            inicio += len(pedido)
+        return resultado
+
+
+# CACHE_TAMANHO=0 desliga o cache de previsões
+cache = CachePrevisoes(tamanho_maximo=int(os.environ.get('CACHE_TAMANHO', TAMANHO_CACHE)),
+                       validade=float(os.environ.get('CACHE_VALIDADE', VALIDADE_CACHE)),
+                       casas_decimais=int(os.environ.get('CACHE_CASAS_DECIMAIS', CASAS_DECIMAIS)))
+agrupador = AgrupadorPrevisoes(os.environ.get('CAMINHO_MODELO', CAMINHO_MODELO),
+                               cache=cache if cache.tamanho_maximo > 0 else None)
+
+
+# Converte os anúncios recebidos para as features do modelo
+# Retorna (x, validas, erros): features das linhas válidas, máscara das linhas válidas e o erro de cada linha
+def preparar_anuncios(anuncios, modelo):
+    preparacao = modelo.named_steps['preparacao']
+    dados = pd.DataFrame(anuncios)
+    colunas, faltantes = colunas_entrada(preparacao, dados.columns)
+    if faltantes:
+        raise ErroRequisicao('Colunas não encontradas: {}'.format(', '.join(faltantes)), status=422)
+
+    dados, erros = coagir_lote(dados, preparacao, colunas)
+    validas = (erros == '').to_numpy()
+    return (preparacao.transform(dados[validas]), validas, erros.tolist())
+
+
+def validar_anuncios(anuncios):
+    if not isinstance(anuncios, list) or not anuncios or not all(isinstance(anuncio, dict) for anuncio in anuncios):
+        raise ErroRequisicao('Envie um anúncio (objeto JSON) ou uma lista de anúncios')
+    return anuncios
+
+
+async def rota_predict(corpo):
+    if not isinstance(corpo, dict):
+        raise ErroRequisicao('Envie um anúncio (objeto JSON)')
+    precos, erros = await agrupador.prever([corpo])
+    if precos[0] is None:
+        raise ErroRequisicao(erros[0], status=422)
+    return {'preco': precos[0]}
+
+
+async def rota_predict_lote(corpo):
+    if isinstance(corpo, dict):
+        corpo = corpo.get('anuncios')
+    precos, erros = await agrupador.prever(validar_anuncios(corpo))
+    return {'precos': precos, 'erros': [erro or None for erro in erros]}
+
+
+async def rota_saude(corpo):
+    # Fora do loop de eventos: a carga do modelo (quando o arquivo muda) não bloqueia as outras requisições
+    modelo = await asyncio.get_running_loop().run_in_executor(None, carregar_modelo, agrupador.caminho_modelo)
+    return {'modelo': type(modelo.steps[-1][1]).__name__, 'colunas': list(modelo.named_steps['preparacao'].colunas_),
+            'contadores': agrupador.contadores,
+            'cache': None if agrupador.cache is None else agrupador.cache.estatisticas()}
+
+
+ROTAS = {('POST', '/predict'): rota_predict,
+         ('POST', '/predict/lote'): rota_predict_lote,
+         ('GET', '/saude'): rota_saude}
+
+
+async def ler_corpo(receive):
+    partes = []
+    while True:
+        mensagem = await receive()
+        partes.append(mensagem.get('body', b''))
+        if not mensagem.get('more_body', False):
+            return b''.join(partes)
+
+
+async def responder(send, status, conteudo):
+    corpo = json.dumps(conteudo, ensure_ascii=False).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json; charset=utf-8'),
+                            (b'content-length', str(len(corpo)).encode())]})
+    await send({'type': 'http.response.body', 'body': corpo})
+
+
+async def ciclo_de_vida(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            # Sem o modelo o servidor não sobe: o erro é informado ao servidor ASGI, que encerra a aplicação
+            try:
+                carregar_modelo(agrupador.caminho_modelo)
+            except Exception as erro:
+                await send({'type': 'lifespan.startup.failed',
+                            'message': 'Falha ao carregar o modelo {}: {}'.format(agrupador.caminho_modelo, erro)})
+                return
+            agrupador.iniciar()
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            await agrupador.parar()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+# Aplicação ASGI (uvicorn, hypercorn...)
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await ciclo_de_vida(receive, send)
+    if scope['type'] == 'websocket':
+        # Sem rotas websocket: a conexão é recusada
+        return await send({'type': 'websocket.close', 'code': 1008})
+    if scope['type'] != 'http':
+        return
+
+    rota = ROTAS.get((scope['method'], scope['path'].rstrip('/') or '/'))
+    if rota is None:
+        return await responder(send, 404, {'erro': 'Rota não encontrada'})
+
+    corpo = await ler_corpo(receive)
+    try:
+        corpo = json.loads(corpo) if corpo else None
+        resposta = await rota(corpo)
+    except json.JSONDecodeError:
+        return await responder(send, 400, {'erro': 'JSON inválido'})
+    except ErroRequisicao as erro:
+        return await responder(send, erro.status, {'erro': str(erro)})
+    except Exception as erro:
+        logging.getLogger(__name__).exception('Erro na rota %s', scope['path'])
+        return await responder(send, 500, {'erro': 'Erro interno: {}'.format(erro)})
+    await responder(send, 200, resposta)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='API HTTP de previsão do valor da diária')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8000)
+    parser.add_argument('--modelo', default=CAMINHO_MODELO, help='arquivo do modelo (Pipeline)')
+    args = parser.parse_args()
+
+    agrupador.caminho_modelo = args.modelo
+    uvicorn.run(app, host=args.host, port=args.porta)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Atualização mensal incremental da base tratada e do modelo.
+#
+# Quando um novo arquivo mensal chega na pasta "dataset", não é necessário refazer todo o tratamento:
+#     1. Somente os arquivos novos são lidos e tratados
+#     2. A limpeza usa as mesmas estatísticas (limites de outliers e categorias) da primeira execução
+#     3. As linhas tratadas são gravadas como uma nova partição da base (um Parquet por mês)
+#     4. O modelo ganha novas árvores treinadas com o novo mês (warm_start), ou é retreinado com toda a base
+#        (sempre retreinado quando o arquivo de um mês já usado no treino é alterado)
+#
+# O estado (arquivos já processados, estatísticas e histórico das execuções) fica em "cache/incremental/estado.json".
+# O modelo fica em "cache/incremental/modelo.joblib", como Pipeline (pré-processamento + modelo), o mesmo formato
+# carregado pelo deploy (servico.carregar_modelo).
+#
+# Uso:
+#     python atualizacao.py                    -> processa os meses novos e adiciona árvores ao modelo
+#     python atualizacao.py --retreinar        -> processa os meses novos e retreina o modelo com toda a base
+#     python atualizacao.py --novas-arvores 20
+
+import argparse
+import datetime
+import json
+import pathlib
+
+import joblib
+import pandas as pd
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.pipeline import Pipeline
+
+from carregamento import (ano_mes_arquivo, carregar_base, impressao_digital_arquivo, ler_arquivo, listar_arquivos,
+                          salvar_parquet)
+from preparacao import FEATURES_MODELO, PARAMETROS_LIMPEZA, PASTA_CACHE, limpar_base, montar_matriz, montar_pipeline
+
+
+PASTA_INCREMENTAL = PASTA_CACHE / 'incremental'
+
+# Quantidade de árvores adicionadas ao modelo a cada novo mês
+NOVAS_ARVORES = 10
+
+
+def ler_estado(pasta=PASTA_INCREMENTAL):
+    caminho = pathlib.Path(pasta) / 'estado.json'
+    if not caminho.exists():
+        return None
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def salvar_estado(estado, pasta=PASTA_INCREMENTAL):
+    caminho = pathlib.Path(pasta) / 'estado.json'
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name('estado.json.tmp')
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(estado, arquivo, indent=2, ensure_ascii=False)
+    temporario.replace(caminho)
+
+
+# Grava a base tratada como uma partição por arquivo mensal
+def salvar_particoes(base_airbnb, arquivos, pasta=PASTA_INCREMENTAL):
+    for arquivo in arquivos:
+        ano, mes = arquivo['ano'], arquivo['mes']
+        particao = base_airbnb.loc[(base_airbnb['Ano'] == ano) & (base_airbnb['Mes'] == mes), :]
+        salvar_parquet(particao, pathlib.Path(pasta) / 'base' / f'{pathlib.Path(arquivo["nome"]).stem}.parquet')
+
+
+# Lê toda a base tratada, juntando as partições
+def ler_base_tratada(pasta=PASTA_INCREMENTAL):
+    particoes = sorted((pathlib.Path(pasta) / 'base').glob('*.parquet'))
+    if not particoes:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(particao) for particao in particoes], ignore_index=True)
+
+
+# Features e alvo do modelo, montados pelo pré-processamento do Pipeline somente com as colunas de FEATURES_MODELO
+# (sem o encoding de todas as colunas categóricas da base)
+def separar_x_y(base_airbnb, modelo):
+    x, y, _ = montar_matriz(base_airbnb, FEATURES_MODELO, preparacao=modelo.named_steps['preparacao'])
+    return (x, y)
+
+
+# Modelo salvo em uma execução anterior, sempre como Pipeline (pré-processamento + modelo), como usado no deploy.
+# Arquivos antigos, com somente o modelo, são envolvidos no Pipeline
+def carregar_pipeline(caminho_modelo, base_airbnb):
+    modelo = joblib.load(caminho_modelo)
+    if isinstance(modelo, Pipeline):
+        return modelo
+    return montar_pipeline(modelo, base_airbnb, FEATURES_MODELO)
+
+
+# Processa os arquivos novos da pasta "dataset" e atualiza o modelo
+# retreinar: treina um novo modelo com toda a base tratada, ao invés de adicionar árvores ao modelo atual
+def atualizar(caminho_base, pasta=PASTA_INCREMENTAL, parametros=PARAMETROS_LIMPEZA,
+              novas_arvores=NOVAS_ARVORES, retreinar=False, n_processos=None):
+    pasta = pathlib.Path(pasta)
+    estado = ler_estado(pasta)
+
+    arquivos = listar_arquivos(caminho_base)
+    processados = {} if estado is None else estado['particoes']
+    novos = [arquivo for arquivo in arquivos if processados.get(arquivo.name) != impressao_digital_arquivo(arquivo)]
+    # Meses já usados no treino cujo arquivo mudou: as árvores atuais foram treinadas com as linhas antigas
+    alterados = [arquivo.name for arquivo in novos if arquivo.name in processados]
+    if estado is None and not arquivos:
+        print('Nenhum arquivo na pasta {}'.format(caminho_base))
+        return estado
+    if not novos and not retreinar:
+        print('Nenhum arquivo novo na pasta {}'.format(caminho_base))
+        return estado
+
+    if estado is None:
+        # Primeira execução: as estatísticas são calculadas com todos os meses disponíveis
+        base_nova = carregar_base(caminho_base, n_processos=n_processos, pasta_cache=PASTA_CACHE)
+        base_nova, estatisticas = limpar_base(base_nova, parametros)
+        estado = {'estatisticas': estatisticas, 'particoes': {}, 'historico': []}
+    elif novos:
+        estatisticas = estado['estatisticas']
+        base_nova = pd.concat([ler_arquivo(arquivo) for arquivo in novos], ignore_index=True)
+        base_nova, _ = limpar_base(base_nova, parametros, estatisticas)
+    else:
+        estatisticas = estado['estatisticas']
+        base_nova = pd.DataFrame()
+
+    info_novos = []
+    for arquivo in novos:
+        info = impressao_digital_arquivo(arquivo)
+        info['ano'], info['mes'] = ano_mes_arquivo(arquivo)
+        info_novos.append(info)
+    salvar_particoes(base_nova, info_novos, pasta)
+
+    caminho_modelo = pasta / 'modelo.joblib'
+    if retreinar or alterados or base_nova.empty or not caminho_modelo.exists():
+        base_tratada = ler_base_tratada(pasta)
+        if base_tratada.empty:
+            print('Nenhuma linha na base tratada: o modelo não foi treinado')
+            return estado
+        pipeline = montar_pipeline(ExtraTreesRegressor(n_jobs=-1), base_tratada, FEATURES_MODELO)
+        x, y = separar_x_y(base_tratada, pipeline)
+        modo = 'treino completo' if not alterados else 'treino completo (arquivos alterados: {})'.format(
+            ', '.join(alterados))
+    else:
+        # Novas árvores, treinadas somente com os meses novos. As árvores existentes não são alteradas
+        pipeline = carregar_pipeline(caminho_modelo, base_nova)
+        x, y = separar_x_y(base_nova, pipeline)
+        n_estimators = pipeline.named_steps['modelo'].n_estimators
+        pipeline.named_steps['modelo'].set_params(warm_start=True, n_estimators=n_estimators + novas_arvores)
+        modo = 'warm start'
+    # Somente o modelo é treinado: o pré-processamento (colunas e categorias) é o mesmo das árvores já existentes
+    modelo = pipeline.named_steps['modelo']
+    modelo.fit(x, y)
+    joblib.dump(pipeline, caminho_modelo)
+
+    for info in info_novos:
+        estado['particoes'][info['nome']] = {chave: info[chave] for chave in ('nome', 'tamanho', 'modificado')}
+    estado['historico'].append({'data': datetime.datetime.now().isoformat(timespec='seconds'),
+                                'arquivos': [info['nome'] for info in info_novos],
+                                'linhas': int(base_nova.shape[0]),
+                                'modelo': modo,
+                                'n_estimators': int(modelo.n_estimators),
+                                'estatisticas': estatisticas})
+    salvar_estado(estado, pasta)
+
+    print('Arquivos processados: {}'.format([info['nome'] for info in info_novos]))
+    print('Linhas adicionadas: {} | Modelo: {} ({} árvores)'.format(base_nova.shape[0], modo, modelo.n_estimators))
+    return estado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Atualização incremental da base tratada e do modelo')
+    parser.add_argument('--dataset', default='dataset', help='pasta com os arquivos mensais')
+    parser.add_argument('--retreinar', action='store_true', help='retreina o modelo com toda a base tratada')
+    parser.add_argument('--novas-arvores', type=int, default=NOVAS_ARVORES,
+                        help='árvores adicionadas ao modelo a cada atualização')
+    args = parser.parse_args()
+
+    atualizar(args.dataset, novas_arvores=args.novas_arvores, retreinar=args.retreinar)
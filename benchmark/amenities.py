@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Compara a contagem de amenities usada originalmente no notebook (str.split(',').apply(len))
+# com a função contar_amenities, e mede a geração da matriz esparsa de amenities.
+#
+# Com a pasta "dataset" disponível, usa a base completa (2018 a 2020). Caso contrário, gera textos sintéticos.
+#
+# Uso (na pasta raiz do projeto):
+#     python -m benchmark.amenities
+#     python -m benchmark.amenities --dataset dataset
+#     python -m benchmark.amenities --linhas 1000000     -> sem a pasta dataset
+
+import argparse
+import pathlib
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from carregamento import carregar_base
+from preparacao import contar_amenities, matriz_amenities
+
+
+AMENITIES = ['TV', 'Wifi', 'Kitchen', '"Air conditioning"', 'Elevator', '"Free parking on premises"', 'Washer',
+             '"Hair dryer"', 'Iron', '"Laptop friendly workspace"', '"Hot water"', 'Essentials', 'Shampoo', 'Hangers',
+             '"Smoke detector"', '"Cable TV"', 'Pool', '"Wheelchair accessible"', 'Breakfast', 'Gym']
+
+
+def gerar_amenities(linhas, semente=0):
+    gerador = np.random.default_rng(semente)
+    quantidades = gerador.integers(0, len(AMENITIES) + 1, linhas)
+    return pd.Series(['{' + ','.join(gerador.choice(AMENITIES, quantidade, replace=False)) + '}'
+                      for quantidade in quantidades], dtype=object)
+
+
+def executar(amenities, repeticoes=3):
+    antigo = amenities.str.split(',').apply(len)
+    novo = contar_amenities(amenities)
+    vazios = (amenities == '{}').to_numpy()
+    # Única diferença esperada: "{}" era contado como 1 amenity
+    assert np.array_equal(antigo.to_numpy()[~vazios], novo.to_numpy()[~vazios])
+    assert (novo.to_numpy()[vazios] == 0).all()
+
+    tempo_antigo = min(timeit.repeat(lambda: amenities.str.split(',').apply(len), number=1, repeat=repeticoes))
+    tempo_novo = min(timeit.repeat(lambda: contar_amenities(amenities), number=1, repeat=repeticoes))
+    tempo_matriz = min(timeit.repeat(lambda: matriz_amenities(amenities), number=1, repeat=repeticoes))
+    matriz, nomes = matriz_amenities(amenities)
+
+    print('Linhas: {}'.format(len(amenities)))
+    print('str.split(",").apply(len): {:.3f}s'.format(tempo_antigo))
+    print('contar_amenities:          {:.3f}s'.format(tempo_novo))
+    print('Ganho: {:.1f}x'.format(tempo_antigo / tempo_novo))
+    print('matriz_amenities:          {:.3f}s ({} amenities, {:.1f} MB)'.format(
+        tempo_matriz, len(nomes), (matriz.data.nbytes + matriz.indices.nbytes + matriz.indptr.nbytes) / 1024**2))
+    return {'antigo': tempo_antigo, 'novo': tempo_novo, 'matriz': tempo_matriz}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark da contagem de amenities')
+    parser.add_argument('--dataset', default='dataset', help='pasta com os arquivos mensais')
+    parser.add_argument('--linhas', type=int, default=1000000, help='linhas sintéticas, caso a pasta não exista')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    if pathlib.Path(args.dataset).is_dir():
+        amenities = carregar_base(args.dataset)['amenities'].dropna().astype(object)
+    else:
+        amenities = gerar_amenities(args.linhas)
+    executar(amenities, args.repeticoes)
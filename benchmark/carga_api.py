@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Teste de carga da API de previsão (api.py), somente com a biblioteca padrão.
+#
+# Vários clientes enviam requisições ao mesmo tempo, cada um esperando a resposta antes de enviar a próxima.
+# Mostra as requisições por segundo, a latência (mediana, p95, p99) e o tamanho médio dos lotes
+# formados pela API (contadores de /saude).
+#
+# Uso (com a API rodando):
+#     python -m benchmark.carga_api --url http://127.0.0.1:8000 --clientes 16 --requisicoes 2000
+#     python -m benchmark.carga_api --anuncios-por-requisicao 100
+#     python -m benchmark.carga_api --anuncios-distintos 500     -> consultas repetidas (cache de previsões)
+
+import argparse
+import json
+import random
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def gerar_anuncio(gerador):
+    return {'host_listings_count': gerador.randint(1, 20),
+            'latitude': round(gerador.uniform(-23.08, -22.75), 5),
+            'longitude': round(gerador.uniform(-43.75, -43.10), 5),
+            'accommodates': gerador.randint(1, 10),
+            'bathrooms': gerador.randint(1, 4),
+            'bedrooms': gerador.randint(0, 5),
+            'beds': gerador.randint(1, 8),
+            'extra_people': gerador.choice([0, 20, 50]),
+            'Ano': gerador.choice([2018, 2019, 2020]),
+            'numero_amenities': gerador.randint(0, 40),
+            'instant_bookable': gerador.choice(['t', 'f'])}
+
+
+def requisitar(url, corpo=None):
+    dados = None if corpo is None else json.dumps(corpo).encode('utf-8')
+    requisicao = urllib.request.Request(url, data=dados, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(requisicao) as resposta:
+        return json.loads(resposta.read())
+
+
+# anuncios: lista fixa de anúncios sorteados a cada requisição (None gera anúncios novos a cada requisição)
+def cliente(url, requisicoes, anuncios_por_requisicao, semente, anuncios=None):
+    gerador = random.Random(semente)
+    sortear = (lambda: gerar_anuncio(gerador)) if anuncios is None else (lambda: gerador.choice(anuncios))
+    latencias = []
+    for _ in range(requisicoes):
+        if anuncios_por_requisicao == 1:
+            rota, corpo = '/predict', sortear()
+        else:
+            rota, corpo = '/predict/lote', [sortear() for _ in range(anuncios_por_requisicao)]
+        inicio = time.perf_counter()
+        requisitar(url + rota, corpo)
+        latencias.append(time.perf_counter() - inicio)
+    return latencias
+
+
+def executar(url, clientes=8, requisicoes=1000, anuncios_por_requisicao=1, anuncios_distintos=None):
+    saude = requisitar(url + '/saude')
+    antes = saude['contadores']
+    cache_antes = saude['cache']
+    por_cliente = max(1, requisicoes // clientes)
+    anuncios = None
+    if anuncios_distintos is not None:
+        gerador = random.Random(-1)
+        anuncios = [gerar_anuncio(gerador) for _ in range(anuncios_distintos)]
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as executor:
+        resultados = list(executor.map(lambda i: cliente(url, por_cliente, anuncios_por_requisicao, i, anuncios),
+                                       range(clientes)))
+    duracao = time.perf_counter() - inicio
+
+    saude = requisitar(url + '/saude')
+    depois = saude['contadores']
+    latencias = np.concatenate(resultados) * 1000
+    lotes = depois['lotes'] - antes['lotes']
+    total_anuncios = depois['anuncios'] - antes['anuncios']
+
+    print('Clientes: {} | Requisições: {} | Anúncios por requisição: {}'.format(clientes, latencias.shape[0],
+                                                                              anuncios_por_requisicao))
+    print('Requisições/s: {:.0f} | Anúncios/s: {:.0f}'.format(latencias.shape[0] / duracao,
+                                                              latencias.shape[0] * anuncios_por_requisicao / duracao))
+    print('Latência (ms): mediana {:.1f} | p95 {:.1f} | p99 {:.1f}'.format(*np.percentile(latencias, [50, 95, 99])))
+    print('Lotes: {} | Anúncios por lote: {:.1f}'.format(lotes, total_anuncios / max(lotes, 1)))
+    if saude['cache'] is not None:
+        acertos = saude['cache']['acertos'] - cache_antes['acertos']
+        falhas = saude['cache']['falhas'] - cache_antes['falhas']
+        print('Cache: {} acertos | {} falhas | taxa de acertos {:.1%}'.format(acertos, falhas,
+                                                                          acertos / max(acertos + falhas, 1)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Teste de carga da API de previsão')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--clientes', type=int, default=8, help='requisições simultâneas')
+    parser.add_argument('--requisicoes', type=int, default=1000, help='total de requisições')
+    parser.add_argument('--anuncios-por-requisicao', type=int, default=1)
+    parser.add_argument('--anuncios-distintos', type=int, default=None,
+                        help='sorteia os anúncios de uma lista fixa deste tamanho (consultas repetidas)')
+    args = parser.parse_args()
+
+    executar(args.url, args.clientes, args.requisicoes, args.anuncios_por_requisicao, args.anuncios_distintos)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Gera arquivos mensais sintéticos no mesmo formato dos arquivos da pasta "dataset" (que não acompanha o projeto).
+#
+# Cada arquivo ("abril2018.csv", "maio2018.csv"...) tem as colunas lidas por carregamento.py, com valores parecidos
+# com os da base do Rio de Janeiro:
+#     - price e extra_people como texto ("$1,234.00"), com alguns preços muito altos (outliers)
+#     - amenities como conjunto ("{TV,Wifi,"Air conditioning"}")
+#     - property_type, room_type e bed_type com a distribuição aproximada da base original (muitas categorias raras)
+#     - latitude e longitude dentro da região do Rio
+#     - alguns valores nulos e colunas que não são usadas pelo projeto
+# O preço depende da capacidade, dos quartos, do tipo de quarto e da distância até a orla, para que os modelos
+# tenham o que aprender. Com a mesma semente, os arquivos são sempre os mesmos.
+#
+# Uso (na pasta raiz do projeto):
+#     python -m benchmark.dados_sinteticos dataset_sintetico --linhas 30000 --meses 25
+
+import argparse
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from benchmark.amenities import AMENITIES
+
+
+# Nomes dos meses nos arquivos (as 3 primeiras letras são usadas por carregamento.ano_mes_arquivo)
+NOMES_MESES = ['janeiro', 'fevereiro', 'marco', 'abril', 'maio', 'junho', 'julho', 'agosto', 'setembro', 'outubro',
+               'novembro', 'dezembro']
+
+# Primeiro mês da base original
+INICIO = (2018, 4)
+
+PROPERTY_TYPE = {'Apartment': 0.79, 'House': 0.08, 'Condominium': 0.04, 'Serviced apartment': 0.02, 'Loft': 0.02,
+                 'Bed and breakfast': 0.01, 'Guest suite': 0.01, 'Hostel': 0.01, 'Guesthouse': 0.005,
+                 'Villa': 0.003, 'Boutique hotel': 0.003, 'Other': 0.003, 'Chalet': 0.002, 'Boat': 0.001,
+                 'Tent': 0.001, 'Camper/RV': 0.001, 'Treehouse': 0.001}
+ROOM_TYPE = {'Entire home/apt': 0.65, 'Private room': 0.32, 'Shared room': 0.02, 'Hotel room': 0.01}
+BED_TYPE = {'Real Bed': 0.975, 'Pull-out Sofa': 0.015, 'Futon': 0.005, 'Airbed': 0.003, 'Couch': 0.002}
+
+# Multiplicador do preço por tipo de quarto
+FATOR_ROOM_TYPE = {'Entire home/apt': 1.0, 'Private room': 0.45, 'Shared room': 0.25, 'Hotel room': 0.8}
+
+# Região do Rio de Janeiro e um ponto da orla (Copacabana), usado no preço
+LATITUDE = (-23.08, -22.75)
+LONGITUDE = (-43.75, -43.10)
+ORLA = (-22.97, -43.19)
+
+# Fração de valores nulos nas colunas que têm nulos na base original
+FRACAO_NULOS = 0.002
+COLUNAS_NULOS = ['host_is_superhost', 'host_listings_count', 'bathrooms', 'bedrooms', 'beds']
+
+
+# Nomes dos arquivos dos "meses" meses a partir de INICIO
+def nomes_arquivos(meses, inicio=INICIO):
+    ano, mes = inicio
+    nomes = []
+    for _ in range(meses):
+        nomes.append('{}{}.csv'.format(NOMES_MESES[mes - 1], ano))
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return nomes
+
+
+def sortear(gerador, distribuicao, linhas):
+    probabilidades = np.array(list(distribuicao.values()))
+    return gerador.choice(list(distribuicao), linhas, p=probabilidades / probabilidades.sum())
+
+
+def formatar_moeda(valores):
+    return ['${:,.2f}'.format(valor) for valor in valores]
+
+
+# Conjuntos de amenities: cada amenity tem a sua frequência, e a contagem varia de 0 a len(AMENITIES)
+def gerar_amenities(gerador, linhas):
+    frequencias = np.linspace(0.95, 0.05, len(AMENITIES))
+    presentes = gerador.random((linhas, len(AMENITIES))) < frequencias
+    texto = pd.Series('', index=range(linhas), dtype=object)
+    for i, amenity in enumerate(AMENITIES):
+        texto += np.where(presentes[:, i], amenity + ',', '')
+    return '{' + texto.str.rstrip(',') + '}'
+
+
+def gerar_mes(linhas, semente=0):
+    gerador = np.random.default_rng(semente)
+    room_type = sortear(gerador, ROOM_TYPE, linhas)
+    accommodates = np.clip(gerador.geometric(0.3, linhas) + 1, 1, 16)
+    bedrooms = np.clip(np.round(accommodates / 2.5 + gerador.normal(0, 0.6, linhas)), 0, 10)
+    beds = np.clip(bedrooms + gerador.integers(0, 3, linhas), 1, 16)
+    bathrooms = np.clip(np.round(bedrooms * 0.7 + gerador.normal(0.5, 0.4, linhas)), 1, 8)
+    latitude = gerador.uniform(*LATITUDE, linhas)
+    longitude = gerador.uniform(*LONGITUDE, linhas)
+
+    distancia_orla = np.hypot(latitude - ORLA[0], longitude - ORLA[1])
+    preco = ((80 + 45 * accommodates + 60 * bedrooms) * pd.Series(room_type).map(FATOR_ROOM_TYPE).to_numpy()
+             * np.exp(-2.5 * distancia_orla) * gerador.lognormal(0, 0.35, linhas))
+    # Anúncios com preços muito acima do normal, como na base original
+    caros = gerador.random(linhas) < 0.01
+    preco[caros] *= gerador.uniform(5, 40, caros.sum())
+    host_listings_count = np.where(gerador.random(linhas) < 0.03, gerador.integers(20, 300, linhas),
+                                   gerador.geometric(0.6, linhas)).astype(float)
+
+    base = pd.DataFrame({
+        'id': np.arange(linhas),
+        'listing_url': 'https://www.airbnb.com/rooms/0',
+        'name': 'Anúncio sintético',
+        'host_is_superhost': gerador.choice(['t', 'f'], linhas, p=[0.2, 0.8]),
+        'host_listings_count': host_listings_count,
+        'latitude': latitude,
+        'longitude': longitude,
+        'property_type': sortear(gerador, PROPERTY_TYPE, linhas),
+        'room_type': room_type,
+        'accommodates': accommodates,
+        'bathrooms': bathrooms,
+        'bedrooms': bedrooms,
+        'beds': beds,
+        'bed_type': sortear(gerador, BED_TYPE, linhas),
+        'amenities': gerar_amenities(gerador, linhas),
+        'price': formatar_moeda(np.maximum(np.round(preco), 20)),
+        'extra_people': formatar_moeda(gerador.choice([0, 0, 0, 20, 30, 50, 100, 150], linhas)),
+        'number_of_reviews': gerador.geometric(0.08, linhas) - 1,
+        'instant_bookable': gerador.choice(['t', 'f'], linhas, p=[0.35, 0.65])})
+
+    for coluna in COLUNAS_NULOS:
+        base.loc[gerador.random(linhas) < FRACAO_NULOS, coluna] = np.nan
+    return base
+
+
+# Grava os arquivos mensais na pasta. Retorna a lista dos arquivos
+def gerar_dataset(pasta, linhas, meses, semente=0):
+    pasta = pathlib.Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    arquivos = []
+    for i, nome in enumerate(nomes_arquivos(meses)):
+        arquivo = pasta / nome
+        gerar_mes(linhas, [semente, i]).to_csv(arquivo, index=False)
+        arquivos.append(arquivo)
+    return arquivos
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera arquivos mensais sintéticos no formato da pasta dataset')
+    parser.add_argument('pasta', help='pasta de saída')
+    parser.add_argument('--linhas', type=int, default=30000, help='linhas de cada arquivo mensal')
+    parser.add_argument('--meses', type=int, default=25, help='quantidade de arquivos mensais')
+    parser.add_argument('--semente', type=int, default=0)
+    args = parser.parse_args()
+
+    for arquivo in gerar_dataset(args.pasta, args.linhas, args.meses, args.semente):
+        print(arquivo)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Compara o tempo de previsão do ExtraTreesRegressor do scikit-learn com o da FlorestaPlana,
+# para lotes de 1, 100 e 100 mil anúncios, e confere se as previsões são iguais.
+#
+# Sem o arquivo do modelo, treina uma floresta com dados aleatórios no formato das features do modelo.
+# Um modelo exportado (floresta_plana.exportar_modelo_mmap) já contém somente a floresta plana, sem as árvores do
+# scikit-learn: nesse caso, somente o tempo da floresta plana é medido, sem a comparação.
+#
+# Uso (na pasta raiz do projeto):
+#     python -m benchmark.floresta_plana
+#     python -m benchmark.floresta_plana --modelo modelo.joblib
+
+import argparse
+import timeit
+
+import joblib
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.pipeline import Pipeline
+
+from floresta_plana import FlorestaPlana
+from preparacao import FEATURES_MODELO
+
+
+LOTES = (1, 100, 100000)
+
+
+def treinar_floresta(linhas=50000, n_estimators=100, semente=0):
+    gerador = np.random.default_rng(semente)
+    x = gerador.random((linhas, len(FEATURES_MODELO)), dtype=np.float32)
+    y = 100 + 500 * x[:, 3] + 200 * x[:, 1] * x[:, 2] + gerador.normal(0, 50, linhas)
+    return ExtraTreesRegressor(n_estimators=n_estimators, random_state=semente, n_jobs=-1).fit(x, y)
+
+
+def executar(floresta, lotes=LOTES, repeticoes=5, float32=False):
+    plana = FlorestaPlana.converter(floresta, float32)
+    gerador = np.random.default_rng(1)
+
+    print('Árvores: {} | Nós: {} | Floresta plana: {:.1f} MB'.format(len(floresta.estimators_), plana.n_nos,
+                                                                       plana.tamanho_bytes / 1024**2))
+    print('{:>8} {:>16} {:>18} {:>7} {:>14}'.format('lote', 'scikit-learn (s)', 'floresta plana (s)', 'ganho',
+                                                    'diferença máx'))
+    resultados = []
+    for lote in lotes:
+        x = gerador.random((lote, floresta.n_features_in_), dtype=np.float32)
+        previsao_sklearn, previsao_plana = floresta.predict(x), plana.predict(x)
+        assert np.allclose(previsao_sklearn, previsao_plana, rtol=1e-6 if float32 else 1e-9)
+        diferenca = np.abs(previsao_sklearn - previsao_plana).max()
+
+        n = 1 if lote >= 1000 else 2000 // max(lote, 10)
+        tempo_sklearn = min(timeit.repeat(lambda: floresta.predict(x), number=n, repeat=repeticoes)) / n
+        tempo_plana = min(timeit.repeat(lambda: plana.predict(x), number=n, repeat=repeticoes)) / n
+        print('{:>8} {:>16.5f} {:>18.5f} {:>6.1f}x {:>14.2e}'.format(lote, tempo_sklearn, tempo_plana,
+                                                                     tempo_sklearn / tempo_plana, diferenca))
+        resultados.append({'lote': lote, 'sklearn': tempo_sklearn, 'plana': tempo_plana})
+    return resultados
+
+
+# Somente o tempo de previsão de uma floresta plana já convertida (modelo exportado)
+def executar_plana(plana, lotes=LOTES, repeticoes=5):
+    gerador = np.random.default_rng(1)
+    print('Modelo exportado (floresta plana, sem as árvores do scikit-learn): a comparação não é feita')
+    print('Árvores: {} | Nós: {} | Floresta plana: {:.1f} MB'.format(len(plana.raizes), plana.n_nos,
+                                                                       plana.tamanho_bytes / 1024**2))
+    print('{:>8} {:>18}'.format('lote', 'floresta plana (s)'))
+    resultados = []
+    for lote in lotes:
+        x = gerador.random((lote, plana.n_features_in_), dtype=np.float32)
+        n = 1 if lote >= 1000 else 2000 // max(lote, 10)
+        tempo_plana = min(timeit.repeat(lambda: plana.predict(x), number=n, repeat=repeticoes)) / n
+        print('{:>8} {:>18.5f}'.format(lote, tempo_plana))
+        resultados.append({'lote': lote, 'plana': tempo_plana})
+    return resultados
+
+
+# Floresta do arquivo do modelo (o último passo do Pipeline)
+def carregar_floresta(caminho):
+    floresta = joblib.load(caminho)
+    if isinstance(floresta, Pipeline):
+        floresta = floresta.steps[-1][1]
+    if not isinstance(floresta, FlorestaPlana) and not hasattr(floresta, 'estimators_'):
+        raise ValueError('O modelo de {} não é uma floresta: {}'.format(caminho, type(floresta).__name__))
+    return floresta
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tempo de previsão: scikit-learn x floresta plana')
+    parser.add_argument('--modelo', default=None, help='arquivo do modelo (joblib); sem ele, treina uma floresta')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--float32', action='store_true', help='floresta plana com limiares e valores em float32')
+    parser.add_argument('--lotes', type=int, nargs='+', default=list(LOTES), help='tamanhos dos lotes medidos')
+    args = parser.parse_args()
+
+    floresta = treinar_floresta() if args.modelo is None else carregar_floresta(args.modelo)
+    if isinstance(floresta, FlorestaPlana):
+        executar_plana(floresta, args.lotes, args.repeticoes)
+    else:
+        executar(floresta, args.lotes, args.repeticoes, args.float32)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Mede o tempo de carregamento do modelo e a memória de cada processo do servidor.
+#
+# Inicia N processos que carregam o mesmo arquivo e fazem uma previsão (como workers do servidor).
+# Com todos carregados ao mesmo tempo, mede em cada um:
+#     RSS -> memória residente, contando páginas compartilhadas com outros processos
+#     PSS -> memória proporcional: páginas compartilhadas divididas entre os processos (somente Linux)
+#     USS -> memória exclusiva do processo
+#
+# Uso (na pasta raiz do projeto):
+#     python -m benchmark.memoria_modelo deploy/modelo.joblib --processos 4
+#     python -m benchmark.memoria_modelo deploy/modelo.joblib --processos 4 --sem-mmap
+
+import argparse
+import multiprocessing
+import queue
+import time
+import traceback
+
+import joblib
+import numpy as np
+import pandas as pd
+import psutil
+import sklearn.pipeline  # noqa: F401 - importado antes da medição, para não contar o tempo de import
+
+
+# Tempo máximo de espera por cada processo (carga, previsão e medição), em segundos
+TEMPO_MAXIMO = 600
+
+
+# Linhas usadas na previsão. O Pipeline exportado recebe um DataFrame com as features do pré-processamento pelo nome
+# (as dummies são usadas como estão); um modelo sem pré-processamento recebe uma matriz com "n_colunas" colunas
+def linhas_previsao(modelo, n_linhas=1000, n_colunas=11):
+    gerador = np.random.default_rng(0)
+    preparacao = getattr(modelo, 'named_steps', {}).get('preparacao')
+    if preparacao is None:
+        return gerador.random((n_linhas, n_colunas))
+    return pd.DataFrame(gerador.random((n_linhas, len(preparacao.colunas_))), columns=preparacao.colunas_)
+
+
+def trabalhador(caminho, mmap_mode, n_colunas, carregados, liberar, resultados):
+    try:
+        inicio = time.perf_counter()
+        modelo = joblib.load(caminho, mmap_mode=mmap_mode)
+        tempo_carga = time.perf_counter() - inicio
+
+        linhas = linhas_previsao(modelo, n_colunas=n_colunas)
+        inicio = time.perf_counter()
+        modelo.predict(linhas)
+        tempo_previsao = time.perf_counter() - inicio
+    except Exception:
+        # O erro é enviado ao processo principal, que não fica esperando por este processo
+        resultados.put({'erro': traceback.format_exc()})
+        carregados.release()
+        return
+
+    # Espera todos os processos carregarem o modelo antes de medir a memória
+    carregados.release()
+    liberar.wait()
+    memoria = psutil.Process().memory_full_info()
+    resultados.put({'carga_s': tempo_carga, 'previsao_1000_s': tempo_previsao,
+                    'rss_mb': memoria.rss / 1024**2, 'uss_mb': memoria.uss / 1024**2,
+                    'pss_mb': getattr(memoria, 'pss', float('nan')) / 1024**2})
+
+
+def encerrar(trabalhadores):
+    for processo in trabalhadores:
+        if processo.is_alive():
+            processo.terminate()
+        processo.join()
+
+
+# Espera todos os processos carregarem o modelo. Um processo que termina sem avisar (morto pelo sistema, por
+# falta de memória, por exemplo) ou a demora acima de "tempo_maximo" interrompem a medição com RuntimeError
+def aguardar_carga(carregados, trabalhadores, tempo_maximo=TEMPO_MAXIMO):
+    limite = time.monotonic() + tempo_maximo
+    for _ in trabalhadores:
+        while not carregados.acquire(timeout=1):
+            falhas = [processo.exitcode for processo in trabalhadores if processo.exitcode not in (None, 0)]
+            if falhas or time.monotonic() > limite:
+                encerrar(trabalhadores)
+                raise RuntimeError('Processo encerrado com código {}'.format(falhas[0]) if falhas else
+                                   'Os processos não carregaram o modelo em {}s'.format(tempo_maximo))
+
+
+def medir(caminho, processos=2, mmap_mode='r', n_colunas=11, tempo_maximo=TEMPO_MAXIMO):
+    carregados = multiprocessing.Semaphore(0)
+    liberar = multiprocessing.Event()
+    resultados = multiprocessing.Queue()
+    trabalhadores = [multiprocessing.Process(target=trabalhador,
+                                             args=(caminho, mmap_mode, n_colunas, carregados, liberar, resultados))
+                     for _ in range(processos)]
+    for processo in trabalhadores:
+        processo.start()
+    aguardar_carga(carregados, trabalhadores, tempo_maximo)
+    liberar.set()
+    try:
+        medidas = [resultados.get(timeout=tempo_maximo) for _ in trabalhadores]
+    except queue.Empty:
+        encerrar(trabalhadores)
+        raise RuntimeError('Os processos não enviaram as medições em {}s'.format(tempo_maximo))
+    encerrar(trabalhadores)
+    erros = [medida['erro'] for medida in medidas if 'erro' in medida]
+    if erros:
+        raise RuntimeError('Falha ao carregar ou usar o modelo:\n{}'.format(erros[0]))
+    return medidas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tempo de carregamento e memória por processo do modelo')
+    parser.add_argument('caminho', help='arquivo do modelo (joblib)')
+    parser.add_argument('--processos', type=int, default=2)
+    parser.add_argument('--colunas', type=int, default=11,
+                        help='quantidade de features do modelo (somente para modelos sem o pré-processamento)')
+    parser.add_argument('--sem-mmap', action='store_true', help='carrega o arquivo inteiro na memória')
+    args = parser.parse_args()
+
+    medidas = medir(args.caminho, args.processos, None if args.sem_mmap else 'r', args.colunas)
+    print('{:>8} {:>10} {:>14} {:>9} {:>9} {:>9}'.format('processo', 'carga (s)', 'previsao (s)', 'RSS (MB)',
+                                                         'PSS (MB)', 'USS (MB)'))
+    for i, medida in enumerate(medidas):
+        print('{:>8} {:>10.3f} {:>14.3f} {:>9.0f} {:>9.0f} {:>9.0f}'.format(
+            i, medida['carga_s'], medida['previsao_1000_s'], medida['rss_mb'], medida['pss_mb'], medida['uss_mb']))
+    print('Soma PSS (memória total dos {} processos): {:.0f} MB'.format(args.processos,
+                                                                       sum(m['pss_mb'] for m in medidas)))
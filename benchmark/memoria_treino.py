@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Compara o pico de memória da preparação das features e do treino do modelo:
+#     copias -> caminho antigo do notebook: base_airbnb_cod (cópia + get_dummies), x = drop('price'), train_test_split
+#               e a conversão para float32 feita pelo modelo no fit
+#     matriz -> preparacao.separar_treino_teste: as features são escritas direto em uma matriz float32, já na ordem
+#               treino + teste (x_train e x_test são partes da mesma matriz)
+#
+# Cada caminho roda em um processo novo. São medidos a memória residente após a leitura da base e o pico
+# (ru_maxrss) após a preparação e após o treino. Os dois caminhos usam a mesma separação treino/teste, então o R²
+# deve ser o mesmo. Por padrão as árvores têm profundidade limitada, para que a memória das árvores (igual nos dois
+# caminhos) não esconda a memória dos dados.
+#
+# Uso (na pasta raiz do projeto):
+#     python -m benchmark.memoria_treino --dataset dataset --arvores 100
+#     python -m benchmark.memoria_treino --features modelo --profundidade 0      -> árvores completas
+
+import argparse
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+
+import psutil
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.model_selection import train_test_split
+
+from modelagem import SEMENTE, memoria_pico, metricas
+from preparacao import (FEATURES_MODELO, PASTA_CACHE, codificar_base, colunas_codificadas, preparar_bases,
+                        separar_treino_teste)
+
+
+def preparar_copias(base_airbnb, colunas):
+    base_airbnb_cod = codificar_base(base_airbnb)
+    x = base_airbnb_cod.drop('price', axis=1)[colunas]
+    y = base_airbnb_cod['price']
+    return train_test_split(x, y, random_state=SEMENTE)
+
+
+def preparar_matriz(base_airbnb, colunas):
+    return separar_treino_teste(base_airbnb, colunas, SEMENTE)
+
+
+CAMINHOS = {'copias': preparar_copias, 'matriz': preparar_matriz}
+
+
+def medir(caminho, dataset, colunas, arvores, profundidade):
+    base_airbnb = preparar_bases(dataset, pasta_cache=PASTA_CACHE)
+    memoria_base = psutil.Process().memory_info().rss / 1024 ** 2
+
+    inicio = timeit.default_timer()
+    x_train, x_test, y_train, y_test = CAMINHOS[caminho](base_airbnb, colunas)
+    tempo_preparacao = timeit.default_timer() - inicio
+    pico_preparacao = memoria_pico()
+
+    inicio = timeit.default_timer()
+    modelo = ExtraTreesRegressor(n_estimators=arvores, max_depth=profundidade, random_state=SEMENTE, n_jobs=-1)
+    modelo.fit(x_train, y_train)
+    tempo_treino = timeit.default_timer() - inicio
+    r2, _ = metricas(y_test, modelo.predict(x_test))
+
+    return {'caminho': caminho, 'memoria_base_mb': memoria_base, 'pico_preparacao_mb': pico_preparacao,
+            'pico_treino_mb': memoria_pico(), 'tempo_preparacao_s': tempo_preparacao, 'tempo_treino_s': tempo_treino,
+            'r2': r2}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pico de memória da preparação das features e do treino')
+    parser.add_argument('--dataset', default='dataset', help='pasta com os arquivos mensais')
+    parser.add_argument('--arvores', type=int, default=100)
+    parser.add_argument('--profundidade', type=int, default=10, help='profundidade máxima das árvores (0: sem limite)')
+    parser.add_argument('--features', default='todas', choices=['todas', 'modelo'],
+                        help='todas as colunas do encoding (como no notebook) ou somente as do modelo final')
+    args = parser.parse_args()
+
+    # Somente para descobrir os nomes das colunas do encoding (fora dos processos medidos)
+    if args.features == 'todas':
+        colunas = list(colunas_codificadas(preparar_bases(args.dataset, pasta_cache=PASTA_CACHE)))
+    else:
+        colunas = FEATURES_MODELO
+
+    print('{:>8} {:>10} {:>16} {:>12} {:>16} {:>12} {:>8}'.format(
+        'caminho', 'base (MB)', 'preparação (MB)', 'treino (MB)', 'preparação (s)', 'treino (s)', 'R²'))
+    for caminho in CAMINHOS:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            medida = executor.submit(medir, caminho, args.dataset, colunas, args.arvores,
+                                     args.profundidade or None).result()
+        print('{:>8} {:>10.0f} {:>16.0f} {:>12.0f} {:>16.2f} {:>12.2f} {:>8.4f}'.format(
+            caminho, medida['memoria_base_mb'], medida['pico_preparacao_mb'], medida['pico_treino_mb'],
+            medida['tempo_preparacao_s'], medida['tempo_treino_s'], medida['r2']))
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Compara a conversão de 'price'/'extra_people' feita com a sequência antiga do notebook
+# (astype(str) + dois str.replace + astype(float32)) com a função converter_moeda.
+#
+# Uso (na pasta raiz do projeto):
+#     python -m benchmark.moeda --linhas 1000000
+
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from preparacao import converter_moeda
+
+
+# Sequência usada originalmente no notebook
+def converter_moeda_antigo(coluna):
+    coluna = coluna.astype(str)
+    coluna = coluna.str.replace('$', '', regex=False)
+    coluna = coluna.str.replace(',', '', regex=False)
+    return coluna.astype(np.float32)
+
+
+def gerar_precos(linhas, semente=0):
+    gerador = np.random.default_rng(semente)
+    valores = gerador.gamma(2, 300, linhas)
+    return pd.Series(['${:,.2f}'.format(valor) for valor in valores], dtype=object)
+
+
+def executar(linhas, repeticoes=3):
+    precos = gerar_precos(linhas)
+
+    antigo = converter_moeda_antigo(precos)
+    novo, invalidos = converter_moeda(precos)
+    assert len(invalidos) == 0
+    assert np.array_equal(antigo.to_numpy(), novo.to_numpy())
+
+    tempo_antigo = min(timeit.repeat(lambda: converter_moeda_antigo(precos), number=1, repeat=repeticoes))
+    tempo_novo = min(timeit.repeat(lambda: converter_moeda(precos), number=1, repeat=repeticoes))
+
+    print('Linhas: {}'.format(linhas))
+    print('Sequência antiga (str.replace): {:.3f}s'.format(tempo_antigo))
+    print('converter_moeda:                {:.3f}s'.format(tempo_novo))
+    print('Ganho: {:.1f}x'.format(tempo_antigo / tempo_novo))
+    return {'antigo': tempo_antigo, 'novo': tempo_novo}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark da conversão de valores monetários')
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    executar(args.linhas, args.repeticoes)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark completo do projeto com dados sintéticos (ver dados_sinteticos.py), sem precisar da pasta "dataset".
+#
+# Gera (uma única vez para cada escala) os arquivos mensais sintéticos e mede, com perfil.py:
+#     leitura (CSV, sem o cache de partições) -> limpeza -> encoding -> treino -> avaliação -> exportação
+#     -> previsão de um anúncio por vez (como na API) -> previsão em lote (como no lote.py)
+# As previsões usam anúncios novos, no formato original das colunas (preços em texto, amenities...).
+#
+# Tudo é executado "repeticoes" vezes e cada etapa fica com a mediana das repetições: uma única medição varia
+# demais (outros processos, cache de disco, aquecimento) e apontaria regressões que não existem.
+#
+# O resultado é comparado com uma linha de base (JSON gravado por uma execução anterior com --gravar-linha-base).
+# Etapas com tempo acima de "tolerancia" vezes o tempo da linha de base são marcadas como regressão e o comando
+# termina com código 1. Etapas com menos de TEMPO_MINIMO segundos na linha de base não são comparadas.
+# A linha de base só é comparável com execuções na mesma escala e na mesma máquina, por isso não acompanha o
+# projeto: grave a sua (--gravar-linha-base) antes das alterações, na máquina onde o benchmark será executado.
+#
+# Uso (na pasta raiz do projeto):
+#     python -m benchmark.suite --linhas 20000 --meses 4 --gravar-linha-base
+#     python -m benchmark.suite --linhas 20000 --meses 4                      -> compara com a linha de base
+#     python -m benchmark.suite --linhas 20000 --meses 4 --repeticoes 5
+#     python -m benchmark.suite --linhas 200000 --meses 25 --linha-base linha_base_grande.json
+
+import argparse
+import pathlib
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from benchmark.dados_sinteticos import gerar_dataset, gerar_mes, nomes_arquivos
+from lote import colunas_entrada, precificar_lote
+from perfil import (PASTA_PERFIL, PerfilExecucao, comparar_relatorios, gravar_relatorio, ler_relatorio,
+                    tabela_etapas)
+from preparacao import PASTA_CACHE
+from treino import treinar
+
+
+PASTA_DADOS = PASTA_CACHE / 'benchmark'
+LINHA_BASE = pathlib.Path(__file__).with_name('linha_base.json')
+
+# Razão de tempo (atual / linha de base) acima da qual a etapa é considerada uma regressão
+TOLERANCIA = 1.25
+# Etapas mais rápidas que isso (na linha de base) variam demais para serem comparadas
+TEMPO_MINIMO = 0.25
+# Execuções completas medidas (cada etapa fica com a mediana)
+REPETICOES = 3
+
+PREVISOES_UNITARIAS = 200
+LINHAS_LOTE = 10000
+
+
+# Pasta com os arquivos sintéticos da escala, gerados somente se ainda não existirem
+def preparar_dados(linhas, meses, semente=0, pasta=PASTA_DADOS):
+    pasta = pathlib.Path(pasta) / 'sinteticos-{}x{}-{}'.format(meses, linhas, semente)
+    if not all((pasta / nome).exists() for nome in nomes_arquivos(meses)):
+        gerar_dataset(pasta, linhas, meses, semente)
+    return pasta
+
+
+# Anúncios no formato original, de um "mês" que não faz parte do treino
+def anuncios_previsao(linhas, meses, semente=0, ano=2020):
+    return gerar_mes(linhas, [semente, meses]).assign(Ano=ano)
+
+
+def medir_previsoes(pipeline, perfil, anuncios, previsoes_unitarias=PREVISOES_UNITARIAS):
+    with perfil.etapa('previsao_unitaria', previsoes_unitarias) as registro:
+        tempos = []
+        for i in range(previsoes_unitarias):
+            inicio = timeit.default_timer()
+            pipeline.predict(anuncios.iloc[i:i + 1])
+            tempos.append((timeit.default_timer() - inicio) * 1000)
+        registro.update({'linhas_saida': previsoes_unitarias, 'mediana_ms': float(np.median(tempos)),
+                         'p95_ms': float(np.percentile(tempos, 95))})
+
+    with perfil.etapa('previsao_lote', anuncios.shape[0]) as registro:
+        colunas, _ = colunas_entrada(pipeline.named_steps['preparacao'], anuncios.columns)
+        precificados = precificar_lote(anuncios, pipeline, colunas)
+        registro['linhas_saida'] = int(precificados['preco_previsto'].notna().sum())
+    registro['ms_por_linha'] = registro['tempo_s'] * 1000 / anuncios.shape[0]
+
+
+# Comparação com a linha de base, com a coluna "regressao"
+def comparar_linha_base(relatorio, linha_base, tolerancia=TOLERANCIA, tempo_minimo=TEMPO_MINIMO):
+    comparacao = comparar_relatorios(relatorio, linha_base)
+    comparacao['regressao'] = ((comparacao['tempo_s_anterior'] >= tempo_minimo) &
+                               (comparacao['razao_tempo'] > tolerancia))
+    return comparacao
+
+
+# Junta as repetições em um único perfil: os valores de cada etapa são a mediana das repetições, e tempo_s_min e
+# tempo_s_max mostram a variação do tempo
+def combinar_repeticoes(perfis):
+    combinado = PerfilExecucao(perfis[0].nome, dict(perfis[0].parametros, repeticoes=len(perfis)))
+    combinado.inicio = perfis[0].inicio
+    for registros in zip(*(perfil.etapas for perfil in perfis)):
+        registro = dict(registros[0])
+        for chave, valor in registros[0].items():
+            if isinstance(valor, float):
+                registro[chave] = float(np.median([outro[chave] for outro in registros]))
+        tempos = [outro['tempo_s'] for outro in registros]
+        registro.update({'tempo_s_min': min(tempos), 'tempo_s_max': max(tempos)})
+        combinado.etapas.append(registro)
+    return combinado
+
+
+def executar(linhas, meses, semente=0, n_processos=None, pasta_dados=PASTA_DADOS, repeticoes=REPETICOES):
+    pasta = preparar_dados(linhas, meses, semente, pasta_dados)
+    anuncios = anuncios_previsao(LINHAS_LOTE, meses, semente)
+    perfis = []
+    for _ in range(repeticoes):
+        perfil = PerfilExecucao('benchmark', {'linhas_por_mes': linhas, 'meses': meses, 'semente_dados': semente})
+        pipeline, perfil = treinar(pasta, pasta_cache=None, n_processos=n_processos, perfil=perfil)
+        medir_previsoes(pipeline, perfil, anuncios)
+        perfis.append(perfil)
+    return combinar_repeticoes(perfis)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark completo com dados sintéticos')
+    parser.add_argument('--linhas', type=int, default=20000, help='linhas de cada arquivo mensal')
+    parser.add_argument('--meses', type=int, default=4, help='quantidade de arquivos mensais')
+    parser.add_argument('--semente', type=int, default=0, help='semente dos dados sintéticos')
+    parser.add_argument('--processos', type=int, default=None, help='processos usados na leitura')
+    parser.add_argument('--linha-base', default=str(LINHA_BASE), help='arquivo JSON da linha de base')
+    parser.add_argument('--gravar-linha-base', action='store_true', help='grava o resultado como a linha de base')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA,
+                        help='razão de tempo acima da qual uma etapa é uma regressão')
+    parser.add_argument('--repeticoes', type=int, default=REPETICOES,
+                        help='execuções completas medidas (cada etapa fica com a mediana)')
+    args = parser.parse_args()
+
+    perfil = executar(args.linhas, args.meses, args.semente, args.processos, repeticoes=args.repeticoes)
+    relatorio = perfil.relatorio()
+    print('Relatório: {}'.format(perfil.salvar(PASTA_PERFIL)))
+
+    colunas = ['linhas_entrada', 'linhas_saida', 'tempo_s', 'tempo_s_min', 'tempo_s_max', 'cpu_s', 'pico_rss_mb']
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(tabela_etapas(relatorio)[colunas].round(3))
+        print('Previsão unitária: mediana {:.2f} ms | p95 {:.2f} ms'.format(
+            relatorio['etapas'][-2]['mediana_ms'], relatorio['etapas'][-2]['p95_ms']))
+        print('Previsão em lote: {:.4f} ms por anúncio'.format(relatorio['etapas'][-1]['ms_por_linha']))
+
+        if args.gravar_linha_base:
+            print('\nLinha de base gravada: {}'.format(gravar_relatorio(relatorio, args.linha_base)))
+            sys.exit(0)
+        if not pathlib.Path(args.linha_base).exists():
+            print('\nSem linha de base em {} (use --gravar-linha-base)'.format(args.linha_base))
+            sys.exit(0)
+
+        linha_base = ler_relatorio(args.linha_base)
+        for chave in ('linhas_por_mes', 'meses', 'semente_dados'):
+            if linha_base['parametros'].get(chave) != relatorio['parametros'][chave]:
+                print('\nAtenção: a linha de base usa {} = {} (atual: {})'.format(
+                    chave, linha_base['parametros'].get(chave), relatorio['parametros'][chave]))
+        if linha_base['ambiente'] != relatorio['ambiente']:
+            print('\nAtenção: a linha de base foi gravada em outro ambiente: {}'.format(linha_base['ambiente']))
+
+        comparacao = comparar_linha_base(relatorio, linha_base, args.tolerancia)
+        print('\nComparação com a linha de base de {}:'.format(linha_base['inicio']))
+        print(comparacao[['tempo_s', 'tempo_s_anterior', 'razao_tempo', 'razao_memoria', 'regressao']].round(3))
+    regressoes = list(comparacao.index[comparacao['regressao']])
+    if regressoes:
+        print('\nRegressões (tempo > {:.2f}x a linha de base): {}'.format(args.tolerancia, ', '.join(regressoes)))
+        sys.exit(1)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Busca de hiperparâmetros das florestas (ExtraTrees e RandomForest) com "successive halving".
+#
+# Treinar todas as combinações com a base inteira é caro. Aqui as combinações competem em rodadas:
+#     1. Todas são treinadas com uma amostra pequena da base de treino
+#     2. Somente a melhor fração (1 / fator) passa para a próxima rodada, que usa uma amostra "fator" vezes maior
+#     3. Na última rodada, as que restaram são treinadas com toda a base de treino
+# Assim as combinações ruins são descartadas cedo, com pouco custo.
+#
+# O critério é o R² na base de validação, separada da base de treino (a base de teste não é usada na busca), mas
+# somente entre as combinações que respeitam os limites de tamanho do modelo exportado (MB) e de tempo de previsão
+# de um anúncio (ms), medidos com a floresta plana usada no deploy.
+# Nas rodadas com amostras, o tamanho é estimado proporcionalmente à quantidade de linhas (as árvores crescem com
+# a base), o que descarta cedo as combinações que certamente não cabem no limite.
+#
+# Cada avaliação é gravada em um arquivo JSON Lines assim que termina. Se a busca for interrompida, basta rodar
+# novamente com o mesmo arquivo: as avaliações já feitas são reaproveitadas.
+#
+# Uso:
+#     python busca.py --tamanho-maximo 100 --latencia-maxima 5 --resultados cache/busca.jsonl
+
+import argparse
+import itertools
+import json
+import math
+import os
+import pathlib
+import random
+import timeit
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.model_selection import train_test_split
+
+from carregamento import gerar_chave
+from floresta_plana import FlorestaPlana
+from modelagem import SEMENTE, medir_latencia, metricas
+from preparacao import FEATURES_MODELO, PASTA_CACHE, preparar_bases, separar_treino_teste
+
+
+MODELOS = {'ExtraTrees': ExtraTreesRegressor, 'RandomForest': RandomForestRegressor}
+
+# Valores testados de cada hiperparâmetro
+ESPACO_BUSCA = {'modelo': ['ExtraTrees', 'RandomForest'],
+                'n_estimators': [50, 100, 200],
+                'max_depth': [None, 15, 25],
+                'min_samples_leaf': [1, 2, 5, 10],
+                'max_features': [1.0, 0.5, 'sqrt']}
+
+# A cada rodada, fica 1 / FATOR das combinações e a amostra fica FATOR vezes maior
+FATOR = 3
+# Tamanho mínimo da amostra da primeira rodada
+LINHAS_MINIMAS = 5000
+# Fração da base de treino separada para a validação
+PROPORCAO_VALIDACAO = 0.25
+
+ARQUIVO_RESULTADOS = PASTA_CACHE / 'busca' / 'resultados.jsonl'
+
+
+# Combinações do espaço de busca. n_candidatos: sorteia essa quantidade de combinações (None usa todas)
+def gerar_candidatos(espaco=ESPACO_BUSCA, n_candidatos=None, semente=SEMENTE):
+    nomes = list(espaco)
+    candidatos = [dict(zip(nomes, valores)) for valores in itertools.product(*espaco.values())]
+    if n_candidatos is not None and n_candidatos < len(candidatos):
+        candidatos = random.Random(semente).sample(candidatos, n_candidatos)
+    return candidatos
+
+
+# Quantidade de linhas de cada rodada: a última usa toda a base de treino
+# São feitas rodadas até restar uma combinação, desde que a primeira amostra tenha ao menos "linhas_minimas"
+def linhas_rodadas(n_candidatos, n_linhas, fator=FATOR, linhas_minimas=LINHAS_MINIMAS):
+    rodadas = 1
+    while fator ** rodadas < n_candidatos and n_linhas / fator ** rodadas >= linhas_minimas:
+        rodadas += 1
+    return [int(n_linhas / fator ** (rodadas - 1 - rodada)) for rodada in range(rodadas)]
+
+
+# Treina e avalia uma combinação (executado em um processo próprio)
+def avaliar_candidato(candidato, x_train, y_train, x_val, y_val, n_linhas_total, semente=SEMENTE):
+    parametros = {chave: valor for chave, valor in candidato.items() if chave != 'modelo'}
+    modelo = MODELOS[candidato['modelo']](random_state=semente, n_jobs=1, **parametros)
+
+    inicio = timeit.default_timer()
+    modelo.fit(x_train, y_train)
+    tempo_treino = timeit.default_timer() - inicio
+
+    plana = FlorestaPlana.converter(modelo)
+    r2, rsme = metricas(y_val, plana.predict(x_val))
+    latencia, _ = medir_latencia(plana, x_val)
+    tamanho = plana.tamanho_bytes / 1024 ** 2
+    return {'r2': r2, 'rsme': rsme, 'latencia_ms': latencia, 'tamanho_mb': tamanho,
+            'tamanho_estimado_mb': tamanho * n_linhas_total / x_train.shape[0], 'tempo_treino': tempo_treino}
+
+
+def ler_resultados(caminho):
+    caminho = pathlib.Path(caminho)
+    if not caminho.exists():
+        return []
+    registros = []
+    with open(caminho, encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            try:
+                registros.append(json.loads(linha))
+            except json.JSONDecodeError:
+                # Linha incompleta, gravada quando a busca foi interrompida
+                continue
+    return registros
+
+
+def gravar_resultado(caminho, resultado):
+    caminho = pathlib.Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, 'a', encoding='utf-8') as arquivo:
+        arquivo.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+
+
+def respeita_limites(resultado, tamanho_maximo=None, latencia_maxima=None):
+    return ((tamanho_maximo is None or resultado['tamanho_estimado_mb'] <= tamanho_maximo) and
+            (latencia_maxima is None or resultado['latencia_ms'] <= latencia_maxima))
+
+
+# Separa a base de validação da base de treino. A base de teste fica intocada para a avaliação final do modelo
+def separar_validacao(x_train, y_train, semente=SEMENTE, proporcao_validacao=PROPORCAO_VALIDACAO):
+    return train_test_split(x_train, y_train, test_size=proporcao_validacao, random_state=semente)
+
+
+# Executa a busca. Retorna a tabela com todas as avaliações (uma linha por combinação e rodada)
+# n_processos: combinações treinadas ao mesmo tempo (None usa todos os núcleos)
+def buscar(x_train, y_train, x_val, y_val, candidatos=None, tamanho_maximo=None, latencia_maxima=None,
+           fator=FATOR, resultados=ARQUIVO_RESULTADOS, n_processos=None, semente=SEMENTE,
+           linhas_minimas=LINHAS_MINIMAS):
+    if candidatos is None:
+        candidatos = gerar_candidatos(semente=semente)
+    # Identifica os dados da busca: avaliações de outra base ou de outra separação treino/validação não são usadas
+    chave_dados = gerar_chave(x_train.shape, list(x_train.columns), float(y_train.sum()), x_val.shape, semente)
+    anteriores = {(registro['candidato'], registro['linhas']): registro for registro in ler_resultados(resultados)
+                  if registro['dados'] == chave_dados}
+
+    restantes = [{'id': gerar_chave(candidato), 'parametros': candidato} for candidato in candidatos]
+    avaliacoes = []
+    ordem = np.random.default_rng(semente).permutation(x_train.shape[0])
+    rodadas = linhas_rodadas(len(restantes), x_train.shape[0], fator, linhas_minimas)
+
+    with ProcessPoolExecutor(max_workers=n_processos or os.cpu_count() or 1) as executor:
+        for rodada, n_linhas in enumerate(rodadas):
+            # As amostras são encaixadas: a amostra de uma rodada contém a da rodada anterior
+            x_amostra, y_amostra = x_train.iloc[ordem[:n_linhas]], y_train.iloc[ordem[:n_linhas]]
+
+            novos = {executor.submit(avaliar_candidato, candidato['parametros'], x_amostra, y_amostra, x_val, y_val,
+                                     x_train.shape[0], semente): candidato
+                     for candidato in restantes if (candidato['id'], n_linhas) not in anteriores}
+            # Cada avaliação é gravada assim que termina, para que uma interrupção perca o mínimo possível
+            for futuro in as_completed(novos):
+                candidato = novos[futuro]
+                registro = dict(futuro.result(), candidato=candidato['id'], linhas=n_linhas, rodada=rodada,
+                                dados=chave_dados, parametros=candidato['parametros'])
+                gravar_resultado(resultados, registro)
+                anteriores[(candidato['id'], n_linhas)] = registro
+
+            resultados_rodada = []
+            for candidato in restantes:
+                registro = dict(anteriores[(candidato['id'], n_linhas)], rodada=rodada)
+                registro['viavel'] = respeita_limites(registro, tamanho_maximo, latencia_maxima)
+                resultados_rodada.append((candidato, registro))
+            avaliacoes.extend(registro for _, registro in resultados_rodada)
+
+            viaveis = sorted([item for item in resultados_rodada if item[1]['viavel']],
+                             key=lambda item: item[1]['r2'], reverse=True)
+            print('Rodada {}: {} linhas | {} combinações | {} dentro dos limites | melhor R²: {}'.format(
+                rodada + 1, n_linhas, len(resultados_rodada), len(viaveis),
+                '{:.2%}'.format(viaveis[0][1]['r2']) if viaveis else '-'))
+            if rodada < len(rodadas) - 1:
+                restantes = [candidato for candidato, _ in viaveis[:max(1, math.ceil(len(restantes) / fator))]]
+            if not restantes:
+                break
+
+    tabela = pd.DataFrame([dict(registro['parametros'], **{chave: registro[chave] for chave in (
+        'rodada', 'linhas', 'r2', 'rsme', 'latencia_ms', 'tamanho_mb', 'tamanho_estimado_mb', 'tempo_treino',
+        'viavel', 'parametros')}) for registro in avaliacoes])
+    return tabela.sort_values(['rodada', 'r2'], ascending=[False, False], ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Busca de hiperparâmetros das florestas com successive halving')
+    parser.add_argument('--dataset', default='dataset', help='pasta com os arquivos mensais')
+    parser.add_argument('--resultados', default=str(ARQUIVO_RESULTADOS),
+                        help='arquivo JSON Lines com as avaliações (usado para retomar a busca)')
+    parser.add_argument('--candidatos', type=int, default=None, help='quantidade de combinações sorteadas')
+    parser.add_argument('--fator', type=int, default=FATOR)
+    parser.add_argument('--tamanho-maximo', type=float, default=None, help='tamanho máximo do modelo, em MB')
+    parser.add_argument('--latencia-maxima', type=float, default=None,
+                        help='tempo máximo de previsão de um anúncio, em ms')
+    parser.add_argument('--linhas-minimas', type=int, default=LINHAS_MINIMAS,
+                        help='tamanho mínimo da amostra da primeira rodada')
+    parser.add_argument('--processos', type=int, default=None)
+    args = parser.parse_args()
+
+    base_airbnb = preparar_bases(args.dataset, pasta_cache=PASTA_CACHE)
+    x_train, _, y_train, _ = separar_treino_teste(base_airbnb, FEATURES_MODELO, SEMENTE)
+    x_train, x_val, y_train, y_val = separar_validacao(x_train, y_train, SEMENTE)
+    tabela = buscar(x_train, y_train, x_val, y_val, gerar_candidatos(n_candidatos=args.candidatos),
+                    args.tamanho_maximo, args.latencia_maxima, args.fator, args.resultados, args.processos,
+                    linhas_minimas=args.linhas_minimas)
+
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(tabela.drop(columns='parametros').head(20).round(4).to_string(index=False))
+    finais = tabela[(tabela['rodada'] == tabela['rodada'].max()) & tabela['viavel']]
+    if finais.empty:
+        print('Nenhuma combinação dentro dos limites')
+    else:
+        print('\nMelhor combinação: {}'.format(finais.iloc[0]['parametros']))
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Cache das previsões do modelo, para anúncios repetidos.
+#
+# Muitas consultas repetem o mesmo anúncio, ou a mesma combinação de quartos/banheiros/hóspedes em coordenadas
+# praticamente iguais. Aqui o preço de cada vetor de features já previsto é guardado e devolvido sem passar
+# pelo modelo:
+#     - A chave é o vetor de features já pré-processado, com latitude e longitude arredondadas
+#       ("casas_decimais": 4 casas são ~11 metros). As previsões que não estão no cache são feitas com as
+#       coordenadas originais (o mesmo preço do WebApp e do lote.py); anúncios a menos de ~11 metros de um anúncio
+#       já previsto recebem o preço guardado dele
+#     - Linhas com a mesma chave em um lote são previstas uma única vez
+#     - O cache tem um tamanho máximo (os menos usados recentemente são descartados) e uma validade em segundos
+#     - Quando o modelo muda (servico.carregar_modelo retorna outro objeto), o cache é esvaziado
+#     - Os contadores (acertos, falhas, descartes...) mostram o aproveitamento do cache
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+
+# Quantidade máxima de previsões guardadas
+TAMANHO_CACHE = 100000
+# Tempo de validade de uma previsão, em segundos
+VALIDADE_CACHE = 3600
+# Casas decimais mantidas nas coordenadas
+CASAS_DECIMAIS = 4
+
+
+class CachePrevisoes:
+
+    def __init__(self, tamanho_maximo=TAMANHO_CACHE, validade=VALIDADE_CACHE, casas_decimais=CASAS_DECIMAIS,
+                 colunas_arredondadas=('latitude', 'longitude')):
+        self.tamanho_maximo = tamanho_maximo
+        self.validade = validade
+        self.casas_decimais = casas_decimais
+        self.colunas_arredondadas = colunas_arredondadas
+        # chave -> (preço, momento em que foi guardado)
+        self.previsoes = collections.OrderedDict()
+        self.modelo = None
+        self.trava = threading.Lock()
+        self.contadores = {'acertos': 0, 'falhas': 0, 'expirados': 0, 'descartes': 0, 'invalidacoes': 0}
+
+    # Arredonda as coordenadas das features (DataFrame pré-processado). Usado somente nas chaves do cache
+    def normalizar(self, x):
+        colunas = [coluna for coluna in self.colunas_arredondadas if coluna in x.columns]
+        if not colunas:
+            return x
+        return x.assign(**{coluna: x[coluna].round(self.casas_decimais) for coluna in colunas})
+
+    # Previsão do estimador (último passo do Pipeline) para as features já pré-processadas
+    # Somente as linhas que não estão no cache são previstas (uma linha por chave), com uma única chamada ao modelo
+    def prever(self, estimador, x):
+        valores = np.ascontiguousarray(self.normalizar(x).to_numpy())
+        chaves = [linha.tobytes() for linha in valores]
+        precos = np.empty(len(chaves))
+        agora = time.monotonic()
+
+        with self.trava:
+            if estimador is not self.modelo:
+                if self.previsoes:
+                    self.contadores['invalidacoes'] += 1
+                self.previsoes.clear()
+                self.modelo = estimador
+
+            # chave -> posições das linhas com essa chave
+            faltantes = {}
+            for i, chave in enumerate(chaves):
+                guardado = self.previsoes.get(chave)
+                if guardado is not None and agora - guardado[1] > self.validade:
+                    del self.previsoes[chave]
+                    self.contadores['expirados'] += 1
+                    guardado = None
+                if guardado is None:
+                    faltantes.setdefault(chave, []).append(i)
+                else:
+                    self.previsoes.move_to_end(chave)
+                    precos[i] = guardado[0]
+            n_faltantes = sum(len(posicoes) for posicoes in faltantes.values())
+            self.contadores['acertos'] += len(chaves) - n_faltantes
+            self.contadores['falhas'] += n_faltantes
+
+        if faltantes:
+            # A primeira linha de cada chave, com as coordenadas originais
+            previstos = estimador.predict(x.iloc[[posicoes[0] for posicoes in faltantes.values()]])
+            for posicoes, preco in zip(faltantes.values(), previstos):
+                precos[posicoes] = preco
+            with self.trava:
+                if estimador is self.modelo:
+                    for chave, preco in zip(faltantes, previstos):
+                        self.previsoes[chave] = (preco, agora)
+                        self.previsoes.move_to_end(chave)
+                    while len(self.previsoes) > self.tamanho_maximo:
+                        self.previsoes.popitem(last=False)
+                        self.contadores['descartes'] += 1
+
+        return precos
+
+    def limpar(self):
+        with self.trava:
+            self.previsoes.clear()
+
+    def estatisticas(self):
+        with self.trava:
+            consultas = self.contadores['acertos'] + self.contadores['falhas']
+            return dict(self.contadores, tamanho=len(self.previsoes),
+                        taxa_acertos=self.contadores['acertos'] / consultas if consultas else 0.0)
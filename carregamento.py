@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Leitura dos arquivos mensais da pasta "dataset".
+#
+# Cada arquivo do scrape do AirBnB tem mais de 100 colunas, mas o projeto usa somente algumas delas.
+# Para não carregar a base completa na memória, os arquivos são lidos:
+#     1. Somente com as colunas necessárias (usecols)
+#     2. Com os tipos de dados definidos (dtype), evitando a inferência coluna a coluna
+#     3. Em blocos (chunks), juntando tudo com um único pd.concat no final
+#
+# Os arquivos são independentes entre si, então são lidos em paralelo, um por processo.
+#
+# Opcionalmente, cada arquivo já lido é guardado em Parquet na pasta de cache. Nas próximas leituras,
+# somente os arquivos novos (ou alterados) são lidos do CSV novamente.
+
+import functools
+import hashlib
+import json
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+#Dicionário dos meses do ano
+meses = {'jan': 1, 'fev': 2,'mar': 3,'abr': 4,'mai': 5,'jun': 6,'jul': 7,'ago': 8,'set': 9,'out': 10,'nov': 11,'dez': 12,}
+
+# Colunas que restam após a remoção manual (lista "colunas" do notebook) e a remoção das colunas majoritariamente nulas
+tipos_colunas = {'host_is_superhost': str,
+                 'host_listings_count': np.float32,
+                 'latitude': np.float64,
+                 'longitude': np.float64,
+                 'property_type': str,
+                 'room_type': str,
+                 'accommodates': np.float32,
+                 'bathrooms': np.float32,
+                 'bedrooms': np.float32,
+                 'beds': np.float32,
+                 'bed_type': str,
+                 'amenities': str,
+                 'price': str,
+                 'extra_people': str,
+                 'number_of_reviews': np.float32,
+                 'instant_bookable': str}
+
+colunas_usadas = list(tipos_colunas)
+
+# Quantidade de linhas lidas por vez de cada arquivo
+TAMANHO_CHUNK = 50000
+
+
+# Retorna o ano e o mês de um arquivo no formato "abril2018.csv"
+def ano_mes_arquivo(arquivo):
+    arquivo = pathlib.Path(arquivo)
+    mes = meses[arquivo.name[:3]]
+    ano = int(arquivo.name[-8:].replace(".csv",""))
+    return (ano, mes)
+
+
+# Lê um arquivo mensal em blocos, somente com as colunas usadas no projeto
+def ler_arquivo(arquivo, tamanho_chunk=TAMANHO_CHUNK):
+    ano, mes = ano_mes_arquivo(arquivo)
+
+    # usecols como função: meses que não tenham alguma das colunas não geram erro (a coluna fica NaN no concat)
+    leitor = pd.read_csv(arquivo, usecols=lambda coluna: coluna in tipos_colunas, dtype=tipos_colunas,
+                         chunksize=tamanho_chunk)
+    with leitor:
+        df = pd.concat(leitor, ignore_index=True)
+
+    df['Ano'] = ano
+    df['Mes'] = mes
+    return df
+
+
+# Identifica um arquivo pelo nome, tamanho e data de modificação
+def impressao_digital_arquivo(arquivo):
+    arquivo = pathlib.Path(arquivo)
+    info = arquivo.stat()
+    return {'nome': arquivo.name, 'tamanho': info.st_size, 'modificado': info.st_mtime_ns}
+
+
+# Gera uma chave (hash) a partir de qualquer informação serializável em JSON
+def gerar_chave(*informacoes):
+    texto = json.dumps(informacoes, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()[:16]
+
+
+# Lê um arquivo mensal usando a cópia em Parquet da pasta de cache, quando existir
+def ler_particao(arquivo, tamanho_chunk=TAMANHO_CHUNK, pasta_cache=None):
+    if pasta_cache is None:
+        return ler_arquivo(arquivo, tamanho_chunk)
+
+    chave = gerar_chave(impressao_digital_arquivo(arquivo), tipos_colunas)
+    caminho_cache = pathlib.Path(pasta_cache) / 'particoes' / f'{pathlib.Path(arquivo).stem}-{chave}.parquet'
+    if caminho_cache.exists():
+        return pd.read_parquet(caminho_cache)
+
+    df = ler_arquivo(arquivo, tamanho_chunk)
+    salvar_parquet(df, caminho_cache)
+    return df
+
+
+# Salva o DataFrame em Parquet. Grava em um arquivo temporário e renomeia, para que um cache incompleto nunca seja lido
+def salvar_parquet(df, caminho):
+    caminho = pathlib.Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(caminho.name + '.tmp')
+    df.to_parquet(temporario, index=False)
+    os.replace(temporario, caminho)
+
+
+# Lista os arquivos mensais da pasta em ordem cronológica, para que a base tenha sempre a mesma ordem
+def listar_arquivos(caminho_base):
+    caminho_base = pathlib.Path(caminho_base)
+    return sorted(caminho_base.glob('*.csv'), key=lambda arquivo: (ano_mes_arquivo(arquivo), arquivo.name))
+
+
+# Lê todos os arquivos da pasta e junta em um unico DataFrame
+# n_processos: quantidade de processos usados na leitura (None usa todos os núcleos, 1 lê sem paralelismo)
+# pasta_cache: pasta onde os arquivos já lidos são guardados em Parquet (None não usa cache)
+def carregar_base(caminho_base, n_processos=None, tamanho_chunk=TAMANHO_CHUNK, pasta_cache=None):
+    arquivos = listar_arquivos(caminho_base)
+    if not arquivos:
+        raise FileNotFoundError('Nenhum arquivo .csv em {}'.format(caminho_base))
+    ler = functools.partial(ler_particao, tamanho_chunk=tamanho_chunk, pasta_cache=pasta_cache)
+
+    if n_processos is None:
+        n_processos = os.cpu_count() or 1
+    n_processos = min(n_processos, len(arquivos))
+
+    if n_processos <= 1:
+        bases = [ler(arquivo) for arquivo in arquivos]
+    else:
+        # O map devolve os resultados na ordem dos arquivos, independente de qual processo terminar primeiro
+        with ProcessPoolExecutor(max_workers=n_processos) as executor:
+            bases = list(executor.map(ler, arquivos))
+
+    return pd.concat(bases, ignore_index=True)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Exportação do modelo dentro de um limite de tamanho e de tempo de previsão.
+#
+# O ExtraTreesRegressor padrão cresce as árvores até o fim (uma folha para quase cada anúncio), o que deixa o
+# modelo grande demais para os servidores gratuitos. Aqui são treinadas versões menores do modelo:
+#     - limitando a profundidade (max_depth) ou a quantidade de folhas (max_leaf_nodes) das árvores
+#     - exigindo mais anúncios por folha (min_samples_leaf), o que poda os ramos finais
+#     - usando menos árvores (n_estimators)
+#     - guardando limiares e valores em float32 na exportação
+# Para cada versão é mostrado o R² e o RSME junto com o tamanho do arquivo e o tempo de previsão.
+# A versão exportada é a de maior R² entre as que cabem nos limites.
+#
+# Uso:
+#     python compressao.py --tamanho-maximo 100 --latencia-maxima 20 --saida deploy/modelo.joblib
+
+import argparse
+import pathlib
+import timeit
+
+import pandas as pd
+from sklearn.ensemble import ExtraTreesRegressor
+
+from floresta_plana import converter_modelo, exportar_modelo_mmap
+from modelagem import medir_latencia, metricas, tamanho_exportado
+from preparacao import FEATURES_MODELO, PASTA_CACHE, montar_pipeline, preparar_bases, separar_treino_teste
+
+
+# Versões do modelo testadas, do modelo completo (padrão do notebook) às mais compactas
+CONFIGURACOES = [{'n_estimators': 100},
+                 {'n_estimators': 100, 'min_samples_leaf': 2},
+                 {'n_estimators': 100, 'min_samples_leaf': 5},
+                 {'n_estimators': 100, 'max_depth': 20},
+                 {'n_estimators': 50, 'min_samples_leaf': 5},
+                 {'n_estimators': 50, 'max_leaf_nodes': 10000},
+                 {'n_estimators': 30, 'max_depth': 15},
+                 {'n_estimators': 30, 'max_leaf_nodes': 2000}]
+
+
+def descrever_configuracao(configuracao):
+    return ', '.join(f'{parametro}={valor}' for parametro, valor in configuracao.items())
+
+
+# Treina e avalia cada configuração, com limiares e valores em float64 e em float32
+# Retorna (modelos, resultados): os modelos treinados e um DataFrame com uma linha por versão
+def avaliar_configuracoes(x_train, y_train, x_test, y_test, configuracoes=CONFIGURACOES, random_state=10):
+    modelos, resultados = [], []
+    for configuracao in configuracoes:
+        inicio = timeit.default_timer()
+        modelo = ExtraTreesRegressor(random_state=random_state, n_jobs=-1, **configuracao)
+        modelo.fit(x_train, y_train)
+        tempo_treino = timeit.default_timer() - inicio
+        modelos.append(modelo)
+
+        for float32 in (False, True):
+            modelo_plano = converter_modelo(modelo, float32)
+            r2, rsme = metricas(y_test, modelo_plano.predict(x_test))
+            latencia, latencia_lote = medir_latencia(modelo_plano, x_test)
+            resultados.append({'configuracao': descrever_configuracao(configuracao),
+                               'indice': len(modelos) - 1,
+                               'float32': float32,
+                               'r2': r2,
+                               'rsme': rsme,
+                               'nos': modelo_plano.n_nos,
+                               'tamanho_mb': tamanho_exportado(modelo_plano),
+                               'latencia_ms': latencia,
+                               'latencia_lote_ms': latencia_lote,
+                               'tempo_treino': tempo_treino})
+
+    return (modelos, pd.DataFrame(resultados))
+
+
+# Escolhe a versão de maior R² dentro dos limites (None não limita)
+# Em caso de empate no R², fica a menor versão
+def escolher_versao(resultados, tamanho_maximo=None, latencia_maxima=None):
+    cabe = pd.Series(True, index=resultados.index)
+    if tamanho_maximo is not None:
+        cabe &= resultados['tamanho_mb'] <= tamanho_maximo
+    if latencia_maxima is not None:
+        cabe &= resultados['latencia_ms'] <= latencia_maxima
+    if not cabe.any():
+        raise ValueError('Nenhuma versão do modelo cabe nos limites de tamanho ({} MB) e latência ({} ms)'.format(
+            tamanho_maximo, latencia_maxima))
+    return resultados[cabe].sort_values(['r2', 'tamanho_mb'], ascending=[False, True]).iloc[0]
+
+
+# Compara cada versão com o modelo completo (primeira configuração, float64)
+def relatorio_compressao(resultados):
+    referencia = resultados.iloc[0]
+    relatorio = resultados.copy()
+    relatorio['perda_r2'] = referencia['r2'] - relatorio['r2']
+    relatorio['aumento_rsme'] = relatorio['rsme'] - referencia['rsme']
+    relatorio['reducao_tamanho'] = 1 - relatorio['tamanho_mb'] / referencia['tamanho_mb']
+    relatorio['reducao_latencia'] = 1 - relatorio['latencia_ms'] / referencia['latencia_ms']
+    return relatorio.drop(columns='indice')
+
+
+def exportar_com_limites(caminho_base, saida, tamanho_maximo=None, latencia_maxima=None,
+                         configuracoes=CONFIGURACOES, pasta_cache=PASTA_CACHE):
+    base_airbnb = preparar_bases(caminho_base, pasta_cache=pasta_cache)
+    x_train, x_test, y_train, y_test = separar_treino_teste(base_airbnb, FEATURES_MODELO, semente=10)
+
+    modelos, resultados = avaliar_configuracoes(x_train, y_train, x_test, y_test, configuracoes)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(relatorio_compressao(resultados).round(4).to_string(index=False))
+
+    escolhida = escolher_versao(resultados, tamanho_maximo, latencia_maxima)
+    print('\nVersão exportada: {} (float32={}) | R²: {:.2%} | RSME: {:.2f} | {:.1f} MB | {:.2f} ms'.format(
+        escolhida['configuracao'], escolhida['float32'], escolhida['r2'], escolhida['rsme'],
+        escolhida['tamanho_mb'], escolhida['latencia_ms']))
+
+    pipeline = montar_pipeline(modelos[escolhida['indice']], base_airbnb, FEATURES_MODELO)
+    pathlib.Path(saida).parent.mkdir(parents=True, exist_ok=True)
+    return exportar_modelo_mmap(pipeline, saida, float32=bool(escolhida['float32']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exporta o modelo dentro de um limite de tamanho e latência')
+    parser.add_argument('--dataset', default='dataset', help='pasta com os arquivos mensais')
+    parser.add_argument('--saida', default='modelo.joblib', help='arquivo do modelo exportado')
+    parser.add_argument('--tamanho-maximo', type=float, default=None, help='tamanho máximo do arquivo, em MB')
+    parser.add_argument('--latencia-maxima', type=float, default=None,
+                        help='tempo máximo de previsão de um anúncio, em ms')
+    args = parser.parse_args()
+
+    exportar_com_limites(args.dataset, args.saida, args.tamanho_maximo, args.latencia_maxima)
@@ -4,52 +4,76 @@
 # In[2]:
 
 
+import pathlib
+import tempfile
+
 import pandas as pd
 import streamlit as st
-import joblib
 
+from lote import precificar_arquivo
+from servico import carregar_modelo, entradas_modelo, montar_anuncio
 
-# In[3]:
 
+# O modelo é carregado uma única vez por processo do servidor e compartilhado entre as sessões.
+# Só é carregado novamente se o arquivo modelo.joblib for alterado.
+modelo = carregar_modelo('modelo.joblib')
+
+
+# In[3]:
 
-x_numericos = {'host_listings_count':0 , 'latitude': 0, 'longitude': 0, 'accommodates': 0, 'bathrooms': 0, 'bedrooms': 0, 
-               'beds': 0, 'extra_people': 0, 'Ano': 0, 'numero_amenities': 0}
 
-x_tf = {'instant_bookable': 0}
+# As entradas vêm do pré-processamento do modelo carregado (servico.entradas_modelo), na ordem das features:
+# números, valores Sim/Não e as categorias aprendidas no treino (property_type, room_type, bed_type)
+entradas = entradas_modelo(modelo)
 
 
 # In[4]:
 
 
-for item in x_numericos:
-    if item == 'latitude' or item == 'longitude':
-        valor = st.number_input(f'{item}', step=0.00001, value=0.00000, format="%.5f")
+valores = {}
+
+for item, tipo in entradas.items():
+    if tipo == 'tf':
+        valores[item] = 1 if st.selectbox(f'{item}', ('Sim', 'Não')) == 'Sim' else 0
+    elif isinstance(tipo, list):
+        valores[item] = st.selectbox(f'{item}', tipo)
+    elif item == 'latitude' or item == 'longitude':
+        valores[item] = st.number_input(f'{item}', step=0.00001, value=0.00000, format="%.5f")
     elif item == 'extra_people':
-        valor = st.number_input(f'{item}', step=0.01, value=0.0)
-    else:
-        valor = st.number_input(f'{item}', step=1, value=0)
-        
-    x_numericos[item] = valor
-    
-    
-for item in x_tf:
-    valor = st.selectbox(f'{item}', ('Sim', 'Não'))
-    if valor =='Sim':
-        x_tf[item] = 1
+        valores[item] = st.number_input(f'{item}', step=0.01, value=0.0)
     else:
-        x_tf[item] = 0
-    
-botao = st.button('Calcular valor da diária')
+        valores[item] = st.number_input(f'{item}', step=1, value=0)
 
-dicionario = {}
+botao = st.button('Calcular valor da diária')
 
 if botao:
-    dicionario.update(x_numericos)
-    dicionario.update(x_tf)
-    valores_x = pd.DataFrame(dicionario, index=[0])
-    modelo = joblib.load('modelo.joblib')
-    preco = modelo.predict(valores_x)
+    # O arquivo contém o Pipeline (pré-processamento + modelo), que monta as features na ordem usada no treino
+    preco = modelo.predict(montar_anuncio(modelo, valores))
     
     st.write(preco)
-    
 
+
+# In[5]:
+
+
+# Precificação em lote: um arquivo com vários anúncios, lido e precificado em blocos
+# O arquivo precisa ter as colunas do modelo (ou "amenities" no lugar de "numero_amenities")
+st.subheader('Precificação em lote')
+arquivo = st.file_uploader('Arquivo CSV ou Parquet com os anúncios', type=['csv', 'parquet'])
+botao_lote = st.button('Calcular valor das diárias do arquivo')
+
+# O resultado é gravado bloco a bloco em um arquivo temporário (e não na memória) e enviado a partir dele
+if arquivo is not None and botao_lote:
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_saida = pathlib.Path(pasta) / 'precos.csv'
+        try:
+            resumo = precificar_arquivo(arquivo, caminho_saida, modelo)
+        except ValueError as erro:
+            st.error(str(erro))
+        else:
+            st.write('{} anúncios precificados de {} em {:.1f}s'.format(resumo['precificadas'], resumo['linhas'],
+                                                                       resumo['tempo']))
+            if resumo['precificadas'] < resumo['linhas']:
+                st.warning('Anúncios com valores inválidos ficaram sem preço (ver a coluna "erro")')
+            with open(caminho_saida, 'rb') as saida:
+                st.download_button('Baixar arquivo com os preços', saida, file_name='precos.csv', mime='text/csv')
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Floresta (ExtraTrees / RandomForest) armazenada em arrays NumPy contínuos.
+#
+# O scikit-learn guarda cada árvore em um objeto próprio e, ao carregar o modelo, copia os nós de cada
+# árvore para a memória do processo. Com isso, cada processo do servidor tem a sua cópia do modelo inteiro,
+# mesmo carregando o arquivo com mmap_mode.
+#
+# Aqui, os nós de todas as árvores ficam em poucos arrays (um valor por nó):
+#     feature   -> coluna usada na divisão do nó
+#     limiar    -> valor de corte (x <= limiar vai para a esquerda)
+#     filhos    -> índices dos filhos do nó: [direita, esquerda] (indexado pelo resultado de x <= limiar)
+#     valor     -> valor previsto pelo nó (usado nas folhas)
+# As folhas apontam para si mesmas, então percorrer a árvore mais vezes que sua profundidade não muda o resultado.
+#
+# A previsão percorre todas as árvores de uma vez, com operações vetorizadas do NumPy, sem a validação da entrada e
+# a distribuição das árvores entre threads feitas pelo scikit-learn a cada chamada. Isso deixa a previsão de um
+# anúncio (deploy) bem mais rápida. Em lotes muito grandes (dezenas de milhares de anúncios), o código compilado do
+# scikit-learn continua mais rápido: ver benchmark/floresta_plana.py.
+#
+# Salvo com joblib sem compressão e carregado com mmap_mode='r', os arrays são lidos direto do arquivo,
+# sem cópia: vários processos na mesma máquina compartilham as mesmas páginas de memória (page cache).
+
+import os
+import pathlib
+
+import joblib
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin, clone
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.pipeline import Pipeline
+
+
+# Quantidade de pares (linha, árvore) percorridos por vez na previsão
+TAMANHO_BLOCO = 2 ** 18
+# A cada quantos níveis os pares que já chegaram a uma folha são retirados da previsão
+PASSOS_COMPACTACAO = 4
+
+
+class FlorestaPlana(RegressorMixin, BaseEstimator):
+
+    # floresta: ExtraTreesRegressor ou RandomForestRegressor (hiperparâmetros da floresta treinada no fit)
+    # float32: guarda limiares e valores em float32 (metade do tamanho). Os limiares são arredondados para baixo,
+    #          então a divisão dos nós continua idêntica (as árvores comparam os valores em float32)
+    def __init__(self, floresta=None, float32=False):
+        self.floresta = floresta
+        self.float32 = float32
+
+    # Cria a floresta plana a partir de uma floresta já treinada
+    # Somente os hiperparâmetros da floresta são guardados (em "floresta", sem as árvores), para clone/set_params
+    @classmethod
+    def converter(cls, floresta, float32=False):
+        return cls(clone(floresta), float32)._achatar(floresta)
+
+    # Treina a floresta com (X, y) e guarda as árvores nos arrays
+    def fit(self, X, y):
+        floresta = ExtraTreesRegressor() if self.floresta is None else clone(self.floresta)
+        return self._achatar(floresta.fit(X, y))
+
+    def _achatar(self, floresta):
+        arvores = [estimador.tree_ for estimador in floresta.estimators_]
+        tamanhos = np.array([arvore.node_count for arvore in arvores])
+        inicios = np.concatenate([[0], np.cumsum(tamanhos)[:-1]])
+
+        self.raizes = inicios.astype(np.int64)
+        self.profundidades = np.array([arvore.max_depth for arvore in arvores], dtype=np.int32)
+
+        feature, limiar, filhos, valor = [], [], [], []
+        for inicio, arvore in zip(inicios, arvores):
+            folha = arvore.children_left < 0
+            nos = np.arange(arvore.node_count)
+            feature.append(np.where(folha, 0, arvore.feature))
+            limiar.append(np.where(folha, 0.0, arvore.threshold))
+            filhos.append(inicio + np.column_stack([np.where(folha, nos, arvore.children_right),
+                                                    np.where(folha, nos, arvore.children_left)]))
+            valor.append(arvore.value[:, 0, 0])
+
+        self.feature = np.concatenate(feature).astype(np.int16 if floresta.n_features_in_ < 2**15 else np.int32)
+        self.limiar = np.concatenate(limiar).astype(np.float64)
+        self.filhos = np.ascontiguousarray(np.concatenate(filhos).astype(np.int32))
+        self.valor = np.concatenate(valor).astype(np.float64)
+
+        if self.float32:
+            limiar = self.limiar.astype(np.float32)
+            arredondado_para_cima = limiar > self.limiar
+            limiar[arredondado_para_cima] = np.nextafter(limiar[arredondado_para_cima], np.float32(-np.inf))
+            self.limiar = limiar
+            self.valor = self.valor.astype(np.float32)
+
+        self.n_features_in_ = floresta.n_features_in_
+        if hasattr(floresta, 'feature_names_in_'):
+            self.feature_names_in_ = floresta.feature_names_in_
+        return self
+
+    def __sklearn_is_fitted__(self):
+        return hasattr(self, 'raizes')
+
+    def predict(self, X):
+        # O scikit-learn compara os valores em float32 nas árvores; aqui é feito o mesmo
+        X = np.asarray(X, dtype=np.float32)
+        n_linhas, n_colunas = X.shape
+        n_arvores = len(self.raizes)
+        previsao = np.empty(n_linhas)
+
+        # Linhas processadas por vez, para limitar a memória usada com lotes grandes
+        passo = max(1, TAMANHO_BLOCO // n_arvores)
+        for inicio in range(0, n_linhas, passo):
+            bloco = X[inicio:inicio + passo]
+            folhas = self.valores_folhas(bloco.ravel(), bloco.shape[0], n_colunas)
+            previsao[inicio:inicio + bloco.shape[0]] = folhas.reshape(bloco.shape[0], n_arvores).sum(
+                axis=1, dtype=np.float64) / n_arvores
+
+        return previsao
+
+    # Percorre todas as árvores para todas as linhas ao mesmo tempo: um par (linha, árvore) por posição dos arrays
+    # A cada passo, todos os pares descem um nível. De tempos em tempos, os pares que chegaram a uma folha saem da
+    # lista de ativos, então árvores rasas não são percorridas até a profundidade da árvore mais funda.
+    # Retorna o valor da folha de cada par, na ordem (linha, árvore)
+    def valores_folhas(self, valores, n_linhas, n_colunas):
+        # Posição do início de cada linha em "valores" (X em uma dimensão)
+        deslocamento = np.repeat(np.arange(n_linhas, dtype=np.int64) * n_colunas, len(self.raizes))
+        no_final = np.tile(self.raizes.astype(self.filhos.dtype), n_linhas)
+        # filhos em uma dimensão: posição 2 * nó (direita) e 2 * nó + 1 (esquerda)
+        filhos = self.filhos.ravel()
+
+        ativos = np.arange(no_final.shape[0])
+        no = no_final.copy()
+        passo = 0
+        while ativos.shape[0]:
+            vai_esquerda = valores[deslocamento + self.feature[no]] <= self.limiar[no]
+            proximo = filhos[2 * no + vai_esquerda]
+            passo += 1
+            if passo % PASSOS_COMPACTACAO == 0:
+                # As folhas apontam para si mesmas
+                chegou = proximo == no
+                no_final[ativos] = proximo
+                continua = ~chegou
+                ativos, no, deslocamento = ativos[continua], proximo[continua], deslocamento[continua]
+            else:
+                no = proximo
+
+        return self.valor[no_final]
+
+    @property
+    def n_nos(self):
+        return len(self.feature)
+
+    @property
+    def tamanho_bytes(self):
+        return sum(array.nbytes for array in (self.raizes, self.profundidades, self.feature, self.limiar,
+                                              self.filhos, self.valor))
+
+
+# Troca a floresta do Pipeline (ou o próprio modelo, se não for um Pipeline) pela FlorestaPlana
+# Modelos que não são florestas (HistGradientBoosting, LinearRegression...) são mantidos como estão
+def converter_modelo(modelo, float32=False):
+    if isinstance(modelo, Pipeline):
+        return Pipeline(modelo.steps[:-1] + [(modelo.steps[-1][0], converter_modelo(modelo.steps[-1][1], float32))])
+    if isinstance(modelo, FlorestaPlana) or not hasattr(modelo, 'estimators_'):
+        return modelo
+    return FlorestaPlana.converter(modelo, float32)
+
+
+# Salva o modelo no formato para mmap: floresta plana, arquivo sem compressão
+# O arquivo é gravado em um temporário e depois renomeado. Sobrescrever o arquivo diretamente corromperia
+# o modelo dos processos que estão com o arquivo antigo mapeado na memória.
+def exportar_modelo_mmap(modelo, caminho, float32=False):
+    caminho = pathlib.Path(caminho)
+    temporario = caminho.with_name(caminho.name + '.tmp')
+    joblib.dump(converter_modelo(modelo, float32), temporario, compress=0)
+    os.replace(temporario, caminho)
+    return caminho
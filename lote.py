@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Precificação em lote: um arquivo CSV ou Parquet com vários anúncios, um preço por linha.
+#
+# O arquivo é lido em blocos (chunks), então a memória usada não depende do tamanho do arquivo:
+#     1. As colunas necessárias ao modelo são conferidas no primeiro bloco
+#     2. Os valores de cada bloco são convertidos para número. Linhas com valores inválidos ou vazios
+#        não são precificadas: ficam com o preço vazio e o motivo na coluna "erro"
+#     3. Todas as linhas válidas do bloco são precificadas com uma única chamada ao modelo
+#     4. O bloco, com as colunas "preco_previsto" e "erro", é gravado no CSV de saída antes do próximo ser lido
+#
+# Uso:
+#     python lote.py anuncios.csv precos.csv --modelo modelo.joblib
+
+import argparse
+import pathlib
+import timeit
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from preparacao import converter_moeda
+from servico import CAMINHO_MODELO, carregar_modelo
+
+
+# Quantidade de linhas lidas e precificadas por vez
+TAMANHO_LOTE = 50000
+
+
+# Colunas do arquivo necessárias para calcular as features do modelo
+# Retorna (colunas, faltantes): as colunas usadas e as features que não podem ser calculadas com o arquivo
+def colunas_entrada(preparacao, colunas_arquivo):
+    colunas, faltantes = [], []
+    for coluna in preparacao.colunas_:
+        if coluna in colunas_arquivo:
+            origem = coluna
+        elif coluna == 'numero_amenities' and 'amenities' in colunas_arquivo:
+            origem = 'amenities'
+        else:
+            origem = next((categoria for categoria in preparacao.categorias_
+                           if coluna.startswith(categoria + '_') and categoria in colunas_arquivo), None)
+        if origem is None:
+            faltantes.append(coluna)
+        elif origem not in colunas:
+            colunas.append(origem)
+    return (colunas, faltantes)
+
+
+# Converte as colunas usadas pelo modelo para número
+# Retorna (dados, erros): as colunas convertidas e o motivo de cada linha inválida ('' nas linhas válidas)
+def coagir_lote(lote, preparacao, colunas):
+    dados = {}
+    erros = pd.Series('', index=lote.index, dtype=object)
+    for coluna in colunas:
+        valores = lote[coluna]
+        if coluna in preparacao.colunas_tf or coluna in preparacao.categorias_:
+            # Valores vazios são tratados como "f" e como a categoria "Outros", como no pré-processamento
+            invalidos = np.zeros(lote.shape[0], dtype=bool)
+        elif coluna == 'amenities':
+            invalidos = valores.isna().to_numpy()
+        else:
+            if coluna in preparacao.colunas_moeda and not pd.api.types.is_numeric_dtype(valores):
+                convertidos, _ = converter_moeda(valores.astype(str))
+                valores = convertidos.set_axis(lote.index)
+            else:
+                valores = pd.to_numeric(valores, errors='coerce')
+            invalidos = ~np.isfinite(valores.to_numpy(dtype=np.float64))
+        dados[coluna] = valores
+        if invalidos.any():
+            erros[invalidos] += coluna + ' inválido; '
+
+    return (pd.DataFrame(dados, index=lote.index), erros.str.rstrip('; '))
+
+
+# Precifica um bloco de anúncios. Retorna o bloco com as colunas "preco_previsto" e "erro"
+def precificar_lote(lote, modelo, colunas):
+    preparacao = modelo.named_steps['preparacao']
+    dados, erros = coagir_lote(lote, preparacao, colunas)
+    validas = (erros == '').to_numpy()
+
+    precos = np.full(lote.shape[0], np.nan)
+    if validas.any():
+        precos[validas] = modelo.predict(dados[validas])
+    return lote.assign(preco_previsto=np.round(precos, 2), erro=erros)
+
+
+# Lê o arquivo (caminho ou arquivo aberto) em blocos de "tamanho_lote" linhas
+# formato: 'csv' ou 'parquet' (None usa a extensão do nome do arquivo)
+def ler_lotes(arquivo, formato=None, tamanho_lote=TAMANHO_LOTE):
+    if formato is None:
+        formato = 'parquet' if pathlib.Path(getattr(arquivo, 'name', str(arquivo))).suffix == '.parquet' else 'csv'
+
+    if formato == 'parquet':
+        arquivo_parquet = pq.ParquetFile(arquivo)
+        if arquivo_parquet.metadata.num_rows == 0:
+            # Arquivo sem linhas: um bloco vazio, com as colunas do arquivo
+            yield arquivo_parquet.schema_arrow.empty_table().to_pandas()
+        for bloco in arquivo_parquet.iter_batches(batch_size=tamanho_lote):
+            yield bloco.to_pandas()
+    else:
+        try:
+            # low_memory=False: os tipos são inferidos com o bloco inteiro, sem avisos de tipos mistos
+            with pd.read_csv(arquivo, chunksize=tamanho_lote, low_memory=False) as leitor:
+                yield from leitor
+        except pd.errors.EmptyDataError:
+            # Arquivo vazio, sem nem o cabeçalho
+            yield pd.DataFrame()
+
+
+# Precifica todos os anúncios do arquivo, bloco a bloco
+def precificar_lotes(arquivo, modelo, formato=None, tamanho_lote=TAMANHO_LOTE):
+    preparacao = modelo.named_steps['preparacao']
+    colunas = None
+    for lote in ler_lotes(arquivo, formato, tamanho_lote):
+        if colunas is None:
+            colunas, faltantes = colunas_entrada(preparacao, lote.columns)
+            if faltantes:
+                raise ValueError('Colunas não encontradas no arquivo: {}'.format(', '.join(faltantes)))
+        yield precificar_lote(lote, modelo, colunas)
+
+
+# Precifica o arquivo e grava o resultado em CSV na "saida" (caminho ou arquivo aberto em modo texto)
+# O cabeçalho é sempre gravado, mesmo que o arquivo não tenha nenhum anúncio
+# Retorna um resumo: linhas lidas, linhas precificadas e tempo
+def precificar_arquivo(arquivo, saida, modelo, formato=None, tamanho_lote=TAMANHO_LOTE):
+    inicio = timeit.default_timer()
+    linhas, precificadas = 0, 0
+    for i, lote in enumerate(precificar_lotes(arquivo, modelo, formato, tamanho_lote)):
+        lote.to_csv(saida, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        linhas += lote.shape[0]
+        precificadas += int(lote['preco_previsto'].notna().sum())
+    return {'linhas': linhas, 'precificadas': precificadas, 'tempo': timeit.default_timer() - inicio}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precifica todos os anúncios de um arquivo CSV ou Parquet')
+    parser.add_argument('entrada', help='arquivo CSV ou Parquet com os anúncios')
+    parser.add_argument('saida', help='arquivo CSV com os preços')
+    parser.add_argument('--modelo', default=CAMINHO_MODELO, help='arquivo do modelo (Pipeline)')
+    parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE, help='linhas precificadas por vez')
+    args = parser.parse_args()
+
+    resumo = precificar_arquivo(args.entrada, args.saida, carregar_modelo(args.modelo),
+                                tamanho_lote=args.tamanho_lote)
+    print('Linhas: {} | Precificadas: {} | Tempo: {:.1f}s ({:.0f} linhas/min)'.format(
+        resumo['linhas'], resumo['precificadas'], resumo['tempo'], resumo['linhas'] / resumo['tempo'] * 60))
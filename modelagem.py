@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Funções de avaliação dos modelos usadas pelo notebook e pelos scripts.
+#
+# Além das métricas de acerto (R² e RSME, como em avaliar_modelo do notebook), mede o custo do modelo em produção:
+#     - tamanho do arquivo exportado
+#     - tempo de previsão de um anúncio (deploy) e de um lote de anúncios
+#
+# A comparação dos modelos (comparar_modelos) treina os modelos candidatos em paralelo, um por processo, com as
+# árvores de cada floresta divididas entre os núcleos restantes e sementes fixas, e gera uma tabela com o acerto,
+# os tempos, o aumento de memória durante o treino e o tamanho do arquivo de cada modelo.
+#
+# O script compara os modelos como são usados no deploy: Pipelines (PreparacaoAnuncios + modelo) treinados com a
+# base tratada sem encoding. Além das florestas e da regressão linear do notebook, inclui o HistGradientBoosting,
+# que usa as colunas categóricas (property_type, room_type, bed_type) diretamente, sem dummies. O tempo de previsão
+# e o tamanho exportado são medidos com o modelo do deploy (florestas convertidas para a floresta plana).
+#
+# Uso:
+#     python modelagem.py --saida comparacao.csv
+#     python modelagem.py --exportar HistGradientBoosting --saida-modelo deploy/modelo.joblib
+
+import argparse
+import functools
+import multiprocessing
+import os
+import pathlib
+import sys
+import tempfile
+import timeit
+
+import joblib
+import numpy as np
+import pandas as pd
+import psutil
+from sklearn.ensemble import ExtraTreesRegressor, HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from threadpoolctl import threadpool_limits
+
+from floresta_plana import converter_modelo, exportar_modelo_mmap
+from perfil import MonitorMemoria
+from preparacao import FEATURES_MODELO, PARAMETROS_LIMPEZA, PASTA_CACHE, PreparacaoAnuncios, preparar_bases
+
+
+# Semente usada em todos os modelos e na separação treino/teste (a mesma do notebook)
+SEMENTE = 10
+
+# Colunas categóricas usadas sem dummies pelo HistGradientBoosting
+COLUNAS_CATEGORICAS = list(PARAMETROS_LIMPEZA['colunas_categorias'])
+
+
+def metricas(y_teste, previsao):
+    r2 = r2_score(y_teste, previsao)
+    rsme = np.sqrt(mean_squared_error(y_teste, previsao))
+    return (r2, rsme)
+
+
+def avaliar_modelo(nome_modelo, y_teste, previsao):
+    r2, rsme = metricas(y_teste, previsao)
+    return f'Modelo: {nome_modelo}\nR²: {r2:.2%}\nRSME: {rsme:.2f}'
+
+
+# Tempo de previsão em milissegundos: mediana de uma linha por vez e média por linha em um lote
+def medir_latencia(modelo, x, n_linhas=50, tamanho_lote=1000):
+    # DataFrames são fatiados com iloc, para que Pipelines recebam as colunas pelo nome
+    x = x if isinstance(x, pd.DataFrame) else np.asarray(x)
+    linhas = x.iloc if isinstance(x, pd.DataFrame) else x
+    tempos = []
+    for i in range(min(n_linhas, x.shape[0])):
+        inicio = timeit.default_timer()
+        modelo.predict(linhas[i:i + 1])
+        tempos.append(timeit.default_timer() - inicio)
+
+    lote = linhas[:tamanho_lote]
+    inicio = timeit.default_timer()
+    modelo.predict(lote)
+    tempo_lote = timeit.default_timer() - inicio
+
+    return (np.median(tempos) * 1000, tempo_lote / lote.shape[0] * 1000)
+
+
+# Tamanho em MB do arquivo gerado pela exportação do modelo (floresta plana, sem compressão)
+def tamanho_exportado(modelo, float32=False):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = exportar_modelo_mmap(modelo, pathlib.Path(pasta) / 'modelo.joblib', float32)
+        return caminho.stat().st_size / 1024 ** 2
+
+
+# Modelos comparados no notebook
+def modelos_candidatos():
+    return {'RandomForest': RandomForestRegressor(),
+            'LinearRegression': LinearRegression(),
+            'ExtraTrees': ExtraTreesRegressor()}
+
+
+# HistGradientBoosting com suporte nativo às colunas categóricas, em um Pipeline que recebe a base sem encoding
+# As colunas categóricas são acrescentadas às features e viram códigos (0, 1, 2...) no PreparacaoAnuncios
+def montar_hgb(colunas=FEATURES_MODELO, colunas_categoricas=COLUNAS_CATEGORICAS, **parametros):
+    colunas = list(colunas) + [coluna for coluna in colunas_categoricas if coluna not in colunas]
+    parametros = dict({'max_iter': 500, 'early_stopping': False}, **parametros)
+    modelo = HistGradientBoostingRegressor(
+        categorical_features=[coluna in colunas_categoricas for coluna in colunas], **parametros)
+    return Pipeline([('preparacao', PreparacaoAnuncios(colunas=tuple(colunas))), ('modelo', modelo)])
+
+
+# Modelos comparados pelo script, como Pipelines que recebem a base tratada sem encoding (como no deploy)
+def pipelines_candidatos(colunas=FEATURES_MODELO):
+    candidatos = {nome: Pipeline([('preparacao', PreparacaoAnuncios(colunas=tuple(colunas))), ('modelo', modelo)])
+                  for nome, modelo in modelos_candidatos().items()}
+    candidatos['HistGradientBoosting'] = montar_hgb(colunas)
+    return candidatos
+
+
+# Pico de memória (RSS) do processo atual, em MB
+def memoria_pico():
+    if sys.platform == 'win32':
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+
+    import resource
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return pico / 1024 ** 2 if sys.platform == 'darwin' else pico / 1024
+
+
+# Treina e avalia um modelo (executado em um processo próprio)
+# n_threads: limite de threads do OpenMP/BLAS (HistGradientBoosting não tem n_jobs). None não limita
+# pasta_modelos: pasta onde o modelo treinado é salvo ("<nome do modelo>.joblib"). None não salva
+# Retorna (resultado, caminho do modelo salvo ou None)
+def avaliar_candidato(item, x_train, y_train, x_test, y_test, pasta_modelos=None, n_threads=None):
+    nome_modelo, modelo = item
+    # O processo começa com a memória herdada do processo principal (fork) ou com a cópia dos dados recebida:
+    # a memória do modelo é o aumento do pico em relação ao início, medido por uma thread durante o treino
+    memoria_inicial = psutil.Process().memory_info().rss
+    monitor = MonitorMemoria()
+    monitor.start()
+
+    with threadpool_limits(n_threads):
+        inicio = timeit.default_timer()
+        modelo.fit(x_train, y_train)
+        tempo_treino = timeit.default_timer() - inicio
+
+        inicio = timeit.default_timer()
+        previsao = modelo.predict(x_test)
+        tempo_previsao = timeit.default_timer() - inicio
+
+        # Tempo de previsão do modelo como é exportado para o deploy
+        latencia, latencia_lote = medir_latencia(converter_modelo(modelo), x_test)
+    memoria_treino = (monitor.finalizar() - memoria_inicial) / 1024 ** 2
+
+    r2, rsme = metricas(y_test, previsao)
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = pathlib.Path(pasta if pasta_modelos is None else pasta_modelos) / '{}.joblib'.format(nome_modelo)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(modelo, caminho)
+        tamanho = caminho.stat().st_size / 1024 ** 2
+    tamanho_deploy = tamanho_exportado(modelo)
+
+    resultado = {'modelo': nome_modelo, 'r2': r2, 'rsme': rsme, 'tempo_treino': tempo_treino,
+                 'tempo_previsao': tempo_previsao, 'memoria_treino_mb': memoria_treino, 'tamanho_mb': tamanho,
+                 'tamanho_exportado_mb': tamanho_deploy, 'latencia_ms': latencia, 'latencia_lote_ms': latencia_lote}
+    return (resultado, None if pasta_modelos is None else caminho)
+
+
+# Treina e avalia os modelos em paralelo, um modelo por processo
+# n_processos: modelos treinados ao mesmo tempo (None: todos). Os núcleos restantes são divididos entre as árvores
+#              de cada floresta (n_jobs). Com 1, os modelos são treinados um após o outro, cada um com todos os núcleos
+# Cada modelo é treinado em um processo novo, para que o pico de memória de um não se misture com o de outro.
+# pasta_modelos: pasta onde cada processo salva o seu modelo treinado. Os modelos não voltam pelo Pool (o que
+#                manteria o modelo serializado e o desserializado na memória do processo principal ao mesmo tempo)
+# Retorna (resultados, caminhos): a tabela de resultados e {nome: arquivo do modelo} (None sem pasta_modelos)
+def comparar_modelos(modelos, x_train, y_train, x_test, y_test, n_processos=None, semente=SEMENTE,
+                     pasta_modelos=None):
+    nucleos = os.cpu_count() or 1
+    n_processos = min(n_processos or nucleos, len(modelos))
+    n_jobs = max(1, nucleos // n_processos)
+
+    for modelo in modelos.values():
+        # Em Pipelines, os parâmetros do modelo têm o prefixo do passo ("modelo__random_state")
+        for parametro in modelo.get_params():
+            if parametro == 'random_state' or parametro.endswith('__random_state'):
+                modelo.set_params(**{parametro: semente})
+            if parametro == 'n_jobs' or parametro.endswith('__n_jobs'):
+                modelo.set_params(**{parametro: n_jobs})
+
+    avaliar = functools.partial(avaliar_candidato, x_train=x_train, y_train=y_train, x_test=x_test, y_test=y_test,
+                                pasta_modelos=pasta_modelos, n_threads=n_jobs)
+    with multiprocessing.Pool(n_processos, maxtasksperchild=1) as pool:
+        avaliados = pool.map(avaliar, modelos.items(), chunksize=1)
+
+    resultados = pd.DataFrame([resultado for resultado, _ in avaliados]).set_index('modelo')
+    caminhos = {nome: caminho for nome, (_, caminho) in zip(modelos, avaliados)}
+    return (resultados.sort_values('r2', ascending=False), caminhos if pasta_modelos is not None else None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compara os modelos candidatos (R², RSME, tempos, memória e tamanho)')
+    parser.add_argument('--dataset', default='dataset', help='pasta com os arquivos mensais')
+    parser.add_argument('--processos', type=int, default=None, help='modelos treinados ao mesmo tempo')
+    parser.add_argument('--saida', default=None, help='arquivo CSV com a tabela de resultados')
+    parser.add_argument('--exportar', default=None, choices=list(pipelines_candidatos()),
+                        help='modelo exportado para o deploy')
+    parser.add_argument('--saida-modelo', default='deploy/modelo.joblib', help='arquivo do modelo exportado')
+    args = parser.parse_args()
+
+    base_airbnb = preparar_bases(args.dataset, pasta_cache=PASTA_CACHE)
+    x_train, x_test, y_train, y_test = train_test_split(base_airbnb.drop(columns='price'), base_airbnb['price'],
+                                                        random_state=SEMENTE)
+    with tempfile.TemporaryDirectory() as pasta_modelos:
+        resultados, caminhos = comparar_modelos(pipelines_candidatos(), x_train, y_train, x_test, y_test,
+                                                args.processos, pasta_modelos=pasta_modelos)
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(resultados.round(4))
+        if args.saida is not None:
+            resultados.to_csv(args.saida)
+        if args.exportar is not None:
+            modelo = joblib.load(caminhos[args.exportar])
+            print('Modelo exportado: {}'.format(exportar_modelo_mmap(modelo, args.saida_modelo)))
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Medição das etapas de uma execução (leitura, limpeza, encoding, treino, exportação...).
+#
+# Cada etapa é medida com um "with perfil.etapa('nome'):" e registra:
+#     - tempo (relógio) e tempo de CPU do processo e dos processos filhos (leitura paralela dos arquivos)
+#     - pico de memória residente (RSS) durante a etapa, somando os processos filhos, medido por uma thread que
+#       consulta a memória a cada "intervalo" segundos, e a memória ao final da etapa
+#     - linhas de entrada e de saída (informadas pelo código da etapa)
+# Etapas podem ser aninhadas ("limpeza" contém "limpeza/outliers", por exemplo).
+#
+# Ao final, o relatório da execução é gravado em JSON (um arquivo por execução, em cache/perfil), junto com as
+# versões das bibliotecas e a quantidade de núcleos, para acompanhar a evolução dos tempos conforme a base cresce.
+# As funções que recebem "perfil=None" não medem nada quando nenhum perfil é informado.
+
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import platform
+import threading
+import time
+
+import numpy
+import pandas as pd
+import psutil
+import sklearn
+
+
+# Mesma pasta de cache de preparacao.PASTA_CACHE (este módulo é importado pelo preparacao)
+PASTA_PERFIL = pathlib.Path('cache') / 'perfil'
+
+# Intervalo entre as medições de memória, em segundos
+INTERVALO_MEMORIA = 0.05
+
+
+def memoria_processos(processo):
+    memoria = processo.memory_info().rss
+    for filho in processo.children(recursive=True):
+        try:
+            memoria += filho.memory_info().rss
+        except psutil.Error:
+            # O filho terminou entre a listagem e a medição
+            continue
+    return memoria
+
+
+# Consulta a memória do processo (e dos filhos) em uma thread, guardando o maior valor
+class MonitorMemoria(threading.Thread):
+
+    def __init__(self, intervalo=INTERVALO_MEMORIA):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.processo = psutil.Process()
+        self.pico = memoria_processos(self.processo)
+        self.parar = threading.Event()
+
+    def run(self):
+        while not self.parar.wait(self.intervalo):
+            self.pico = max(self.pico, memoria_processos(self.processo))
+
+    def finalizar(self):
+        self.parar.set()
+        self.join()
+        self.pico = max(self.pico, memoria_processos(self.processo))
+        return self.pico
+
+
+class PerfilExecucao:
+
+    def __init__(self, nome='treino', parametros=None, intervalo=INTERVALO_MEMORIA):
+        self.nome = nome
+        self.parametros = parametros or {}
+        self.intervalo = intervalo
+        self.inicio = datetime.datetime.now()
+        # Em ordem de início: as etapas aninhadas ficam depois da etapa que as contém
+        self.etapas = []
+        self.caminho_atual = []
+
+    # O dict devolvido pode receber 'linhas_saida' (ou outras informações) durante a etapa
+    @contextlib.contextmanager
+    def etapa(self, nome, linhas_entrada=None):
+        self.caminho_atual.append(nome)
+        registro = {'etapa': '/'.join(self.caminho_atual), 'linhas_entrada': linhas_entrada, 'linhas_saida': None}
+        self.etapas.append(registro)
+        processo = psutil.Process()
+        cpu_inicio = processo.cpu_times()
+        monitor = MonitorMemoria(self.intervalo)
+        monitor.start()
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            duracao = time.perf_counter() - inicio
+            pico = monitor.finalizar()
+            cpu_fim = processo.cpu_times()
+            self.caminho_atual.pop()
+            registro.update({
+                'tempo_s': duracao,
+                'cpu_s': (cpu_fim.user + cpu_fim.system) - (cpu_inicio.user + cpu_inicio.system),
+                # Somente processos filhos que já terminaram (Linux)
+                'cpu_filhos_s': (getattr(cpu_fim, 'children_user', 0) + getattr(cpu_fim, 'children_system', 0) -
+                                 getattr(cpu_inicio, 'children_user', 0) - getattr(cpu_inicio, 'children_system', 0)),
+                'pico_rss_mb': pico / 1024 ** 2,
+                'rss_final_mb': processo.memory_info().rss / 1024 ** 2})
+
+    def relatorio(self):
+        return {'nome': self.nome,
+                'inicio': self.inicio.isoformat(timespec='seconds'),
+                'ambiente': ambiente(),
+                'parametros': self.parametros,
+                'etapas': self.etapas}
+
+    # Grava o relatório em JSON. Retorna o caminho do arquivo
+    # O nome tem o início com microssegundos e o número do processo: execuções no mesmo segundo (ou ao mesmo tempo,
+    # em processos diferentes) não sobrescrevem o relatório uma da outra, e a ordem dos nomes continua cronológica
+    def salvar(self, pasta=PASTA_PERFIL):
+        base = '{}-{}-{}'.format(self.nome, self.inicio.strftime('%Y%m%d-%H%M%S-%f'), os.getpid())
+        caminho = pathlib.Path(pasta) / '{}.json'.format(base)
+        sufixo = 1
+        while caminho.exists():
+            caminho = pathlib.Path(pasta) / '{}-{}.json'.format(base, sufixo)
+            sufixo += 1
+        return gravar_relatorio(self.relatorio(), caminho)
+
+
+# Etapa do perfil, ou um contexto que não mede nada quando não há perfil
+def etapa(perfil, nome, linhas_entrada=None):
+    if perfil is None:
+        return contextlib.nullcontext({})
+    return perfil.etapa(nome, linhas_entrada)
+
+
+def ambiente():
+    return {'python': platform.python_version(), 'plataforma': platform.platform(), 'nucleos': os.cpu_count(),
+            'memoria_total_mb': psutil.virtual_memory().total / 1024 ** 2,
+            'numpy': numpy.__version__, 'pandas': pd.__version__, 'scikit_learn': sklearn.__version__}
+
+
+# Grava um relatório em JSON (arquivo temporário + os.replace: um relatório nunca fica gravado pela metade)
+def gravar_relatorio(relatorio, caminho):
+    caminho = pathlib.Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(caminho.name + '.tmp')
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def ler_relatorio(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+# Relatório mais recente da pasta com o mesmo nome de execução (None se não houver)
+# ignorar: caminho de um relatório que não deve ser considerado (o da execução atual, por exemplo)
+def ultimo_relatorio(nome, pasta=PASTA_PERFIL, ignorar=None):
+    caminhos = [caminho for caminho in sorted(pathlib.Path(pasta).glob('{}-*.json'.format(nome)))
+                if ignorar is None or caminho.resolve() != pathlib.Path(ignorar).resolve()]
+    return ler_relatorio(caminhos[-1]) if caminhos else None
+
+
+def tabela_etapas(relatorio):
+    return pd.DataFrame(relatorio['etapas']).set_index('etapa')
+
+
+# Tempo e pico de memória de cada etapa comparados com um relatório anterior (razão atual / anterior)
+def comparar_relatorios(atual, anterior):
+    atual, anterior = tabela_etapas(atual), tabela_etapas(anterior)
+    comparacao = atual[['linhas_saida', 'tempo_s', 'pico_rss_mb']].join(
+        anterior[['linhas_saida', 'tempo_s', 'pico_rss_mb']], rsuffix='_anterior')
+    comparacao['razao_tempo'] = comparacao['tempo_s'] / comparacao['tempo_s_anterior']
+    comparacao['razao_memoria'] = comparacao['pico_rss_mb'] / comparacao['pico_rss_mb_anterior']
+    return comparacao
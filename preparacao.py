@@ -0,0 +1,529 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Tratamento da base do AirBnB sem as etapas de visualização do notebook.
+#
+# As funções deste módulo aplicam a mesma sequência de limpeza e encoding do Projeto_AirBnB_RJ:
+#     1. Remoção de colunas majoritariamente nulas e das linhas com valores nulos
+#     2. Conversão de 'price' e 'extra_people' para número
+#     3. Exclusão de outliers
+#     4. Agrupamento das categorias pouco frequentes em "Outros"
+#     5. Contagem das amenities
+#     6. Encoding (valores t/f e variáveis dummies)
+#
+# As bases tratadas ficam em cache (Parquet). A chave do cache é formada pelos nomes, tamanhos e datas de
+# modificação dos arquivos da pasta "dataset" e pelos parâmetros de limpeza. Enquanto nada disso mudar,
+# as bases são lidas direto do cache, sem refazer a leitura dos CSVs e a limpeza.
+
+import pathlib
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+
+from carregamento import carregar_base, gerar_chave, impressao_digital_arquivo, listar_arquivos, salvar_parquet
+from perfil import etapa
+
+
+# Parâmetros usados no notebook para a limpeza e o encoding da base
+PARAMETROS_LIMPEZA = {'limite_nulos': 300000,
+                      'colunas_outliers': ['price', 'extra_people', 'host_listings_count', 'accommodates',
+                                           'bathrooms', 'bedrooms', 'beds'],
+                      'colunas_remover': ['number_of_reviews'],
+                      'limiares_categorias': {'property_type': 2000, 'bed_type': 10000},
+                      'colunas_boolean': ['host_is_superhost', 'instant_bookable'],
+                      'colunas_categorias': ['property_type', 'room_type', 'bed_type']}
+
+# Deve ser incrementada sempre que a forma de tratar a base mudar, invalidando os caches antigos
+VERSAO_CACHE = 6
+
+# Versão do cálculo das features, gravada no Pipeline exportado (PreparacaoAnuncios.versao_). Deve ser incrementada
+# sempre que uma feature passar a ser calculada de outra forma: modelos de outra versão precisam ser retreinados.
+#     1: modelo original do notebook ("{}" contava como 1 amenity)
+#     2: "{}" conta como 0 amenities
+VERSAO_MODELO = 2
+
+PASTA_CACHE = pathlib.Path('cache')
+
+# Features usadas pelo modelo final (base_otimizada do notebook, após a Otimização v2)
+FEATURES_MODELO = ['host_listings_count', 'latitude', 'longitude', 'accommodates', 'bathrooms', 'bedrooms',
+                   'beds', 'extra_people', 'Ano', 'numero_amenities', 'instant_bookable']
+
+
+# define os limites de uma coluna do DF
+def limites(coluna):
+    q1 = coluna.quantile(0.25)
+    q3 = coluna.quantile(0.75)
+    amplitude = q3-q1
+    limite_inferior = q1-1.5*amplitude
+    limite_superior = q3+1.5*amplitude
+    return (limite_inferior, limite_superior)
+
+
+# Determinar função de exclusão de outliers
+# Retornará um dataframe sem outliers e o num de linhas excluidas
+def excluir_outliers(df, nome_coluna):
+    qtd_linhas = df.shape[0]
+    lim_inf, lim_sup = limites(df[nome_coluna])
+    df = df.loc[(df[nome_coluna]>=lim_inf) & (df[nome_coluna]<=lim_sup) , :]  # --> Pra filtrar usamos:  df.loc[linhas, colunas]
+    linhas_removidas = qtd_linhas-df.shape[0]
+    return (df, linhas_removidas)
+
+
+# Exclusão de outliers de várias colunas de uma vez
+# Ao invés de gerar uma cópia filtrada da base para cada coluna (excluir_outliers), monta uma única máscara
+# booleana com todas as colunas. A base é filtrada uma única vez, com base_airbnb.loc[mascara].
+#
+# sequencial=True: mesmo resultado das chamadas em sequência de excluir_outliers. Os limites de cada coluna
+#                  são calculados somente com as linhas que sobraram dos filtros das colunas anteriores.
+# sequencial=False: os limites de todas as colunas são calculados com a base inteira (mais rápido).
+# mascara: máscara inicial, para continuar uma filtragem já iniciada
+# limites_fixos: limites já calculados {coluna: (inferior, superior)}, ao invés de calculá-los na base
+#
+# Retorna a máscara e um relatório com os limites e a quantidade de linhas removidas por coluna
+def filtrar_outliers(df, colunas, sequencial=True, mascara=None, limites_fixos=None):
+    if mascara is None:
+        mascara = np.ones(df.shape[0], dtype=bool)
+    else:
+        mascara = np.asarray(mascara, dtype=bool).copy()
+    mascara_inicial = mascara.copy()
+
+    relatorio = []
+    for coluna in colunas:
+        valores = df[coluna].to_numpy()
+        if limites_fixos is not None:
+            lim_inf, lim_sup = limites_fixos[coluna]
+        elif sequencial:
+            lim_inf, lim_sup = limites(pd.Series(valores[mascara]))
+        else:
+            lim_inf, lim_sup = limites(pd.Series(valores[mascara_inicial]))
+
+        dentro = (valores >= lim_inf) & (valores <= lim_sup)
+        if sequencial:
+            removidas = int(np.count_nonzero(mascara & ~dentro))
+        else:
+            removidas = int(np.count_nonzero(mascara_inicial & ~dentro))
+        mascara &= dentro
+        relatorio.append({'coluna': coluna, 'limite_inferior': float(lim_inf), 'limite_superior': float(lim_sup),
+                          'linhas_removidas': removidas})
+
+    relatorio = pd.DataFrame(relatorio).set_index('coluna')
+    return (mascara, relatorio)
+
+
+# Retorna as categorias de uma coluna com pelo menos "limiar" ocorrências
+# As demais serão agrupadas em "Outros", que também entra na lista quando alguma categoria for agrupada
+def ajustar_categorias(coluna, limiar):
+    return categorias_mantidas(coluna.value_counts(), limiar)
+
+
+# Mesma regra de ajustar_categorias, a partir da contagem de cada valor
+def categorias_mantidas(contagem, limiar):
+    mantidas = contagem[contagem >= limiar].index.tolist()
+    if len(mantidas) < len(contagem):
+        mantidas.append('Outros')
+    return sorted(mantidas)
+
+
+# Troca por "Outros" os valores que não estão nas categorias mantidas, com uma única passada (isin) na coluna
+# Retorna uma nova base, sem alterar a base recebida
+def agrupar_categorias(df, coluna, categorias):
+    valores = df[coluna]
+    return df.assign(**{coluna: valores.where(valores.isin(categorias), 'Outros')})
+
+
+# Reduz a memória ocupada pela base:
+#     1. Colunas com valores 't'/'f' viram bool
+#     2. Colunas de texto com poucos valores distintos viram category
+#     3. Colunas numéricas com valores inteiros viram o menor tipo inteiro que comporta os valores
+#     4. Colunas float64 viram float32 quando não há perda de precisão (latitude e longitude, por exemplo, continuam float64)
+# Valores monetários (colunas_float) são sempre mantidos como float32, mesmo que todos os valores sejam inteiros.
+#
+# Retorna a nova base e um relatório da memória (em bytes) antes e depois, por coluna
+def otimizar_tipos(df, colunas_tf=PARAMETROS_LIMPEZA['colunas_boolean'], colunas_float=('price', 'extra_people'),
+                   proporcao_categorias=0.5):
+    memoria_antes = df.memory_usage(index=False, deep=True)
+    tipos_antes = df.dtypes
+
+    colunas = {}
+    for coluna in df:
+        valores = df[coluna]
+        if coluna in colunas_tf and not pd.api.types.is_bool_dtype(valores):
+            colunas[coluna] = valores == 't'
+        elif coluna in colunas_float:
+            if pd.api.types.is_float_dtype(valores):
+                colunas[coluna] = valores.astype(np.float32)
+        elif pd.api.types.is_object_dtype(valores) or pd.api.types.is_string_dtype(valores):
+            if valores.nunique() <= proporcao_categorias * len(valores):
+                colunas[coluna] = valores.astype('category')
+        elif pd.api.types.is_numeric_dtype(valores) and not pd.api.types.is_bool_dtype(valores):
+            if len(valores) and np.array_equal(valores, np.round(valores)):
+                tipo = 'unsigned' if valores.min() >= 0 else 'integer'
+                colunas[coluna] = pd.to_numeric(valores, downcast=tipo)
+            elif valores.dtype == np.float64 and np.array_equal(valores, valores.astype(np.float32)):
+                colunas[coluna] = valores.astype(np.float32)
+    df = df.assign(**colunas)
+
+    relatorio = pd.DataFrame({'tipo_antes': tipos_antes.astype(str), 'tipo_depois': df.dtypes.astype(str),
+                              'memoria_antes': memoria_antes, 'memoria_depois': df.memory_usage(index=False, deep=True)})
+    return (df, relatorio)
+
+
+# Conta as amenities de cada imóvel, no formato "{TV,Wifi,"Air conditioning"}"
+# Ao invés de criar uma lista para cada linha (str.split) e calcular o tamanho de cada uma (apply(len)),
+# conta diretamente as vírgulas de cada texto. O conjunto vazio "{}" tem 0 amenities.
+# ATENÇÃO: no notebook original, "{}" contava como 1 amenity (str.split(',') de "{}" tem um item). Modelos treinados
+# com a contagem antiga precisam ser treinados novamente (ver VERSAO_MODELO).
+def contar_amenities(coluna):
+    valores = coluna.fillna('{}').astype(str)
+    virgulas = valores.str.count(',').to_numpy(dtype=np.int64)
+    tamanhos = valores.str.len().to_numpy(dtype=np.int64)
+    # Qualquer texto com conteúdo entre as chaves tem uma amenity a mais que o número de vírgulas
+    return pd.Series(virgulas + (tamanhos > 2), index=coluna.index, name='numero_amenities')
+
+
+# Separa o texto de amenities nos nomes de cada amenity
+def separar_amenities(texto):
+    texto = texto.strip('{}')
+    if not texto:
+        return []
+    return [amenity.strip('"') for amenity in texto.split(',')]
+
+
+# Gera uma matriz esparsa (uma coluna por amenity, 1 quando o imóvel tem a amenity)
+# min_ocorrencias: amenities presentes em menos imóveis que isso são descartadas
+# Retorna a matriz (scipy.sparse, uint8) e os nomes das amenities de cada coluna
+def matriz_amenities(coluna, min_ocorrencias=1):
+    vetorizador = CountVectorizer(tokenizer=separar_amenities, token_pattern=None, lowercase=False, binary=True,
+                                  min_df=min_ocorrencias, dtype=np.uint8)
+    matriz = vetorizador.fit_transform(coluna.fillna('{}').to_numpy(dtype=object))
+    return (matriz, vetorizador.get_feature_names_out())
+
+
+# Converte valores no formato "$1,234.00" para float32, em uma única passada vetorizada
+# Retorna os valores convertidos e as linhas que não puderam ser convertidas (essas ficam como NaN)
+#
+# Os textos são convertidos para um array de bytes (uma linha por valor, uma coluna por caractere).
+# O número é montado percorrendo as colunas de caracteres: cada dígito é acumulado no valor inteiro e
+# os dígitos após o ponto contam as casas decimais. "$", "," e espaços são ignorados, qualquer outro caractere invalida a linha.
+def converter_moeda(coluna):
+    valores = coluna.to_numpy(dtype=object)
+    nulos = pd.isna(valores)
+    valores = np.where(nulos, '', valores)
+    try:
+        caracteres = valores.astype('S')
+    except UnicodeEncodeError:
+        caracteres = pd.Series(valores).astype(str).str.encode('ascii', errors='replace').to_numpy().astype('S')
+    caracteres = caracteres.view(np.uint8).reshape(len(valores), caracteres.dtype.itemsize)
+
+    numero = np.zeros(len(valores), dtype=np.int64)
+    casas_decimais = np.zeros(len(valores), dtype=np.int64)
+    qtd_digitos = np.zeros(len(valores), dtype=np.int64)
+    passou_ponto = np.zeros(len(valores), dtype=bool)
+    invalido = nulos.copy()
+
+    for caractere in caracteres.T:
+        digito = (caractere >= ord('0')) & (caractere <= ord('9'))
+        ponto = caractere == ord('.')
+        ignorado = (caractere == ord('$')) | (caractere == ord(',')) | (caractere == ord(' ')) | (caractere == 0)
+        invalido |= ~(digito | ponto | ignorado) | (ponto & passou_ponto)
+
+        numero = np.where(digito, numero * 10 + (caractere - ord('0')), numero)
+        casas_decimais += digito & passou_ponto
+        qtd_digitos += digito
+        passou_ponto |= ponto
+
+    # Sem dígitos ou com dígitos demais para o int64
+    invalido |= (qtd_digitos == 0) | (qtd_digitos > 18)
+
+    resultado = (numero / 10.0 ** casas_decimais).astype(np.float32)
+    resultado[invalido] = np.nan
+    return (pd.Series(resultado, index=coluna.index, name=coluna.name), coluna[invalido])
+
+
+# Aplica a limpeza do notebook e retorna a base tratada (ainda sem o encoding) e as estatísticas usadas
+# estatisticas: limites de outliers e categorias de uma execução anterior. Com elas, a base é tratada
+# exatamente como a anterior, sem recalcular nada (usado na atualização mensal, ver atualizacao.py).
+# Quando None, as estatísticas são calculadas a partir da própria base.
+# perfil: PerfilExecucao (ver perfil.py) que mede cada passo da limpeza (None não mede)
+def limpar_base(base_airbnb, parametros=PARAMETROS_LIMPEZA, estatisticas=None, perfil=None):
+    ajustar = estatisticas is None
+    with etapa(perfil, 'nulos', base_airbnb.shape[0]) as registro:
+        if ajustar:
+            estatisticas = {'colunas': [], 'limites': {}, 'categorias': {}}
+            for col in base_airbnb:
+                if base_airbnb[col].isnull().sum() <= parametros['limite_nulos']:
+                    estatisticas['colunas'].append(col)
+
+        # Colunas ausentes nos arquivos novos ficam nulas (e as linhas são excluídas pelo dropna)
+        base_airbnb = base_airbnb.reindex(columns=estatisticas['colunas']).dropna()
+        registro['linhas_saida'] = base_airbnb.shape[0]
+
+    with etapa(perfil, 'moeda', base_airbnb.shape[0]) as registro:
+        price, _ = converter_moeda(base_airbnb['price'])
+        extra_people, _ = converter_moeda(base_airbnb['extra_people'])
+        base_airbnb = base_airbnb.assign(price=price, extra_people=extra_people)
+        base_airbnb = base_airbnb.dropna(subset=['price', 'extra_people'])
+        registro['linhas_saida'] = base_airbnb.shape[0]
+
+    with etapa(perfil, 'outliers', base_airbnb.shape[0]) as registro:
+        base_airbnb = filtrar_base(base_airbnb, parametros['colunas_outliers'], estatisticas, ajustar)
+        registro['linhas_saida'] = base_airbnb.shape[0]
+
+    base_airbnb = base_airbnb.drop(parametros['colunas_remover'], axis=1)
+
+    with etapa(perfil, 'categorias', base_airbnb.shape[0]) as registro:
+        for coluna in parametros['colunas_categorias']:
+            if ajustar:
+                limiar = parametros['limiares_categorias'].get(coluna, 0)
+                estatisticas['categorias'][coluna] = ajustar_categorias(base_airbnb[coluna], limiar)
+            if coluna in parametros['limiares_categorias']:
+                base_airbnb = agrupar_categorias(base_airbnb, coluna, estatisticas['categorias'][coluna])
+        registro['linhas_saida'] = base_airbnb.shape[0]
+
+    with etapa(perfil, 'amenities', base_airbnb.shape[0]) as registro:
+        base_airbnb = base_airbnb.assign(numero_amenities=contar_amenities(base_airbnb['amenities']))
+        base_airbnb = base_airbnb.drop('amenities', axis=1)
+        base_airbnb = filtrar_base(base_airbnb, ['numero_amenities'], estatisticas, ajustar)
+        registro['linhas_saida'] = base_airbnb.shape[0]
+
+    with etapa(perfil, 'tipos', base_airbnb.shape[0]) as registro:
+        base_airbnb, _ = otimizar_tipos(base_airbnb.reset_index(drop=True), parametros['colunas_boolean'])
+        registro['linhas_saida'] = base_airbnb.shape[0]
+    return (base_airbnb, estatisticas)
+
+
+# Exclui os outliers das colunas, calculando os limites (ajustar=True) ou usando os limites já guardados
+def filtrar_base(base_airbnb, colunas, estatisticas, ajustar):
+    limites_fixos = None if ajustar else estatisticas['limites']
+    mascara, relatorio = filtrar_outliers(base_airbnb, colunas, limites_fixos=limites_fixos)
+    for coluna in colunas:
+        estatisticas['limites'][coluna] = [relatorio.loc[coluna, 'limite_inferior'], relatorio.loc[coluna, 'limite_superior']]
+    return base_airbnb.loc[mascara, :]
+
+
+# Aplica o encoding do notebook: t/f para 1/0 e variáveis dummies para as colunas categóricas
+# Com as estatísticas da limpeza, as dummies são criadas sempre para as mesmas categorias (mesmas colunas),
+# mesmo que algum mês não tenha todas elas. Categorias desconhecidas ficam com todas as dummies zeradas.
+# As dummies são uint8 (esparso=True gera colunas esparsas, ocupando memória somente para os valores 1)
+def codificar_base(base_airbnb, parametros=PARAMETROS_LIMPEZA, estatisticas=None, esparso=False):
+    colunas = {}
+    for coluna in parametros['colunas_boolean']:
+        valores = base_airbnb[coluna]
+        if not pd.api.types.is_bool_dtype(valores):
+            valores = valores == 't'
+        colunas[coluna] = valores.astype(np.uint8)
+
+    if estatisticas is not None:
+        for coluna in parametros['colunas_categorias']:
+            colunas[coluna] = pd.Categorical(base_airbnb[coluna], categories=estatisticas['categorias'][coluna])
+
+    base_airbnb_cod = base_airbnb.assign(**colunas)
+    return pd.get_dummies(data=base_airbnb_cod, columns=parametros['colunas_categorias'], dtype=np.uint8, sparse=esparso)
+
+
+# Nomes das colunas que codificar_base geraria (sem a coluna do alvo), na mesma ordem, sem montar a base com encoding:
+# as colunas que não são categóricas, seguidas das dummies de cada coluna categórica ("coluna_valor")
+def colunas_codificadas(base_airbnb, parametros=PARAMETROS_LIMPEZA, coluna_alvo='price'):
+    categoricas = parametros['colunas_categorias']
+    colunas = [coluna for coluna in base_airbnb.columns if coluna not in categoricas and coluna != coluna_alvo]
+    for coluna in categoricas:
+        valores = base_airbnb[coluna]
+        if isinstance(valores.dtype, pd.CategoricalDtype):
+            categorias = valores.cat.categories
+        else:
+            categorias = sorted(valores.dropna().unique())
+        colunas.extend('{}_{}'.format(coluna, categoria) for categoria in categorias)
+    return pd.Index(colunas)
+
+
+# Chave do cache: arquivos da pasta "dataset" + parâmetros de limpeza
+def chave_cache(caminho_base, parametros=PARAMETROS_LIMPEZA):
+    arquivos = [impressao_digital_arquivo(arquivo) for arquivo in listar_arquivos(caminho_base)]
+    return gerar_chave(VERSAO_CACHE, arquivos, parametros)
+
+
+# Lê a base tratada do cache. Retorna None caso não exista cache para a chave
+def ler_cache(chave, pasta_cache=PASTA_CACHE):
+    caminho = pathlib.Path(pasta_cache) / chave / 'base_airbnb.parquet'
+    if not caminho.exists():
+        return None
+    return pd.read_parquet(caminho)
+
+
+def salvar_cache(chave, base_airbnb, pasta_cache=PASTA_CACHE):
+    salvar_parquet(base_airbnb, pathlib.Path(pasta_cache) / chave / 'base_airbnb.parquet')
+
+
+# Retorna a base tratada (base_airbnb), usando o cache sempre que possível
+# A base com encoding não é montada nem salva: as features são escritas direto da base tratada (montar_matriz,
+# separar_treino_teste e PreparacaoAnuncios), e os nomes das colunas do encoding vêm de colunas_codificadas
+# Quando o cache não pode ser usado, somente os arquivos novos são lidos do CSV (os demais vêm do cache de partições)
+def preparar_bases(caminho_base, parametros=PARAMETROS_LIMPEZA, pasta_cache=PASTA_CACHE, n_processos=None):
+    chave = chave_cache(caminho_base, parametros)
+    base_airbnb = ler_cache(chave, pasta_cache)
+    if base_airbnb is not None:
+        return base_airbnb
+
+    base_airbnb = carregar_base(caminho_base, n_processos=n_processos, pasta_cache=pasta_cache)
+    base_airbnb, _ = limpar_base(base_airbnb, parametros)
+
+    salvar_cache(chave, base_airbnb, pasta_cache)
+    return base_airbnb
+
+
+# Valores aceitos como verdadeiro nas colunas t/f (base original, widgets do deploy, bool e 1/0)
+VALORES_VERDADEIROS = ['t', 'true', 'sim', '1', '1.0']
+
+
+# Pré-processamento dos anúncios no formato do scikit-learn (fit/transform), para ser usado em um Pipeline
+# junto com o modelo. Assim o treino e o deploy usam exatamente o mesmo tratamento.
+#
+# Recebe um DataFrame (ou algo que vire um DataFrame: dict, lista de dicts) com as colunas originais e retorna
+# um DataFrame float32 com as colunas na ordem de "colunas", sempre a mesma ordem usada no treino:
+#     - Colunas t/f aceitam 't'/'f', 'Sim'/'Não', bool ou 1/0
+#     - Colunas monetárias aceitam número ou texto no formato "$1,234.00"
+#     - 'numero_amenities' pode ser calculada a partir da coluna 'amenities'
+#     - Dummies ("room_type_Private room", por exemplo) são geradas a partir da coluna categórica, com o
+#       agrupamento em "Outros" aprendido no fit
+#     - A própria coluna categórica ("room_type") vira o código da categoria (0, 1, 2...), para modelos com suporte
+#       nativo a categorias. Categorias não vistas no fit ficam NaN
+class PreparacaoAnuncios(BaseEstimator, TransformerMixin):
+
+    def __init__(self, colunas=tuple(FEATURES_MODELO), colunas_tf=tuple(PARAMETROS_LIMPEZA['colunas_boolean']),
+                 colunas_categorias=tuple(PARAMETROS_LIMPEZA['colunas_categorias']),
+                 limiares_categorias=None, colunas_moeda=('price', 'extra_people')):
+        self.colunas = colunas
+        self.colunas_tf = colunas_tf
+        self.colunas_categorias = colunas_categorias
+        self.limiares_categorias = limiares_categorias
+        self.colunas_moeda = colunas_moeda
+
+    def fit(self, X, y=None):
+        X = self._dataframe(X)
+        limiares = self.limiares_categorias or PARAMETROS_LIMPEZA['limiares_categorias']
+        self.colunas_ = list(self.colunas)
+        self.categorias_ = {}
+        for coluna in self.colunas_categorias:
+            usada = coluna in self.colunas_ or any(nome.startswith(coluna + '_') for nome in self.colunas_)
+            if usada and coluna in X:
+                self.categorias_[coluna] = categorias_mantidas(self._contagem_texto(X[coluna]), limiares.get(coluna, 0))
+        self.n_features_in_ = len(self.colunas_)
+        self.versao_ = VERSAO_MODELO
+        return self
+
+    def transform(self, X):
+        # Mantém os nomes das colunas, conferidos pelo modelo (treinado com um DataFrame) na previsão
+        return pd.DataFrame(self.matriz(X), columns=self.colunas_, copy=False)
+
+    # Features em uma única matriz float32 contínua, escrita coluna a coluna, sem DataFrames intermediários
+    # ordem: posição (iloc) das linhas de X em cada linha da matriz (None mantém a ordem de X)
+    def matriz(self, X, ordem=None):
+        X = self._dataframe(X)
+        saida = np.empty((X.shape[0] if ordem is None else len(ordem), len(self.colunas_)), dtype=np.float32)
+        codigos = {}
+        for i, coluna in enumerate(self.colunas_):
+            valores = self._coluna(X, coluna, codigos)
+            saida[:, i] = valores if ordem is None else valores[ordem]
+        return saida
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(self.colunas_, dtype=object)
+
+    # Contagem dos valores da coluna como texto (nulos como "nan"), sem converter a coluna inteira para texto
+    @staticmethod
+    def _contagem_texto(valores):
+        contagem = valores.value_counts(dropna=False)
+        contagem = contagem[contagem > 0]
+        return contagem.groupby(np.asarray(contagem.index.astype(str))).sum()
+
+    @staticmethod
+    def _dataframe(X):
+        if isinstance(X, pd.DataFrame):
+            return X
+        if isinstance(X, dict) and not any(np.ndim(valor) for valor in X.values()):
+            return pd.DataFrame(X, index=[0])
+        return pd.DataFrame(X)
+
+    # Código de cada linha nas categorias aprendidas no fit (-1 nas desconhecidas)
+    # Calculado uma única vez por coluna categórica em cada chamada, mesmo que a coluna gere várias dummies.
+    # O agrupamento em "Outros" é feito nos valores distintos da coluna (poucos), e não linha a linha
+    def _codigos(self, X, categoria, codigos):
+        if categoria not in codigos:
+            mantidas = self.categorias_[categoria]
+            valores = X[categoria]
+            if not isinstance(valores.dtype, pd.CategoricalDtype):
+                valores = valores.astype('category')
+            distintos = valores.cat.categories.astype(str)
+            # O último item é o código dos valores nulos (código -1 da coluna), agrupados como o texto "nan"
+            distintos = pd.Index(list(distintos) + ['nan'])
+            agrupados = np.where(distintos.isin(mantidas), distintos, 'Outros')
+            mapa = pd.Index(mantidas).get_indexer(agrupados)
+            codigos[categoria] = mapa[valores.cat.codes.to_numpy()]
+        return codigos[categoria]
+
+    def _coluna(self, X, coluna, codigos=None):
+        codigos = {} if codigos is None else codigos
+        if coluna in getattr(self, 'categorias_', {}) and coluna in X:
+            codigos_coluna = self._codigos(X, coluna, codigos)
+            return np.where(codigos_coluna >= 0, codigos_coluna, np.nan)
+
+        if coluna in X:
+            valores = X[coluna]
+            if coluna in self.colunas_tf:
+                if pd.api.types.is_bool_dtype(valores):
+                    return valores.to_numpy()
+                return valores.astype(str).str.lower().isin(VALORES_VERDADEIROS).to_numpy()
+            if coluna in self.colunas_moeda and not pd.api.types.is_numeric_dtype(valores):
+                valores, _ = converter_moeda(valores.astype(str))
+                return valores.to_numpy()
+            return pd.to_numeric(valores).to_numpy()
+
+        if coluna == 'numero_amenities' and 'amenities' in X:
+            return contar_amenities(X['amenities']).to_numpy()
+
+        for categoria, mantidas in getattr(self, 'categorias_', {}).items():
+            if coluna.startswith(categoria + '_') and categoria in X:
+                valor = coluna[len(categoria) + 1:]
+                if valor not in mantidas:
+                    return np.zeros(X.shape[0], dtype=bool)
+                return self._codigos(X, categoria, codigos) == mantidas.index(valor)
+
+        raise KeyError('Coluna "{}" não encontrada nos dados recebidos'.format(coluna))
+
+
+# Monta as features (colunas do encoding, ver colunas_codificadas) e o alvo direto da base tratada sem encoding
+# As features são escritas em uma única passada em uma matriz float32 contínua, sem as cópias intermediárias
+# (base_airbnb_cod, get_dummies, drop) e sem a conversão para float32 feita pelo modelo no fit.
+# ordem: posição (iloc) das linhas da base em cada linha da matriz (None mantém a ordem)
+# Retorna (x, y, preparacao): x é um DataFrame sobre a matriz (sem cópia), com o índice da base
+def montar_matriz(base_airbnb, colunas, ordem=None, coluna_alvo='price', preparacao=None):
+    if preparacao is None:
+        preparacao = PreparacaoAnuncios(colunas=tuple(colunas)).fit(base_airbnb)
+    indice = base_airbnb.index if ordem is None else base_airbnb.index[ordem]
+    x = pd.DataFrame(preparacao.matriz(base_airbnb, ordem), columns=preparacao.colunas_, index=indice, copy=False)
+    alvo = base_airbnb[coluna_alvo].to_numpy()
+    y = pd.Series(alvo if ordem is None else alvo[ordem], index=indice, name=coluna_alvo)
+    return (x, y, preparacao)
+
+
+# Mesma separação de train_test_split(x, y, random_state=semente), mas a matriz é escrita já na ordem treino + teste:
+# x_train e x_test são partes da mesma matriz, sem as cópias feitas pelo train_test_split
+# Retorna (x_train, x_test, y_train, y_test)
+def separar_treino_teste(base_airbnb, colunas, semente, proporcao_teste=0.25, coluna_alvo='price'):
+    indices_treino, indices_teste = train_test_split(np.arange(base_airbnb.shape[0]), test_size=proporcao_teste,
+                                                     random_state=semente)
+    x, y, _ = montar_matriz(base_airbnb, colunas, np.concatenate([indices_treino, indices_teste]), coluna_alvo)
+    n_treino = len(indices_treino)
+    return (x.iloc[:n_treino], x.iloc[n_treino:], y.iloc[:n_treino], y.iloc[n_treino:])
+
+
+# Monta o Pipeline (pré-processamento + modelo) a partir de um modelo já treinado
+# base_airbnb: base tratada e sem encoding, usada somente para aprender as categorias das dummies
+# colunas: colunas usadas no treino do modelo, na mesma ordem (novo_x.columns no notebook)
+def montar_pipeline(modelo, base_airbnb, colunas):
+    preparacao = PreparacaoAnuncios(colunas=tuple(colunas)).fit(base_airbnb)
+    return Pipeline([('preparacao', preparacao), ('modelo', modelo)])
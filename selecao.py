@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Seleção automática das features do modelo (eliminação recursiva por importância de permutação).
+#
+# No notebook, a seleção era feita à mão: treinar o ExtraTrees com a base inteira, remover as features com menos
+# de 1% de importância, treinar de novo, remover mais colunas, treinar de novo... Aqui:
+#     1. Uma amostra da base de treino é separada em treino e validação
+#     2. Um ExtraTrees menor é treinado com a amostra e a importância de cada feature é medida por permutação
+#        na validação (quanto o R² cai quando a feature é embaralhada), com as features avaliadas em paralelo
+#     3. A feature menos importante é removida e o passo 2 é repetido, até restar "minimo_features"
+#     4. O conjunto escolhido é o menor cujo R² fica a até "tolerancia" do melhor R² da curva
+# Somente o modelo final é treinado com a base de treino inteira, uma única vez.
+#
+# As dummies de uma mesma coluna (room_type_..., property_type_...) são avaliadas e removidas juntas, para que
+# uma categoria não seja eliminada "parcialmente" (ver "ATENÇÃO!!!" no notebook).
+# Com as mesmas sementes, a curva e o conjunto escolhido são sempre os mesmos.
+#
+# Uso:
+#     python selecao.py --linhas 50000 --tolerancia 0.005 --saida-curva curva_features.csv
+
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+
+from modelagem import SEMENTE, metricas
+from preparacao import PARAMETROS_LIMPEZA, PASTA_CACHE, colunas_codificadas, preparar_bases, separar_treino_teste
+
+
+# Linhas da amostra usada na eliminação
+LINHAS_AMOSTRA = 50000
+# Perda de R² aceita para ficar com menos features
+TOLERANCIA = 0.005
+# Árvores do modelo usado na eliminação (o modelo final usa os parâmetros padrão)
+ARVORES_SELECAO = 50
+# Vezes que cada feature é embaralhada
+REPETICOES = 3
+
+
+# Agrupa as dummies com a coluna de origem. Retorna {grupo: [colunas]}, na ordem das colunas
+def agrupar_features(colunas, colunas_categorias=PARAMETROS_LIMPEZA['colunas_categorias']):
+    grupos = {}
+    for coluna in colunas:
+        grupo = next((categoria for categoria in colunas_categorias if coluna.startswith(categoria + '_')), coluna)
+        grupos.setdefault(grupo, []).append(coluna)
+    return grupos
+
+
+# Queda média do R² quando as colunas do grupo são embaralhadas (as mesmas linhas para todas as colunas do grupo)
+def queda_permutacao(modelo, x_val, y_val, colunas, r2_base, repeticoes=REPETICOES, semente=SEMENTE):
+    gerador = np.random.default_rng(semente)
+    quedas = []
+    for _ in range(repeticoes):
+        embaralhada = x_val.copy()
+        ordem = gerador.permutation(x_val.shape[0])
+        embaralhada[colunas] = x_val[colunas].to_numpy()[ordem]
+        quedas.append(r2_base - r2_score(y_val, modelo.predict(embaralhada)))
+    return float(np.mean(quedas))
+
+
+# Importância de permutação de cada grupo, calculada em paralelo (threads: o modelo não é copiado)
+def importancia_permutacao(modelo, x_val, y_val, grupos, repeticoes=REPETICOES, semente=SEMENTE, n_jobs=-1):
+    r2_base = r2_score(y_val, modelo.predict(x_val))
+    # Cada grupo tem a sua semente, para que o resultado não dependa da ordem de execução
+    quedas = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(queda_permutacao)(modelo, x_val, y_val, colunas, r2_base, repeticoes, [semente, i])
+        for i, colunas in enumerate(grupos.values()))
+    return pd.Series(quedas, index=list(grupos)).sort_values(ascending=False)
+
+
+# Eliminação recursiva em uma amostra de (x, y)
+# Retorna (ranking, curva):
+#     ranking: grupos do mais importante ao menos importante (ordem inversa da eliminação)
+#     curva: uma linha por etapa, com as features usadas, o R² e o RSME na validação e o grupo removido
+def eliminar_features(x, y, linhas_amostra=LINHAS_AMOSTRA, minimo_features=1, arvores=ARVORES_SELECAO,
+                      repeticoes=REPETICOES, semente=SEMENTE, n_jobs=-1):
+    if x.shape[0] > linhas_amostra:
+        amostra = x.sample(n=linhas_amostra, random_state=semente).index
+        x, y = x.loc[amostra], y.loc[amostra]
+    x_sel_train, x_val, y_sel_train, y_val = train_test_split(x, y, random_state=semente)
+
+    grupos = agrupar_features(x.columns)
+    curva, removidos = [], []
+    while grupos:
+        colunas = [coluna for colunas_grupo in grupos.values() for coluna in colunas_grupo]
+        modelo = ExtraTreesRegressor(n_estimators=arvores, random_state=semente, n_jobs=n_jobs)
+        modelo.fit(x_sel_train[colunas], y_sel_train)
+        # A floresta prevê com uma thread: o paralelismo fica na avaliação das features
+        modelo.set_params(n_jobs=1)
+        r2, rsme = metricas(y_val, modelo.predict(x_val[colunas]))
+        importancias = importancia_permutacao(modelo, x_val[colunas], y_val, grupos, repeticoes, semente, n_jobs)
+
+        menos_importante = importancias.index[-1]
+        fim = len(grupos) <= minimo_features
+        curva.append({'n_grupos': len(grupos), 'n_features': len(colunas), 'r2': r2, 'rsme': rsme,
+                      'removido': None if fim else menos_importante,
+                      'importancia_removido': None if fim else importancias.iloc[-1], 'features': colunas})
+        if fim:
+            removidos.extend(reversed(importancias.index))
+            break
+        removidos.append(menos_importante)
+        del grupos[menos_importante]
+
+    return (list(reversed(removidos)), pd.DataFrame(curva))
+
+
+# Menor conjunto de features com R² a até "tolerancia" do melhor R² da curva
+def escolher_features(curva, tolerancia=TOLERANCIA):
+    aceitas = curva[curva['r2'] >= curva['r2'].max() - tolerancia]
+    return list(aceitas.loc[aceitas['n_features'].idxmin(), 'features'])
+
+
+# Seleciona as features na amostra e treina o modelo final uma única vez, com a base de treino inteira
+# Retorna (features, curva, modelo, resultado). resultado['ranking'] tem os grupos de features (as dummies de uma
+# coluna formam um grupo) do mais importante ao menos importante, na ordem inversa da eliminação
+def selecionar_e_treinar(x_train, y_train, x_test, y_test, modelo=None, linhas_amostra=LINHAS_AMOSTRA,
+                         tolerancia=TOLERANCIA, semente=SEMENTE, n_jobs=-1):
+    inicio = timeit.default_timer()
+    ranking, curva = eliminar_features(x_train, y_train, linhas_amostra, semente=semente, n_jobs=n_jobs)
+    tempo_selecao = timeit.default_timer() - inicio
+    features = escolher_features(curva, tolerancia)
+
+    if modelo is None:
+        modelo = ExtraTreesRegressor(random_state=semente, n_jobs=n_jobs)
+    inicio = timeit.default_timer()
+    modelo.fit(x_train[features], y_train)
+    tempo_treino = timeit.default_timer() - inicio
+
+    r2, rsme = metricas(y_test, modelo.predict(x_test[features]))
+    resultado = {'n_features': len(features), 'r2': r2, 'rsme': rsme, 'tempo_selecao': tempo_selecao,
+                 'tempo_treino': tempo_treino, 'ranking': ranking}
+    return (features, curva, modelo, resultado)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seleção automática das features do modelo')
+    parser.add_argument('--dataset', default='dataset', help='pasta com os arquivos mensais')
+    parser.add_argument('--linhas', type=int, default=LINHAS_AMOSTRA, help='linhas da amostra usada na seleção')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA, help='perda de R² aceita')
+    parser.add_argument('--saida-curva', default=None, help='arquivo CSV com a curva de R² por etapa')
+    args = parser.parse_args()
+
+    base_airbnb = preparar_bases(args.dataset, pasta_cache=PASTA_CACHE)
+    colunas = colunas_codificadas(base_airbnb)
+    x_train, x_test, y_train, y_test = separar_treino_teste(base_airbnb, colunas, SEMENTE)
+    features, curva, _, resultado = selecionar_e_treinar(x_train, y_train, x_test, y_test, linhas_amostra=args.linhas,
+                                                         tolerancia=args.tolerancia)
+
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(curva.drop(columns='features').round(4).to_string(index=False))
+    print('\nRanking (do mais importante ao menos importante): {}'.format(resultado['ranking']))
+    print('Features escolhidas ({}): {}'.format(len(features), features))
+    print('Modelo final: R² {:.2%} | RSME {:.2f} | seleção {:.1f}s | treino {:.1f}s'.format(
+        resultado['r2'], resultado['rsme'], resultado['tempo_selecao'], resultado['tempo_treino']))
+    if args.saida_curva is not None:
+        curva.to_csv(args.saida_curva, index=False)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Carregamento do modelo para o deploy.
+#
+# O modelo é carregado uma única vez por processo e compartilhado entre todas as sessões/requisições.
+# A cada uso, verifica-se apenas a data de modificação e o tamanho do arquivo. Se mudaram, o conteúdo
+# do arquivo é comparado (hash) e o modelo só é carregado novamente se o arquivo realmente foi alterado.
+#
+# O arquivo é carregado com mmap_mode='r': os arrays do modelo são lidos direto do arquivo, sem cópia.
+# Com o modelo exportado por floresta_plana.exportar_modelo_mmap, a carga é quase instantânea e os
+# processos do servidor na mesma máquina compartilham a memória do modelo.
+#
+# As entradas pedidas no deploy vêm do pré-processamento do próprio modelo (entradas_modelo): um modelo treinado
+# com outras features (seleção automática, HistGradientBoosting com as colunas categóricas...) recebe sempre
+# as colunas de que precisa.
+
+import hashlib
+import pathlib
+import threading
+import warnings
+
+import joblib
+import pandas as pd
+
+from preparacao import VERSAO_MODELO
+
+
+CAMINHO_MODELO = 'modelo.joblib'
+
+# caminho do arquivo -> {'assinatura': (data de modificação, tamanho), 'hash': ..., 'modelo': ...}
+_modelos = {}
+_trava = threading.Lock()
+
+
+def assinatura_arquivo(caminho):
+    info = pathlib.Path(caminho).stat()
+    return (info.st_mtime_ns, info.st_size)
+
+
+def hash_arquivo(caminho, tamanho_bloco=2**20):
+    resumo = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+# Avisa quando o modelo foi treinado com outra versão do cálculo das features (preparacao.VERSAO_MODELO)
+def verificar_versao(modelo, caminho):
+    preparacao = getattr(modelo, 'named_steps', {}).get('preparacao')
+    versao = getattr(preparacao, 'versao_', 1)
+    if versao != VERSAO_MODELO:
+        warnings.warn('O modelo {} foi treinado com a versão {} das features (atual: {}). Treine e exporte o modelo '
+                      'novamente'.format(caminho, versao, VERSAO_MODELO))
+
+
+# Retorna o modelo do arquivo, carregando-o somente na primeira chamada ou quando o arquivo for alterado
+# mmap_mode: None carrega o arquivo inteiro na memória do processo
+def carregar_modelo(caminho=CAMINHO_MODELO, mmap_mode='r'):
+    caminho = pathlib.Path(caminho).resolve()
+    assinatura = assinatura_arquivo(caminho)
+
+    with _trava:
+        atual = _modelos.get(caminho)
+        if atual is not None and atual['assinatura'] == assinatura:
+            return atual['modelo']
+
+        # O hash só é calculado a partir da primeira alteração do arquivo, para que a primeira carga
+        # não precise ler o arquivo inteiro
+        hash_atual = None
+        if atual is not None:
+            hash_atual = hash_arquivo(caminho)
+            if atual['hash'] == hash_atual:
+                # Arquivo "tocado", mas com o mesmo conteúdo
+                atual['assinatura'] = assinatura
+                return atual['modelo']
+
+        modelo = joblib.load(caminho, mmap_mode=mmap_mode)
+        verificar_versao(modelo, caminho)
+        _modelos[caminho] = {'assinatura': assinatura, 'hash': hash_atual, 'modelo': modelo}
+        return modelo
+
+
+# Colunas no formato original que o Pipeline precisa receber, na ordem das features do modelo
+# Retorna {coluna: tipo}: 'numero', 'tf' (t/f, Sim/Não...) ou a lista de categorias aprendidas no treino
+# As dummies ("room_type_Private room"...) e os códigos das colunas categóricas viram uma única entrada da coluna
+def entradas_modelo(modelo):
+    preparacao = modelo.named_steps['preparacao']
+    categorias = getattr(preparacao, 'categorias_', {})
+    entradas = {}
+    for coluna in preparacao.colunas_:
+        categoria = next((nome for nome in categorias if coluna == nome or coluna.startswith(nome + '_')), None)
+        if categoria is not None:
+            entradas.setdefault(categoria, list(categorias[categoria]))
+        elif coluna in preparacao.colunas_tf:
+            entradas[coluna] = 'tf'
+        else:
+            entradas[coluna] = 'numero'
+    return entradas
+
+
+# Anúncio de uma linha com as entradas do modelo (entradas_modelo), na mesma ordem
+# valores: {coluna: valor}. Colunas que o modelo não usa são ignoradas
+def montar_anuncio(modelo, valores):
+    colunas = list(entradas_modelo(modelo))
+    faltantes = [coluna for coluna in colunas if coluna not in valores]
+    if faltantes:
+        raise KeyError('Entradas do modelo não informadas: {}'.format(', '.join(faltantes)))
+    return pd.DataFrame([[valores[coluna] for coluna in colunas]], columns=colunas)
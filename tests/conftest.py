@@ -0,0 +1,69 @@
+# coding: utf-8
+
+# Os testes importam os módulos da pasta raiz do projeto (python -m pytest na pasta raiz)
+
+import pathlib
+import sys
+
+import pytest
+
+RAIZ = pathlib.Path(__file__).resolve().parents[1]
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+from benchmark.dados_sinteticos import gerar_dataset  # noqa: E402
+
+
+# Pasta com 2 arquivos mensais sintéticos, compartilhada por todos os testes
+@pytest.fixture(scope='session')
+def pasta_dataset(tmp_path_factory):
+    pasta = tmp_path_factory.mktemp('dataset')
+    gerar_dataset(pasta, linhas=3000, meses=2, semente=0)
+    return pasta
+
+
+# Base tratada (limpar_base) dos arquivos sintéticos
+@pytest.fixture(scope='session')
+def base_tratada(pasta_dataset):
+    from carregamento import carregar_base
+    from preparacao import limpar_base
+
+    base_airbnb, _ = limpar_base(carregar_base(pasta_dataset, n_processos=1))
+    return base_airbnb
+
+
+# Pipeline (pré-processamento + floresta pequena) treinado com a base tratada, como o exportado para o deploy
+@pytest.fixture(scope='session')
+def pipeline_treinado(base_tratada):
+    from sklearn.ensemble import ExtraTreesRegressor
+
+    from preparacao import FEATURES_MODELO, montar_pipeline, separar_treino_teste
+
+    x_train, _, y_train, _ = separar_treino_teste(base_tratada, FEATURES_MODELO, semente=10)
+    modelo = ExtraTreesRegressor(n_estimators=10, random_state=10).fit(x_train, y_train)
+    return montar_pipeline(modelo, base_tratada, FEATURES_MODELO)
+
+
+# Anúncios no formato original (preços em texto, "amenities" no lugar de "numero_amenities")
+@pytest.fixture(scope='session')
+def anuncios():
+    from benchmark.dados_sinteticos import gerar_mes
+
+    return gerar_mes(500, semente=99).assign(Ano=2019)
+
+
+# Valores enviados pela página do deploy (deploy-projeto.py) para as entradas do modelo (servico.entradas_modelo)
+@pytest.fixture(scope='session')
+def valores_pagina():
+    def valores(entradas):
+        preenchidos = {}
+        for coluna, tipo in entradas.items():
+            if tipo == 'tf':
+                preenchidos[coluna] = 1
+            elif isinstance(tipo, list):
+                preenchidos[coluna] = tipo[-1]
+            else:
+                preenchidos[coluna] = {'latitude': -22.97, 'longitude': -43.19}.get(coluna, 2)
+        return preenchidos
+    return valores
+
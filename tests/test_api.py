@@ -0,0 +1,121 @@
+# coding: utf-8
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+import api
+from floresta_plana import exportar_modelo_mmap
+
+
+@pytest.fixture
+def caminho_modelo(pipeline_treinado, tmp_path, monkeypatch):
+    caminho = exportar_modelo_mmap(pipeline_treinado, tmp_path / 'modelo.joblib')
+    monkeypatch.setattr(api.agrupador, 'caminho_modelo', caminho)
+    api.cache.limpar()
+    return caminho
+
+
+# Executa uma requisição na aplicação ASGI, sem servidor. Retorna (status, corpo da resposta)
+def requisitar(metodo, caminho, corpo=None):
+    async def executar():
+        mensagens = []
+        conteudo = b'' if corpo is None else json.dumps(corpo).encode('utf-8')
+
+        async def receive():
+            return {'type': 'http.request', 'body': conteudo, 'more_body': False}
+
+        async def send(mensagem):
+            mensagens.append(mensagem)
+
+        await api.app({'type': 'http', 'method': metodo, 'path': caminho}, receive, send)
+        await api.agrupador.parar()
+        return (mensagens[0]['status'], json.loads(mensagens[1]['body']))
+
+    return asyncio.run(executar())
+
+
+def registros(anuncios):
+    return json.loads(anuncios.to_json(orient='records'))
+
+
+def test_preco_igual_ao_pipeline(caminho_modelo, pipeline_treinado, anuncios):
+    validos = anuncios.dropna().iloc[:50]
+    esperado = np.round(pipeline_treinado.predict(validos), 2)
+
+    status, resposta = requisitar('POST', '/predict', registros(validos.iloc[:1])[0])
+    assert status == 200 and resposta['preco'] == pytest.approx(esperado[0])
+
+    # Duas vezes: a segunda vem do cache
+    for _ in range(2):
+        status, resposta = requisitar('POST', '/predict/lote', registros(validos))
+        assert status == 200
+        np.testing.assert_allclose(resposta['precos'], esperado)
+
+
+def test_anuncio_invalido(caminho_modelo, anuncios):
+    anuncio = registros(anuncios.dropna().iloc[:1])[0]
+    anuncio['bedrooms'] = 'muitos'
+    status, resposta = requisitar('POST', '/predict', anuncio)
+    assert status == 422 and 'bedrooms' in resposta['erro']
+
+    del anuncio['latitude']
+    status, resposta = requisitar('POST', '/predict', anuncio)
+    assert status == 422 and 'latitude' in resposta['erro']
+
+
+def test_erros_da_requisicao(caminho_modelo):
+    assert requisitar('GET', '/nada')[0] == 404
+    assert requisitar('POST', '/predict/lote', [])[0] == 400
+    assert requisitar('GET', '/saude')[1]['modelo'] == 'FlorestaPlana'
+
+
+def test_erro_interno_responde_json(caminho_modelo, anuncios, monkeypatch):
+    def falhar(*args):
+        raise RuntimeError('falha no modelo')
+
+    monkeypatch.setattr(api.AgrupadorPrevisoes, 'prever_lote', falhar)
+    status, resposta = requisitar('POST', '/predict', registros(anuncios.dropna().iloc[:1])[0])
+    assert status == 500 and 'falha no modelo' in resposta['erro']
+
+
+# Executa o ciclo de vida (lifespan) da aplicação ASGI. Retorna as mensagens enviadas ao servidor
+def ciclo_de_vida(*tipos):
+    async def executar():
+        mensagens = []
+        fila = [{'type': tipo} for tipo in tipos]
+
+        async def receive():
+            return fila.pop(0)
+
+        async def send(mensagem):
+            mensagens.append(mensagem)
+
+        await api.app({'type': 'lifespan'}, receive, send)
+        return mensagens
+
+    return asyncio.run(executar())
+
+
+def test_ciclo_de_vida(caminho_modelo):
+    mensagens = ciclo_de_vida('lifespan.startup', 'lifespan.shutdown')
+    assert mensagens == [{'type': 'lifespan.startup.complete'}, {'type': 'lifespan.shutdown.complete'}]
+
+
+def test_modelo_inexistente_falha_na_inicializacao(tmp_path, monkeypatch):
+    monkeypatch.setattr(api.agrupador, 'caminho_modelo', tmp_path / 'inexistente.joblib')
+    mensagens = ciclo_de_vida('lifespan.startup')
+    assert [mensagem['type'] for mensagem in mensagens] == ['lifespan.startup.failed']
+    assert 'inexistente.joblib' in mensagens[0]['message']
+
+
+def test_websocket_recusado():
+    mensagens = []
+
+    async def send(mensagem):
+        mensagens.append(mensagem)
+
+    asyncio.run(api.app({'type': 'websocket', 'path': '/predict'}, None, send))
+    assert mensagens == [{'type': 'websocket.close', 'code': 1008}]
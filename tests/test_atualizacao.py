@@ -0,0 +1,68 @@
+# coding: utf-8
+
+import shutil
+
+import joblib
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+from atualizacao import atualizar, ler_base_tratada
+from servico import carregar_modelo, entradas_modelo, montar_anuncio
+
+
+def copiar_meses(pasta_dataset, destino, nomes):
+    destino.mkdir(exist_ok=True)
+    for nome in nomes:
+        shutil.copy(pasta_dataset / nome, destino / nome)
+    return destino
+
+
+def test_mes_novo_adiciona_arvores(pasta_dataset, tmp_path):
+    dataset = copiar_meses(pasta_dataset, tmp_path / 'dataset', ['abril2018.csv'])
+    atualizar(dataset, pasta=tmp_path / 'incremental', novas_arvores=5)
+    copiar_meses(pasta_dataset, dataset, ['maio2018.csv'])
+    estado = atualizar(dataset, pasta=tmp_path / 'incremental', novas_arvores=5)
+    assert [execucao['modelo'] for execucao in estado['historico']] == ['treino completo', 'warm start']
+    assert estado['historico'][-1]['n_estimators'] == 105
+
+
+def test_mes_alterado_retreina(pasta_dataset, tmp_path):
+    dataset = copiar_meses(pasta_dataset, tmp_path / 'dataset', ['abril2018.csv', 'maio2018.csv'])
+    atualizar(dataset, pasta=tmp_path / 'incremental')
+    base = pd.read_csv(dataset / 'maio2018.csv')
+    base.iloc[:1000].to_csv(dataset / 'maio2018.csv', index=False)
+
+    estado = atualizar(dataset, pasta=tmp_path / 'incremental')
+    assert estado['historico'][-1]['modelo'].startswith('treino completo (arquivos alterados: maio2018.csv')
+    assert estado['historico'][-1]['n_estimators'] == 100
+    assert (ler_base_tratada(tmp_path / 'incremental')['Mes'] == 5).sum() <= 1000
+
+
+def test_mes_sem_coluna(pasta_dataset, tmp_path):
+    dataset = copiar_meses(pasta_dataset, tmp_path / 'dataset', ['abril2018.csv'])
+    atualizar(dataset, pasta=tmp_path / 'incremental')
+    pd.read_csv(pasta_dataset / 'maio2018.csv').drop(columns='beds').to_csv(dataset / 'maio2018.csv', index=False)
+
+    estado = atualizar(dataset, pasta=tmp_path / 'incremental')
+    assert 'maio2018.csv' in estado['particoes']
+
+
+def test_retreinar_sem_arquivos(tmp_path):
+    (tmp_path / 'dataset').mkdir()
+    assert atualizar(tmp_path / 'dataset', pasta=tmp_path / 'incremental', retreinar=True) is None
+
+
+def test_modelo_salvo_como_pipeline(pasta_dataset, tmp_path, valores_pagina):
+    dataset = copiar_meses(pasta_dataset, tmp_path / 'dataset', ['abril2018.csv'])
+    atualizar(dataset, pasta=tmp_path / 'incremental', novas_arvores=5)
+    # Arquivo de uma versão anterior, com somente o modelo: é envolvido no Pipeline no warm start
+    pipeline = joblib.load(tmp_path / 'incremental' / 'modelo.joblib')
+    joblib.dump(pipeline.named_steps['modelo'], tmp_path / 'incremental' / 'modelo.joblib')
+    copiar_meses(pasta_dataset, dataset, ['maio2018.csv'])
+    estado = atualizar(dataset, pasta=tmp_path / 'incremental', novas_arvores=5)
+    assert estado['historico'][-1]['modelo'] == 'warm start'
+
+    modelo = carregar_modelo(tmp_path / 'incremental' / 'modelo.joblib', mmap_mode=None)
+    assert isinstance(modelo, Pipeline)
+    assert modelo.named_steps['modelo'].n_estimators == 105
+    assert modelo.predict(montar_anuncio(modelo, valores_pagina(entradas_modelo(modelo)))).shape == (1,)
@@ -0,0 +1,37 @@
+# coding: utf-8
+
+from benchmark.suite import combinar_repeticoes, comparar_linha_base, executar
+from perfil import PerfilExecucao
+
+
+def perfil_com_tempos(tempos):
+    perfil = PerfilExecucao('benchmark', {'meses': 2})
+    perfil.etapas = [{'etapa': etapa, 'linhas_entrada': 10, 'linhas_saida': 10, 'tempo_s': tempo, 'pico_rss_mb': 100.0}
+                     for etapa, tempo in tempos.items()]
+    return perfil
+
+
+def test_combinar_repeticoes_usa_a_mediana():
+    perfis = [perfil_com_tempos({'treino': tempo, 'leitura': 1.0}) for tempo in (1.0, 9.0, 1.2)]
+    combinado = combinar_repeticoes(perfis)
+    treino = combinado.etapas[0]
+    assert treino['tempo_s'] == 1.2 and treino['tempo_s_min'] == 1.0 and treino['tempo_s_max'] == 9.0
+    assert treino['linhas_saida'] == 10 and combinado.parametros == {'meses': 2, 'repeticoes': 3}
+
+
+def test_comparar_linha_base_ignora_etapas_curtas():
+    linha_base = perfil_com_tempos({'treino': 1.0, 'previsao': 0.01}).relatorio()
+    atual = perfil_com_tempos({'treino': 1.1, 'previsao': 0.05}).relatorio()
+    assert not comparar_linha_base(atual, linha_base)['regressao'].any()
+
+    atual = perfil_com_tempos({'treino': 2.0, 'previsao': 0.05}).relatorio()
+    assert list(comparar_linha_base(atual, linha_base)['regressao']) == [True, False]
+
+
+def test_executar_repeticoes(tmp_path):
+    relatorio = executar(linhas=1500, meses=2, pasta_dados=tmp_path, repeticoes=2).relatorio()
+    etapas = [registro['etapa'] for registro in relatorio['etapas']]
+    assert etapas[0] == 'leitura' and etapas[-2:] == ['previsao_unitaria', 'previsao_lote']
+    assert relatorio['parametros']['repeticoes'] == 2
+    assert all(registro['tempo_s_min'] <= registro['tempo_s'] <= registro['tempo_s_max']
+               for registro in relatorio['etapas'])
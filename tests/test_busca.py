@@ -0,0 +1,15 @@
+# coding: utf-8
+
+from busca import separar_validacao
+from preparacao import FEATURES_MODELO, separar_treino_teste
+
+
+def test_validacao_separada_do_treino(base_tratada):
+    x_train, x_test, y_train, _ = separar_treino_teste(base_tratada, FEATURES_MODELO, semente=10)
+    x_busca, x_val, y_busca, y_val = separar_validacao(x_train, y_train, semente=10)
+
+    # A validação sai da base de treino e a base de teste não participa da busca
+    assert set(x_busca.index) | set(x_val.index) == set(x_train.index)
+    assert not set(x_busca.index) & set(x_val.index)
+    assert not set(x_val.index) & set(x_test.index)
+    assert (y_val.index == x_val.index).all() and (y_busca.index == x_busca.index).all()
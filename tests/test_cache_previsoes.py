@@ -0,0 +1,50 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+
+from cache_previsoes import CachePrevisoes
+
+
+# Estimador que guarda as linhas recebidas: o preço é a soma das features
+class EstimadorContador:
+
+    def __init__(self):
+        self.recebidas = []
+
+    def predict(self, x):
+        self.recebidas.append(x.copy())
+        return x.sum(axis=1).to_numpy()
+
+
+def features(latitudes, quartos):
+    return pd.DataFrame({'latitude': latitudes, 'longitude': -43.2, 'bedrooms': quartos})
+
+
+def test_previsao_com_coordenadas_originais():
+    estimador = EstimadorContador()
+    x = features([-22.912345678], [2.0])
+    precos = CachePrevisoes().prever(estimador, x)
+    pd.testing.assert_frame_equal(estimador.recebidas[0], x)
+    np.testing.assert_allclose(precos, x.sum(axis=1))
+
+
+def test_chaves_repetidas_previstas_uma_vez():
+    estimador, cache = EstimadorContador(), CachePrevisoes()
+    x = features([-22.91, -22.91, -22.95, -22.91000001], [2.0, 2.0, 1.0, 2.0])
+    precos = cache.prever(estimador, x)
+    assert len(estimador.recebidas) == 1 and estimador.recebidas[0].shape[0] == 2
+    assert precos[0] == precos[1] == precos[3]
+
+    # Segunda chamada: tudo vem do cache
+    np.testing.assert_array_equal(cache.prever(estimador, x), precos)
+    assert len(estimador.recebidas) == 1
+    assert cache.estatisticas()['acertos'] == 4 and cache.estatisticas()['falhas'] == 4
+
+
+def test_modelo_novo_esvazia_o_cache():
+    cache, x = CachePrevisoes(), features([-22.91], [2.0])
+    cache.prever(EstimadorContador(), x)
+    novo = EstimadorContador()
+    cache.prever(novo, x)
+    assert len(novo.recebidas) == 1 and cache.estatisticas()['invalidacoes'] == 1
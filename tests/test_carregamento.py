@@ -0,0 +1,24 @@
+# coding: utf-8
+
+import pytest
+
+from carregamento import carregar_base, colunas_usadas
+
+
+def test_carregar_base_le_todos_os_meses(pasta_dataset):
+    base = carregar_base(pasta_dataset, n_processos=1)
+    assert base.shape[0] == 6000
+    assert set(colunas_usadas) <= set(base.columns)
+    assert list(base[['Ano', 'Mes']].drop_duplicates().itertuples(index=False, name=None)) == [(2018, 4), (2018, 5)]
+
+
+def test_carregar_base_com_cache_igual_ao_csv(pasta_dataset, tmp_path):
+    sem_cache = carregar_base(pasta_dataset, n_processos=1)
+    carregar_base(pasta_dataset, n_processos=1, pasta_cache=tmp_path)
+    com_cache = carregar_base(pasta_dataset, n_processos=1, pasta_cache=tmp_path)
+    assert com_cache.equals(sem_cache)
+
+
+def test_carregar_base_sem_arquivos(tmp_path):
+    with pytest.raises(FileNotFoundError, match=str(tmp_path)):
+        carregar_base(tmp_path)
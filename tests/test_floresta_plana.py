@@ -0,0 +1,86 @@
+# coding: utf-8
+
+import pathlib
+import subprocess
+import sys
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.base import clone
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+
+from floresta_plana import FlorestaPlana, converter_modelo, exportar_modelo_mmap
+
+
+@pytest.fixture(scope='module')
+def dados():
+    gerador = np.random.default_rng(0)
+    x = gerador.normal(size=(2000, 6))
+    y = x[:, 0] * 3 + np.sin(x[:, 1]) + gerador.normal(scale=0.1, size=2000)
+    return (x[:1500], y[:1500], x[1500:])
+
+
+@pytest.mark.parametrize('classe', [ExtraTreesRegressor, RandomForestRegressor])
+@pytest.mark.parametrize('float32', [False, True])
+def test_previsao_igual_ao_scikit_learn(dados, classe, float32):
+    x_train, y_train, x_test = dados
+    floresta = classe(n_estimators=20, min_samples_leaf=2, random_state=0).fit(x_train, y_train)
+    plana = FlorestaPlana.converter(floresta, float32)
+    np.testing.assert_allclose(plana.predict(x_test), floresta.predict(x_test), rtol=1e-6 if float32 else 1e-12)
+
+
+def test_fit_treina_e_converte(dados):
+    x_train, y_train, x_test = dados
+    floresta = ExtraTreesRegressor(n_estimators=10, random_state=0)
+    plana = FlorestaPlana(floresta).fit(x_train, y_train)
+    np.testing.assert_allclose(plana.predict(x_test), clone(floresta).fit(x_train, y_train).predict(x_test))
+
+
+def test_clone_e_set_params_mantem_o_modelo(dados):
+    x_train, y_train, x_test = dados
+    floresta = ExtraTreesRegressor(n_estimators=10, max_depth=4, random_state=0).fit(x_train, y_train)
+    pipeline = converter_modelo(Pipeline([('modelo', floresta)]))
+    assert pipeline.get_params()['modelo__floresta__max_depth'] == 4
+
+    clonado = clone(pipeline).set_params(modelo__floresta__n_estimators=5).fit(x_train, y_train)
+    assert len(clonado.named_steps['modelo'].raizes) == 5
+    assert clonado.named_steps['modelo'].floresta.max_depth == 4
+
+
+def test_converter_mantem_outros_modelos(dados):
+    x_train, y_train, _ = dados
+    modelo = LinearRegression().fit(x_train, y_train)
+    assert converter_modelo(modelo) is modelo
+
+
+def test_exportar_e_carregar_com_mmap(dados, tmp_path):
+    x_train, y_train, x_test = dados
+    floresta = ExtraTreesRegressor(n_estimators=10, random_state=0).fit(x_train, y_train)
+    caminho = exportar_modelo_mmap(floresta, tmp_path / 'modelo.joblib')
+    carregado = joblib.load(caminho, mmap_mode='r')
+    assert isinstance(carregado.limiar, np.memmap)
+    np.testing.assert_allclose(carregado.predict(x_test), floresta.predict(x_test))
+
+
+# Linha de comando do benchmark (python -m benchmark.floresta_plana --modelo ...), na pasta raiz do projeto
+def executar_benchmark(*argumentos):
+    raiz = pathlib.Path(__file__).resolve().parents[1]
+    return subprocess.run([sys.executable, '-m', 'benchmark.floresta_plana', '--repeticoes', '1', '--lotes', '1', '100',
+                           *argumentos], cwd=raiz, capture_output=True, text=True, timeout=300)
+
+
+def test_benchmark_com_modelo_exportado(pipeline_treinado, tmp_path):
+    exportado = exportar_modelo_mmap(pipeline_treinado, tmp_path / 'exportado.joblib')
+    processo = executar_benchmark('--modelo', str(exportado))
+    assert processo.returncode == 0, processo.stderr
+    assert 'a comparação não é feita' in processo.stdout
+
+    # Com a floresta do scikit-learn, as previsões são comparadas
+    original = tmp_path / 'original.joblib'
+    joblib.dump(pipeline_treinado, original)
+    processo = executar_benchmark('--modelo', str(original))
+    assert processo.returncode == 0, processo.stderr
+    assert 'scikit-learn (s)' in processo.stdout
@@ -0,0 +1,48 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lote import precificar_arquivo
+
+
+def test_precos_iguais_ao_pipeline(pipeline_treinado, anuncios, tmp_path):
+    anuncios.to_csv(tmp_path / 'anuncios.csv', index=False)
+    resumo = precificar_arquivo(tmp_path / 'anuncios.csv', tmp_path / 'precos.csv', pipeline_treinado,
+                                tamanho_lote=128)
+    precos = pd.read_csv(tmp_path / 'precos.csv')
+
+    # Linhas com valores nulos ficam sem preço, com o motivo na coluna "erro"
+    validas = precos['erro'].isna().to_numpy()
+    assert resumo['linhas'] == anuncios.shape[0] and resumo['precificadas'] == validas.sum() > 0
+    assert precos.loc[~validas, 'preco_previsto'].isna().all()
+    np.testing.assert_allclose(precos.loc[validas, 'preco_previsto'],
+                               np.round(pipeline_treinado.predict(anuncios[validas]), 2))
+
+
+def test_parquet_igual_ao_csv(pipeline_treinado, anuncios, tmp_path):
+    anuncios.to_csv(tmp_path / 'anuncios.csv', index=False)
+    anuncios.to_parquet(tmp_path / 'anuncios.parquet', index=False)
+    precificar_arquivo(tmp_path / 'anuncios.csv', tmp_path / 'precos_csv.csv', pipeline_treinado)
+    precificar_arquivo(tmp_path / 'anuncios.parquet', tmp_path / 'precos_parquet.csv', pipeline_treinado)
+    pd.testing.assert_series_equal(pd.read_csv(tmp_path / 'precos_csv.csv')['preco_previsto'],
+                                   pd.read_csv(tmp_path / 'precos_parquet.csv')['preco_previsto'])
+
+
+@pytest.mark.parametrize('formato', ['csv', 'parquet'])
+def test_arquivo_sem_linhas_grava_cabecalho(pipeline_treinado, anuncios, tmp_path, formato):
+    entrada = tmp_path / 'anuncios.{}'.format(formato)
+    vazio = anuncios.iloc[:0]
+    vazio.to_csv(entrada, index=False) if formato == 'csv' else vazio.to_parquet(entrada, index=False)
+
+    resumo = precificar_arquivo(entrada, tmp_path / 'precos.csv', pipeline_treinado)
+    precos = pd.read_csv(tmp_path / 'precos.csv')
+    assert resumo['linhas'] == 0
+    assert precos.empty and list(precos.columns) == list(anuncios.columns) + ['preco_previsto', 'erro']
+
+
+def test_colunas_faltantes(pipeline_treinado, anuncios, tmp_path):
+    anuncios.drop(columns='latitude').to_csv(tmp_path / 'anuncios.csv', index=False)
+    with pytest.raises(ValueError, match='latitude'):
+        precificar_arquivo(tmp_path / 'anuncios.csv', tmp_path / 'precos.csv', pipeline_treinado)
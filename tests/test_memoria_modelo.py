@@ -0,0 +1,19 @@
+# coding: utf-8
+
+import pytest
+
+from benchmark.memoria_modelo import medir
+from floresta_plana import exportar_modelo_mmap
+
+
+def test_medir_pipeline_exportado(pipeline_treinado, tmp_path):
+    caminho = exportar_modelo_mmap(pipeline_treinado, tmp_path / 'modelo.joblib')
+    medidas = medir(caminho, processos=2, tempo_maximo=120)
+    assert len(medidas) == 2 and all(medida['rss_mb'] > 0 for medida in medidas)
+
+
+def test_falha_no_processo_nao_trava_a_medicao(tmp_path):
+    caminho = tmp_path / 'modelo.joblib'
+    caminho.write_text('não é um modelo')
+    with pytest.raises(RuntimeError, match='Falha ao carregar'):
+        medir(caminho, processos=2, tempo_maximo=60)
@@ -0,0 +1,57 @@
+# coding: utf-8
+
+import joblib
+import numpy as np
+import psutil
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import train_test_split
+
+from floresta_plana import exportar_modelo_mmap
+from modelagem import comparar_modelos, montar_hgb
+from preparacao import FEATURES_MODELO, separar_treino_teste
+from servico import carregar_modelo, entradas_modelo, montar_anuncio
+
+
+def test_comparar_modelos_salva_os_modelos(base_tratada, tmp_path):
+    x_train, x_test, y_train, y_test = separar_treino_teste(base_tratada, FEATURES_MODELO, semente=10)
+    modelos = {'LinearRegression': LinearRegression(), 'ExtraTrees': ExtraTreesRegressor(n_estimators=5)}
+    resultados, caminhos = comparar_modelos(modelos, x_train, y_train, x_test, y_test, n_processos=2,
+                                            pasta_modelos=tmp_path)
+
+    assert set(resultados.index) == set(modelos) == set(caminhos)
+    for nome, caminho in caminhos.items():
+        modelo = joblib.load(caminho)
+        # Mesma semente: o modelo salvo é o avaliado
+        assert modelo.get_params().get('random_state', 10) == 10
+        assert np.isfinite(modelo.predict(x_test)).all()
+
+    # Aumento de memória do processo de cada modelo, sem a memória herdada do processo principal
+    memoria_principal = psutil.Process().memory_info().rss / 1024 ** 2
+    assert (resultados['memoria_treino_mb'] < memoria_principal).all()
+
+
+def test_comparar_modelos_sem_pasta(base_tratada):
+    x_train, x_test, y_train, y_test = separar_treino_teste(base_tratada, FEATURES_MODELO, semente=10)
+    resultados, caminhos = comparar_modelos({'LinearRegression': LinearRegression()}, x_train, y_train, x_test, y_test)
+    assert caminhos is None and resultados.shape[0] == 1
+
+
+def test_montar_hgb_colunas_categoricas(base_tratada, tmp_path, valores_pagina):
+    pipeline = montar_hgb(['accommodates', 'room_type', 'bedrooms'], max_iter=20)
+    colunas = list(pipeline.named_steps['preparacao'].colunas)
+    # As categóricas que faltam são acrescentadas ao final, e somente elas entram na máscara
+    assert colunas == ['accommodates', 'room_type', 'bedrooms', 'property_type', 'bed_type']
+    assert list(pipeline.named_steps['modelo'].categorical_features) == [False, True, False, True, True]
+
+    x_train, x_test, y_train, y_test = train_test_split(base_tratada.drop(columns='price'), base_tratada['price'],
+                                                        random_state=10)
+    pipeline.fit(x_train, y_train)
+    codigos = pipeline.named_steps['preparacao'].transform(x_test)['room_type']
+    assert codigos.min() >= 0 and codigos.max() < len(pipeline.named_steps['preparacao'].categorias_['room_type'])
+
+    # O artefato exportado recebe as colunas categóricas da página do deploy
+    modelo = carregar_modelo(exportar_modelo_mmap(pipeline, tmp_path / 'modelo.joblib'))
+    entradas = entradas_modelo(modelo)
+    assert isinstance(entradas['property_type'], list) and isinstance(entradas['bed_type'], list)
+    assert np.isfinite(modelo.predict(montar_anuncio(modelo, valores_pagina(entradas)))).all()
@@ -0,0 +1,24 @@
+# coding: utf-8
+
+import datetime
+
+from perfil import PerfilExecucao, etapa, ler_relatorio, ultimo_relatorio
+
+
+def test_salvar_nao_sobrescreve_relatorios(tmp_path):
+    primeiro, segundo = PerfilExecucao('teste'), PerfilExecucao('teste')
+    # Mesmo instante de início: os dois relatórios são gravados
+    segundo.inicio = primeiro.inicio
+    with etapa(primeiro, 'a'):
+        pass
+    caminhos = [primeiro.salvar(tmp_path), segundo.salvar(tmp_path), primeiro.salvar(tmp_path)]
+    assert len(set(caminhos)) == 3 and all(caminho.exists() for caminho in caminhos)
+    assert ler_relatorio(caminhos[0])['etapas'][0]['etapa'] == 'a'
+
+
+def test_ultimo_relatorio_em_ordem_cronologica(tmp_path):
+    anterior, atual = PerfilExecucao('teste', {'ordem': 1}), PerfilExecucao('teste', {'ordem': 2})
+    atual.inicio = anterior.inicio + datetime.timedelta(seconds=1)
+    atual.salvar(tmp_path)
+    anterior.salvar(tmp_path)
+    assert ultimo_relatorio('teste', tmp_path)['parametros'] == {'ordem': 2}
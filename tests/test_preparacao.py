@@ -0,0 +1,181 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+
+from benchmark.dados_sinteticos import gerar_mes
+from preparacao import (PreparacaoAnuncios, agrupar_categorias, ajustar_categorias, chave_cache, codificar_base,
+                        colunas_codificadas, contar_amenities, converter_moeda, excluir_outliers, filtrar_outliers,
+                        limites, matriz_amenities, otimizar_tipos, preparar_bases,
+                        separar_treino_teste)
+
+
+def test_converter_moeda():
+    precos = pd.Series(['$1,234.00', '$80.50', ' $7 ', 'R$ 10', None, '$', '1.2.3'], index=list('abcdefg'))
+    valores, invalidos = converter_moeda(precos)
+    np.testing.assert_array_equal(valores.to_numpy()[:3], np.array([1234, 80.5, 7], dtype=np.float32))
+    assert valores.iloc[3:].isna().all()
+    assert list(invalidos.index) == list('defg')
+
+
+def test_converter_moeda_vazia():
+    valores, invalidos = converter_moeda(pd.Series([], dtype=object))
+    assert len(valores) == 0 and len(invalidos) == 0
+
+
+def test_contar_amenities():
+    amenities = pd.Series(['{TV,Wifi,"Air conditioning"}', '{TV}', '{}', None], index=[10, 11, 12, 13])
+    contagem = contar_amenities(amenities)
+    assert list(contagem) == [3, 1, 0, 0]
+    assert list(contagem.index) == [10, 11, 12, 13]
+
+
+def test_contar_amenities_igual_ao_split():
+    amenities = gerar_mes(2000)['amenities']
+    antigo = amenities.str.split(',').apply(len)
+    vazios = amenities == '{}'
+    assert contar_amenities(amenities)[~vazios].equals(antigo[~vazios].rename('numero_amenities'))
+
+
+def test_colunas_codificadas(base_tratada):
+    # Mesmas colunas e mesma ordem do get_dummies, sem montar a base com encoding
+    assert list(colunas_codificadas(base_tratada)) == list(codificar_base(base_tratada).columns.drop('price'))
+    base_texto = base_tratada.astype({'property_type': object, 'room_type': object, 'bed_type': object})
+    assert list(colunas_codificadas(base_texto)) == list(codificar_base(base_texto).columns.drop('price'))
+
+
+def test_features_iguais_ao_get_dummies(base_tratada):
+    colunas = colunas_codificadas(base_tratada)
+    x_train, _, _, _ = separar_treino_teste(base_tratada, colunas, semente=10)
+    esperado = codificar_base(base_tratada).loc[x_train.index, colunas].astype(np.float32)
+    np.testing.assert_array_equal(x_train.to_numpy(), esperado.to_numpy())
+
+
+def test_preparar_bases_salva_somente_a_base_tratada(pasta_dataset, tmp_path):
+    base_airbnb = preparar_bases(pasta_dataset, pasta_cache=tmp_path, n_processos=1)
+    assert isinstance(base_airbnb, pd.DataFrame) and 'price' in base_airbnb
+    assert [caminho.name for caminho in (tmp_path / chave_cache(pasta_dataset)).iterdir()] == ['base_airbnb.parquet']
+    pd.testing.assert_frame_equal(preparar_bases(pasta_dataset, pasta_cache=tmp_path, n_processos=1), base_airbnb)
+
+
+def test_codigos_das_categorias_sem_aviso(recwarn):
+    base = pd.DataFrame({'room_type': ['A', 'B', 'A', 'C'], 'price': [1.0, 2.0, 3.0, 4.0]})
+    preparacao = PreparacaoAnuncios(colunas=('room_type', 'room_type_A', 'room_type_Outros'),
+                                    limiares_categorias={'room_type': 2}).fit(base)
+    assert preparacao.categorias_['room_type'] == ['A', 'Outros']
+
+    novos = pd.DataFrame({'room_type': ['A', 'C', 'Z', None]})
+    features = preparacao.transform(novos)
+    # Categorias fora das mantidas (inclusive desconhecidas e nulas) viram "Outros"
+    np.testing.assert_array_equal(features['room_type'], [0, 1, 1, 1])
+    np.testing.assert_array_equal(features['room_type_A'], [1, 0, 0, 0])
+    np.testing.assert_array_equal(features['room_type_Outros'], [0, 1, 1, 1])
+    assert not recwarn.list
+
+
+def test_filtrar_outliers_sequencial_igual_a_excluir_outliers():
+    base = gerar_mes(3000)
+    colunas = ['price', 'accommodates', 'bedrooms', 'extra_people']
+    base['price'], _ = converter_moeda(base['price'])
+    base['extra_people'], _ = converter_moeda(base['extra_people'])
+
+    antiga = base
+    removidas = []
+    for coluna in colunas:
+        antiga, linhas_removidas = excluir_outliers(antiga, coluna)
+        removidas.append(linhas_removidas)
+
+    mascara, relatorio = filtrar_outliers(base, colunas)
+    assert base.loc[mascara].equals(antiga)
+    assert list(relatorio['linhas_removidas']) == removidas
+
+    # A máscara inicial continua a filtragem: mesmo resultado de filtrar todas as colunas de uma vez
+    mascara_parcial, _ = filtrar_outliers(base, colunas[:2])
+    mascara_final, _ = filtrar_outliers(base, colunas[2:], mascara=mascara_parcial)
+    np.testing.assert_array_equal(mascara_final, mascara)
+
+
+def test_filtrar_outliers_limites_da_base_inteira_e_fixos():
+    base = gerar_mes(3000)
+    colunas = ['accommodates', 'bedrooms', 'beds']
+
+    # sequencial=False: cada coluna usa os limites da base inteira, e não das linhas que sobraram
+    mascara, relatorio = filtrar_outliers(base, colunas, sequencial=False)
+    esperada = np.ones(base.shape[0], dtype=bool)
+    for coluna in colunas:
+        lim_inf, lim_sup = limites(base[coluna])
+        dentro = base[coluna].between(lim_inf, lim_sup).to_numpy()
+        assert relatorio.loc[coluna, 'limite_superior'] == lim_sup
+        assert relatorio.loc[coluna, 'linhas_removidas'] == (~dentro).sum()
+        esperada &= dentro
+    np.testing.assert_array_equal(mascara, esperada)
+    _, relatorio_sequencial = filtrar_outliers(base, colunas)
+    assert not relatorio_sequencial['limite_superior'].equals(relatorio['limite_superior'])
+
+    # limites_fixos: os limites recebidos são usados sem olhar a base (atualização mensal com as estatísticas salvas)
+    fixos = {coluna: (1, 3) for coluna in colunas}
+    mascara_fixa, relatorio_fixo = filtrar_outliers(base, colunas, limites_fixos=fixos)
+    np.testing.assert_array_equal(mascara_fixa, base[colunas].apply(lambda coluna: coluna.between(1, 3)).all(axis=1))
+    assert list(relatorio_fixo['limite_superior']) == [3, 3, 3]
+
+
+def test_agrupar_categorias_igual_ao_loop():
+    base = gerar_mes(3000)
+    for coluna, limiar in [('property_type', 30), ('bed_type', 1000), ('room_type', 0)]:
+        # Loop do notebook original: uma atribuição com .loc para cada categoria agrupada
+        antiga = base.copy()
+        contagem = antiga[coluna].value_counts()
+        for tipo in contagem.index:
+            if contagem[tipo] < limiar:
+                antiga.loc[antiga[coluna] == tipo, coluna] = 'Outros'
+
+        categorias = ajustar_categorias(base[coluna], limiar)
+        nova = agrupar_categorias(base, coluna, categorias)
+        assert nova[coluna].equals(antiga[coluna])
+        assert sorted(nova[coluna].unique()) == categorias
+    assert 'Outros' not in base['property_type'].unique()
+
+
+def test_otimizar_tipos_mantem_os_valores():
+    base = gerar_mes(3000).drop(columns=['listing_url', 'name', 'amenities'])
+    base['price'], _ = converter_moeda(base['price'])
+    base['extra_people'], _ = converter_moeda(base['extra_people'])
+    base['price'] = base['price'].astype(np.float64)
+    base['accommodates'] = base['accommodates'].astype(np.int64)
+    # Como na base tratada (limpar_base remove as linhas com valores nulos antes de otimizar os tipos)
+    base = base.dropna()
+
+    otimizada, relatorio = otimizar_tipos(base)
+    tipos = otimizada.dtypes
+    assert tipos['host_is_superhost'] == bool and tipos['instant_bookable'] == bool
+    assert isinstance(tipos['property_type'], pd.CategoricalDtype)
+    assert tipos['accommodates'] == np.uint8 and tipos['bedrooms'] == np.uint8
+    assert tipos['price'] == np.float32 and tipos['extra_people'] == np.float32
+    assert tipos['latitude'] == np.float64 and tipos['longitude'] == np.float64
+    assert relatorio['memoria_depois'].sum() < relatorio['memoria_antes'].sum()
+
+    for coluna in base:
+        if coluna in ('host_is_superhost', 'instant_bookable'):
+            assert otimizada[coluna].equals(base[coluna] == 't')
+        elif coluna in ('price', 'extra_people'):
+            np.testing.assert_allclose(otimizada[coluna], base[coluna], rtol=1e-6)
+        elif isinstance(tipos[coluna], pd.CategoricalDtype):
+            assert list(otimizada[coluna].astype(str)) == list(base[coluna].astype(str))
+        else:
+            np.testing.assert_array_equal(otimizada[coluna].to_numpy(np.float64), base[coluna].to_numpy(np.float64))
+
+
+def test_matriz_amenities_igual_a_contagem():
+    amenities = pd.concat([gerar_mes(2000)['amenities'], pd.Series(['{}', None, '{TV,"Air conditioning"}'])],
+                          ignore_index=True)
+    matriz, nomes = matriz_amenities(amenities)
+    assert matriz.shape == (len(amenities), len(nomes))
+    np.testing.assert_array_equal(np.asarray(matriz.sum(axis=1)).ravel(), contar_amenities(amenities).to_numpy())
+    assert 'Air conditioning' in nomes and not any(nome.startswith('"') for nome in nomes)
+
+    # min_ocorrencias descarta as colunas das amenities raras
+    ocorrencias = np.asarray(matriz.sum(axis=0)).ravel()
+    minimo = int(np.median(ocorrencias)) + 1
+    matriz_frequentes, nomes_frequentes = matriz_amenities(amenities, min_ocorrencias=minimo)
+    assert list(nomes_frequentes) == list(nomes[ocorrencias >= minimo])
+    np.testing.assert_array_equal(matriz_frequentes.toarray(), matriz.toarray()[:, ocorrencias >= minimo])
@@ -0,0 +1,51 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import ExtraTreesRegressor
+
+from floresta_plana import exportar_modelo_mmap
+from preparacao import colunas_codificadas, montar_pipeline, separar_treino_teste
+from selecao import eliminar_features, escolher_features, selecionar_e_treinar
+from servico import carregar_modelo, entradas_modelo, montar_anuncio
+
+
+def base_selecao(linhas=2000):
+    gerador = np.random.default_rng(0)
+    x = pd.DataFrame({'forte': gerador.random(linhas), 'fraca': gerador.random(linhas),
+                      'ruido': gerador.random(linhas), 'room_type_A': gerador.integers(0, 2, linhas),
+                      'room_type_B': gerador.integers(0, 2, linhas)})
+    y = pd.Series(10 * x['forte'] + x['fraca'] + gerador.normal(0, 0.1, linhas))
+    return x, y
+
+
+def test_eliminacao_para_no_minimo_de_features():
+    x, y = base_selecao()
+    ranking, curva = eliminar_features(x, y, minimo_features=2, arvores=10, repeticoes=1, n_jobs=1)
+
+    # 4 grupos (as dummies de room_type juntas): uma etapa por grupo removido, até restarem 2
+    assert list(curva['n_grupos']) == [4, 3, 2]
+    assert pd.isna(curva['removido'].iloc[-1]) and curva['removido'].iloc[:-1].notna().all()
+    assert sorted(ranking) == ['forte', 'fraca', 'room_type', 'ruido'] and ranking[0] == 'forte'
+    assert ranking[2:] == list(curva['removido'].iloc[:-1])[::-1]
+
+
+def test_escolher_menor_conjunto_dentro_da_tolerancia():
+    curva = pd.DataFrame({'n_features': [4, 3, 2, 1], 'r2': [0.90, 0.91, 0.906, 0.80],
+                          'features': [list('abcd'), list('abc'), list('ab'), list('a')]})
+    assert escolher_features(curva, tolerancia=0.005) == ['a', 'b']
+    assert escolher_features(curva, tolerancia=0.0) == ['a', 'b', 'c']
+
+
+def test_modelo_selecionado_previsto_pela_pagina(base_tratada, tmp_path, valores_pagina):
+    x_train, x_test, y_train, y_test = separar_treino_teste(base_tratada, colunas_codificadas(base_tratada), 10)
+    features, _, modelo, resultado = selecionar_e_treinar(
+        x_train, y_train, x_test, y_test, modelo=ExtraTreesRegressor(n_estimators=5, random_state=10),
+        linhas_amostra=1500, tolerancia=1.0, n_jobs=1)
+    assert resultado['n_features'] == len(features) and len(resultado['ranking']) > 1
+
+    # Qualquer subconjunto das colunas do encoding pode ser escolhido: a página pede as entradas do artefato
+    pipeline = montar_pipeline(modelo, base_tratada, features)
+    artefato = carregar_modelo(exportar_modelo_mmap(pipeline, tmp_path / 'modelo.joblib'))
+    anuncio = montar_anuncio(artefato, valores_pagina(entradas_modelo(artefato)))
+    assert np.isfinite(artefato.predict(anuncio)).all()
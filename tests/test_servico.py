@@ -0,0 +1,40 @@
+# coding: utf-8
+
+import joblib
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from preparacao import montar_pipeline
+from servico import carregar_modelo, entradas_modelo, montar_anuncio
+
+
+def test_modelo_sem_versao_gera_aviso(tmp_path):
+    joblib.dump(LinearRegression().fit([[0], [1]], [0, 1]), tmp_path / 'modelo.joblib')
+    with pytest.warns(UserWarning, match='versão 1'):
+        carregar_modelo(tmp_path / 'modelo.joblib')
+
+
+def test_modelo_recarregado_quando_o_arquivo_muda(tmp_path, recwarn):
+    base = pd.DataFrame({'Ano': [2018, 2019], 'price': [100.0, 200.0]})
+    caminho = tmp_path / 'modelo.joblib'
+    joblib.dump(montar_pipeline(LinearRegression().fit(base[['Ano']], base['price']), base, ['Ano']), caminho)
+    primeiro = carregar_modelo(caminho)
+    assert carregar_modelo(caminho) is primeiro
+    joblib.dump(montar_pipeline(LinearRegression().fit(base[['Ano']], -base['price']), base, ['Ano']), caminho)
+    assert carregar_modelo(caminho) is not primeiro
+    assert not [aviso for aviso in recwarn if 'versão' in str(aviso.message)]
+
+
+def test_anuncio_da_pagina_passa_pelo_pre_processamento(pipeline_treinado, valores_pagina):
+    entradas = entradas_modelo(pipeline_treinado)
+    preparacao = pipeline_treinado.named_steps['preparacao']
+    assert list(entradas) == list(preparacao.colunas_) and entradas['instant_bookable'] == 'tf'
+
+    anuncio = montar_anuncio(pipeline_treinado, dict(valores_pagina(entradas), coluna_extra=0))
+    assert list(anuncio.columns) == list(preparacao.colunas_)
+    features = preparacao.transform(anuncio)
+    assert list(features.columns) == list(preparacao.colunas_) and features.notna().all(axis=None)
+
+    with pytest.raises(KeyError, match='latitude'):
+        montar_anuncio(pipeline_treinado, {coluna: 0 for coluna in entradas if coluna != 'latitude'})
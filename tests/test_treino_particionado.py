@@ -0,0 +1,67 @@
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import treino_particionado
+from treino_particionado import AmostraTeste, treinar_particionado
+
+
+@pytest.fixture(scope='module')
+def particoes(base_tratada, tmp_path_factory):
+    pasta = tmp_path_factory.mktemp('particoes')
+    caminhos = []
+    for (ano, mes), base_mes in base_tratada.groupby(['Ano', 'Mes']):
+        caminho = pasta / '{}-{:02d}.parquet'.format(ano, mes)
+        base_mes.to_parquet(caminho, index=False)
+        caminhos.append(caminho)
+    return caminhos
+
+
+def blocos_teste(linhas, tamanho):
+    x = pd.DataFrame({'a': np.arange(linhas, dtype=np.float32), 'b': np.ones(linhas, dtype=np.float32)})
+    y = np.arange(linhas, dtype=np.float64)
+    return [(x.iloc[i:i + tamanho], y[i:i + tamanho]) for i in range(0, linhas, tamanho)]
+
+
+def amostrar(blocos, linhas_teste):
+    amostra = AmostraTeste(linhas_teste, semente=10)
+    for x, y in blocos:
+        amostra.adicionar(x, y)
+    return amostra.dados()
+
+
+def test_amostra_teste_sorteia_entre_todos_os_blocos():
+    x, y = amostrar(blocos_teste(10000, 1000), 500)
+    assert x.shape == (500, 2) and len(np.unique(y)) == 500
+    assert (x['a'].to_numpy() == y).all()
+    # Linhas de todos os blocos, e não somente dos primeiros
+    assert np.histogram(y, bins=10, range=(0, 10000))[0].min() > 0
+
+    # A amostra não depende do tamanho dos blocos
+    x_outro, y_outro = amostrar(blocos_teste(10000, 333), 500)
+    assert (y_outro == y).all()
+
+
+def test_amostra_teste_menor_que_o_limite():
+    _, y = amostrar(blocos_teste(300, 100), 500)
+    assert (y == np.arange(300)).all()
+
+
+def test_memoria_verificada_antes_do_fit(particoes, monkeypatch):
+    class FlorestaSemFit(treino_particionado.ExtraTreesRegressor):
+        def fit(self, X, y, sample_weight=None):
+            raise AssertionError('fit chamado acima do limite de memória')
+
+    monkeypatch.setattr(treino_particionado, 'ExtraTreesRegressor', FlorestaSemFit)
+    monkeypatch.setattr(treino_particionado, 'estimar_memoria_passo', lambda x, arvores=0: 10 ** 6)
+    with pytest.raises(MemoryError):
+        treinar_particionado(particoes, memoria_maxima=10 ** 5, arvores_por_bloco=2)
+
+
+def test_treino_particionado(particoes):
+    pipeline, resultado = treinar_particionado(particoes, memoria_maxima=None, linhas_bloco=1000,
+                                               arvores_por_bloco=2, linhas_teste=500)
+    assert resultado['linhas_teste'] == 500 and resultado['blocos'] >= 2
+    assert pipeline.named_steps['modelo'].n_estimators == 2 * resultado['blocos']
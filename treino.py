@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Treino do modelo final do início ao fim, com a medição de cada etapa (ver perfil.py).
+#
+# Executa a mesma sequência do notebook, sem as visualizações:
+#     leitura dos arquivos -> limpeza (nulos, moeda, outliers, categorias, amenities, tipos) -> encoding
+#     -> treino do ExtraTrees -> avaliação -> exportação do Pipeline para o deploy
+# A leitura e a limpeza são sempre refeitas (as bases tratadas em cache não são usadas), para que os tempos sejam
+# comparáveis entre execuções. O cache de partições (Parquet de cada mês) é usado, a não ser com --sem-cache.
+#
+# Cada execução grava um relatório JSON em cache/perfil (tempo, CPU, pico de memória e linhas de cada etapa) e
+# mostra a comparação com o relatório anterior.
+#
+# Uso:
+#     python treino.py --saida-modelo deploy/modelo.joblib
+#     python treino.py --sem-cache --relatorios cache/perfil
+
+import argparse
+
+import pandas as pd
+from sklearn.ensemble import ExtraTreesRegressor
+
+from carregamento import carregar_base
+from floresta_plana import exportar_modelo_mmap
+from modelagem import SEMENTE, metricas
+from perfil import PASTA_PERFIL, PerfilExecucao, comparar_relatorios, tabela_etapas, ultimo_relatorio
+from preparacao import (FEATURES_MODELO, PARAMETROS_LIMPEZA, PASTA_CACHE, limpar_base, montar_pipeline,
+                        separar_treino_teste)
+
+
+# Executa o treino medindo as etapas. Retorna (pipeline, perfil)
+# perfil: PerfilExecucao que recebe as etapas (None cria um perfil "treino")
+def treinar(caminho_base, colunas=FEATURES_MODELO, saida_modelo=None, pasta_cache=PASTA_CACHE, n_processos=None,
+            parametros=PARAMETROS_LIMPEZA, semente=SEMENTE, perfil=None):
+    if perfil is None:
+        perfil = PerfilExecucao('treino')
+    perfil.parametros.update({'dataset': str(caminho_base), 'colunas': list(colunas),
+                              'cache_particoes': pasta_cache is not None, 'semente': semente})
+
+    with perfil.etapa('leitura') as registro:
+        base_airbnb = carregar_base(caminho_base, n_processos=n_processos, pasta_cache=pasta_cache)
+        registro['linhas_saida'] = base_airbnb.shape[0]
+
+    with perfil.etapa('limpeza', base_airbnb.shape[0]) as registro:
+        base_airbnb, _ = limpar_base(base_airbnb, parametros, perfil=perfil)
+        registro['linhas_saida'] = base_airbnb.shape[0]
+
+    with perfil.etapa('encoding', base_airbnb.shape[0]) as registro:
+        x_train, x_test, y_train, y_test = separar_treino_teste(base_airbnb, colunas, semente)
+        registro['linhas_saida'] = x_train.shape[0] + x_test.shape[0]
+
+    with perfil.etapa('treino', x_train.shape[0]) as registro:
+        modelo = ExtraTreesRegressor(random_state=semente, n_jobs=-1).fit(x_train, y_train)
+        registro['linhas_saida'] = x_train.shape[0]
+
+    with perfil.etapa('avaliacao', x_test.shape[0]) as registro:
+        r2, rsme = metricas(y_test, modelo.predict(x_test))
+        registro.update({'linhas_saida': x_test.shape[0], 'r2': r2, 'rsme': rsme})
+
+    with perfil.etapa('exportacao') as registro:
+        pipeline = montar_pipeline(modelo, base_airbnb, colunas)
+        if saida_modelo is not None:
+            registro['tamanho_mb'] = exportar_modelo_mmap(pipeline, saida_modelo).stat().st_size / 1024 ** 2
+
+    return (pipeline, perfil)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Treino do modelo final com a medição de cada etapa')
+    parser.add_argument('--dataset', default='dataset', help='pasta com os arquivos mensais')
+    parser.add_argument('--saida-modelo', default=None, help='arquivo do modelo exportado (Pipeline)')
+    parser.add_argument('--sem-cache', action='store_true', help='lê todos os arquivos do CSV')
+    parser.add_argument('--processos', type=int, default=None, help='processos usados na leitura')
+    parser.add_argument('--relatorios', default=str(PASTA_PERFIL), help='pasta dos relatórios JSON')
+    args = parser.parse_args()
+
+    _, perfil = treinar(args.dataset, saida_modelo=args.saida_modelo,
+                        pasta_cache=None if args.sem_cache else PASTA_CACHE, n_processos=args.processos)
+    caminho = perfil.salvar(args.relatorios)
+
+    relatorio = perfil.relatorio()
+    colunas = ['linhas_entrada', 'linhas_saida', 'tempo_s', 'cpu_s', 'cpu_filhos_s', 'pico_rss_mb']
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(tabela_etapas(relatorio)[colunas].round(3))
+        anterior = ultimo_relatorio('treino', args.relatorios, ignorar=caminho)
+        if anterior is not None:
+            print('\nComparação com a execução de {}:'.format(anterior['inicio']))
+            print(comparar_relatorios(relatorio, anterior)[['tempo_s', 'tempo_s_anterior', 'razao_tempo',
+                                                            'razao_memoria']].round(3))
+    print('\nRelatório: {}'.format(caminho))
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Treino do modelo sem carregar a base inteira na memória (out-of-core).
+#
+# A base tratada fica em disco, uma partição Parquet por mês (gravadas por atualizacao.py). Aqui as partições são
+# lidas em blocos de linhas, e cada bloco é pré-processado, usado no treino e descartado antes do próximo:
+#     - floresta: a cada bloco, o ExtraTrees ganha novas árvores treinadas somente com o bloco (warm_start, como
+#       na atualização mensal). O modelo final é uma única floresta com as árvores de todos os blocos
+#     - sgd: regressão linear com SGDRegressor.partial_fit. A primeira passada pelas partições calcula a
+#       padronização das features (StandardScaler.partial_fit) e as seguintes treinam o modelo (épocas)
+#
+# Uma parte das linhas de cada bloco (sorteada com semente fixa) é separada para teste. Dessas, são guardadas até
+# "linhas_teste" linhas, sorteadas entre todas as partições (amostragem de reservatório), para que o teste não fique
+# concentrado nos primeiros meses.
+# O tamanho dos blocos é calculado a partir do limite de memória. Antes de cada passo do treino, a memória do passo
+# (cópias do bloco e, na floresta, as novas árvores) é estimada: se o processo for passar do limite, o treino é
+# interrompido com MemoryError antes do fit.
+#
+# Com --comparar, os mesmos dados são usados no treino com a base inteira na memória (como no notebook), cada
+# modo em um processo próprio, e a tabela mostra o R², o RSME, o tempo e o pico de memória de cada um.
+#
+# Uso:
+#     python atualizacao.py                                   -> grava as partições em cache/incremental/base
+#     python treino_particionado.py --memoria-maxima 2048 --comparar
+#     python treino_particionado.py --modelo sgd --saida-modelo modelo_sgd.joblib
+
+import argparse
+import functools
+import pathlib
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import psutil
+import pyarrow.parquet as pq
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.linear_model import SGDRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from atualizacao import PASTA_INCREMENTAL
+from floresta_plana import FlorestaPlana, exportar_modelo_mmap
+from modelagem import SEMENTE, memoria_pico, metricas
+from preparacao import FEATURES_MODELO, PreparacaoAnuncios
+
+
+PASTA_PARTICOES = PASTA_INCREMENTAL / 'base'
+
+# Limite de memória do processo, em MB
+MEMORIA_MAXIMA = 2048
+# Tamanho máximo de um bloco (o limite de memória pode reduzir)
+LINHAS_BLOCO = 200000
+# Árvores treinadas com cada bloco
+ARVORES_POR_BLOCO = 10
+# Épocas do SGDRegressor (passadas pelas partições)
+EPOCAS = 5
+PROPORCAO_TESTE = 0.25
+# Linhas de teste guardadas na memória
+LINHAS_TESTE = 200000
+# Cópias de um bloco na memória ao mesmo tempo (bloco lido, features e cópia feita pelo modelo no fit)
+COPIAS_BLOCO = 4
+# Bytes de um nó das árvores do scikit-learn (estrutura do nó e valor previsto)
+BYTES_NO = 72
+
+
+def listar_particoes(pasta=PASTA_PARTICOES):
+    particoes = sorted(pathlib.Path(pasta).glob('*.parquet'))
+    if not particoes:
+        raise FileNotFoundError('Nenhuma partição em {} (execute atualizacao.py)'.format(pasta))
+    return particoes
+
+
+def memoria_atual():
+    return psutil.Process().memory_info().rss / 1024 ** 2
+
+
+# adicional: memória (MB) que o próximo passo ainda vai usar (ver estimar_memoria_passo)
+def verificar_memoria(memoria_maxima, adicional=0):
+    atual = memoria_atual()
+    if memoria_maxima is not None and atual + adicional > memoria_maxima:
+        raise MemoryError('Memória do processo ({:.0f} MB, mais {:.0f} MB estimados para o próximo passo) acima do '
+                          'limite de {:.0f} MB. Use blocos menores ou menos árvores por bloco'.format(
+                              atual, adicional, memoria_maxima))
+
+
+# Memória (MB) estimada para um passo do treino com o bloco x: cópias das features feitas pelo modelo (a conversão
+# para float64 da padronização ocupa o dobro do bloco) e as novas árvores da floresta (com min_samples_leaf=1, cada
+# árvore tem até 2 nós por linha)
+def estimar_memoria_passo(x, arvores=0, copias=2):
+    return (x.memory_usage(index=False).sum() * copias + arvores * 2 * x.shape[0] * BYTES_NO) / 1024 ** 2
+
+
+# Colunas das partições necessárias para as features e o preço
+def colunas_leitura(particao, colunas=FEATURES_MODELO):
+    disponiveis = pq.ParquetFile(particao).schema_arrow.names
+    necessarias = set(colunas) | {'price'}
+    if 'numero_amenities' in colunas and 'numero_amenities' not in disponiveis:
+        necessarias.add('amenities')
+    return [coluna for coluna in disponiveis if coluna in necessarias or
+            any(nome.startswith(coluna + '_') for nome in colunas)]
+
+
+# Linhas por bloco que cabem no limite de memória, estimadas com o tamanho das primeiras linhas da partição
+# arvores: árvores treinadas com cada bloco (os nós das novas árvores também ocupam memória a cada linha)
+def calcular_linhas_bloco(particao, colunas, memoria_maxima=MEMORIA_MAXIMA, linhas_bloco=LINHAS_BLOCO, arvores=0):
+    if memoria_maxima is None:
+        return linhas_bloco
+    amostra = next(pq.ParquetFile(particao).iter_batches(batch_size=1000, columns=colunas)).to_pandas()
+    bytes_linha = amostra.memory_usage(index=False, deep=True).sum() / max(len(amostra), 1) + 4 * len(FEATURES_MODELO)
+    disponivel = (memoria_maxima - memoria_atual()) * 1024 ** 2 / 2
+    if disponivel <= 0:
+        raise MemoryError('O processo já usa mais memória que o limite de {:.0f} MB'.format(memoria_maxima))
+    return int(max(1000, min(linhas_bloco, disponivel / (bytes_linha * COPIAS_BLOCO + arvores * 2 * BYTES_NO))))
+
+
+# Lê as partições em blocos de "linhas_bloco" linhas (um bloco nunca junta linhas de duas partições)
+# Retorna (índice da partição, bloco)
+def ler_blocos(particoes, colunas, linhas_bloco=LINHAS_BLOCO):
+    for indice, particao in enumerate(particoes):
+        for lote in pq.ParquetFile(particao).iter_batches(batch_size=linhas_bloco, columns=colunas):
+            yield (indice, lote.to_pandas())
+
+
+# Percorre as partições e devolve, para cada bloco, (x_treino, y_treino, x_teste, y_teste)
+# O sorteio das linhas de teste depende somente da semente e da posição da linha na partição (um gerador por
+# partição), então é o mesmo em todas as passadas e em todos os modos de treino, qualquer que seja o tamanho do bloco
+def percorrer_blocos(particoes, preparacao, colunas, linhas_bloco, proporcao_teste=PROPORCAO_TESTE,
+                     semente=SEMENTE):
+    geradores = {}
+    for indice, bloco in ler_blocos(particoes, colunas, linhas_bloco):
+        gerador = geradores.setdefault(indice, np.random.default_rng([semente, indice]))
+        # As features continuam em DataFrame: o modelo guarda os nomes das colunas, conferidos na previsão
+        x = preparacao.transform(bloco)
+        y = bloco['price'].to_numpy(dtype=np.float64)
+        teste = gerador.random(x.shape[0]) < proporcao_teste
+        yield (x[~teste], y[~teste], x[teste], y[teste])
+
+
+# Guarda até "linhas_teste" linhas de teste, sorteadas entre todas as linhas de teste dos blocos (amostragem de
+# reservatório): a n-ésima linha entra na amostra com probabilidade linhas_teste / n, no lugar de uma linha sorteada.
+# Um número aleatório é sorteado por linha, então a amostra é a mesma qualquer que seja o tamanho dos blocos
+class AmostraTeste:
+
+    def __init__(self, linhas_teste=LINHAS_TESTE, semente=SEMENTE):
+        self.linhas_teste = linhas_teste
+        self.gerador = np.random.default_rng(semente)
+        self.x = self.y = self.colunas = None
+        self.linhas = 0
+
+    def adicionar(self, x, y):
+        if self.x is None:
+            self.x = np.empty((self.linhas_teste, x.shape[1]), dtype=np.float32)
+            self.y = np.empty(self.linhas_teste, dtype=np.float64)
+            self.colunas = x.columns
+        posicoes = self.linhas + np.arange(x.shape[0])
+        sorteadas = (self.gerador.random(x.shape[0]) * (posicoes + 1)).astype(np.int64)
+        # Enquanto a amostra não está cheia, cada linha ocupa a próxima posição
+        destinos = np.where(posicoes < self.linhas_teste, posicoes, sorteadas)
+        linhas = np.flatnonzero(destinos < self.linhas_teste)
+        # Se duas linhas do bloco caem na mesma posição, fica a última (como se fossem adicionadas uma a uma)
+        _, ultimas = np.unique(destinos[linhas][::-1], return_index=True)
+        linhas = linhas[::-1][ultimas]
+        self.x[destinos[linhas]] = x.to_numpy(dtype=np.float32)[linhas]
+        self.y[destinos[linhas]] = y[linhas]
+        self.linhas += x.shape[0]
+
+    def dados(self):
+        guardadas = min(self.linhas, self.linhas_teste)
+        return (pd.DataFrame(self.x[:guardadas], columns=self.colunas), self.y[:guardadas])
+
+
+# Treina o modelo lendo as partições em blocos
+# modelo: 'floresta' ou 'sgd'
+# Retorna (pipeline, resultado): o Pipeline (PreparacaoAnuncios + modelo) e as métricas na amostra de teste
+def treinar_particionado(particoes, modelo='floresta', memoria_maxima=MEMORIA_MAXIMA, linhas_bloco=LINHAS_BLOCO,
+                         arvores_por_bloco=ARVORES_POR_BLOCO, epocas=EPOCAS, proporcao_teste=PROPORCAO_TESTE,
+                         linhas_teste=LINHAS_TESTE, colunas=FEATURES_MODELO, semente=SEMENTE):
+    inicio = timeit.default_timer()
+    colunas_arquivo = colunas_leitura(particoes[0], colunas)
+    linhas_bloco = calcular_linhas_bloco(particoes[0], colunas_arquivo, memoria_maxima, linhas_bloco,
+                                         arvores_por_bloco if modelo == 'floresta' else 0)
+    # As categorias das dummies (quando usadas) são aprendidas com o primeiro bloco: a base tratada já tem as
+    # categorias pouco frequentes agrupadas em "Outros"
+    preparacao = PreparacaoAnuncios(colunas=tuple(colunas)).fit(next(ler_blocos(particoes[:1], colunas_arquivo,
+                                                                                linhas_bloco))[1])
+    percorrer = functools.partial(percorrer_blocos, particoes, preparacao, colunas_arquivo, linhas_bloco,
+                                  proporcao_teste, semente)
+    teste = AmostraTeste(linhas_teste, semente)
+    blocos = linhas_treino = 0
+
+    if modelo == 'floresta':
+        estimador = ExtraTreesRegressor(n_estimators=0, warm_start=True, random_state=semente, n_jobs=-1)
+        for x_treino, y_treino, x_teste, y_teste in percorrer():
+            teste.adicionar(x_teste, y_teste)
+            verificar_memoria(memoria_maxima, estimar_memoria_passo(x_treino, arvores_por_bloco))
+            estimador.set_params(n_estimators=estimador.n_estimators + arvores_por_bloco)
+            estimador.fit(x_treino, y_treino)
+            blocos, linhas_treino = blocos + 1, linhas_treino + x_treino.shape[0]
+            del x_treino, y_treino
+            verificar_memoria(memoria_maxima)
+    elif modelo == 'sgd':
+        padronizacao = StandardScaler()
+        for x_treino, _, x_teste, y_teste in percorrer():
+            teste.adicionar(x_teste, y_teste)
+            verificar_memoria(memoria_maxima, estimar_memoria_passo(x_treino))
+            padronizacao.partial_fit(x_treino)
+            blocos, linhas_treino = blocos + 1, linhas_treino + x_treino.shape[0]
+            verificar_memoria(memoria_maxima)
+        regressao = SGDRegressor(random_state=semente)
+        for _ in range(epocas):
+            for x_treino, y_treino, _, _ in percorrer():
+                verificar_memoria(memoria_maxima, estimar_memoria_passo(x_treino))
+                regressao.partial_fit(padronizacao.transform(x_treino), y_treino)
+                verificar_memoria(memoria_maxima)
+        estimador = Pipeline([('padronizacao', padronizacao), ('regressao', regressao)])
+    else:
+        raise ValueError('Modelo desconhecido: {}'.format(modelo))
+    tempo_treino = timeit.default_timer() - inicio
+
+    x_teste, y_teste = teste.dados()
+    r2, rsme = metricas(y_teste, estimador.predict(x_teste))
+    resultado = {'modo': 'particionado ({})'.format(modelo), 'r2': r2, 'rsme': rsme, 'tempo_treino': tempo_treino,
+                 'linhas_treino': linhas_treino, 'linhas_teste': x_teste.shape[0], 'blocos': blocos,
+                 'linhas_bloco': linhas_bloco, 'memoria_pico_mb': memoria_pico()}
+    if modelo == 'floresta':
+        resultado['tamanho_mb'] = FlorestaPlana.converter(estimador).tamanho_bytes / 1024 ** 2
+    return (Pipeline([('preparacao', preparacao), ('modelo', estimador)]), resultado)
+
+
+# Referência: treino com todas as linhas de treino na memória, avaliado com as mesmas linhas de teste
+def treinar_em_memoria(particoes, proporcao_teste=PROPORCAO_TESTE, linhas_teste=LINHAS_TESTE,
+                       colunas=FEATURES_MODELO, semente=SEMENTE):
+    inicio = timeit.default_timer()
+    colunas_arquivo = colunas_leitura(particoes[0], colunas)
+    preparacao = PreparacaoAnuncios(colunas=tuple(colunas)).fit(next(ler_blocos(particoes[:1], colunas_arquivo))[1])
+    teste = AmostraTeste(linhas_teste, semente)
+    x, y = [], []
+    for x_treino, y_treino, x_teste, y_teste in percorrer_blocos(particoes, preparacao, colunas_arquivo, LINHAS_BLOCO,
+                                                                 proporcao_teste, semente):
+        teste.adicionar(x_teste, y_teste)
+        x.append(x_treino)
+        y.append(y_treino)
+    x, y = pd.concat(x, ignore_index=True), np.concatenate(y)
+
+    estimador = ExtraTreesRegressor(random_state=semente, n_jobs=-1)
+    estimador.fit(x, y)
+    tempo_treino = timeit.default_timer() - inicio
+
+    x_teste, y_teste = teste.dados()
+    r2, rsme = metricas(y_teste, estimador.predict(x_teste))
+    return (Pipeline([('preparacao', preparacao), ('modelo', estimador)]),
+            {'modo': 'em memória', 'r2': r2, 'rsme': rsme, 'tempo_treino': tempo_treino,
+             'linhas_treino': x.shape[0], 'linhas_teste': x_teste.shape[0], 'memoria_pico_mb': memoria_pico(),
+             'tamanho_mb': FlorestaPlana.converter(estimador).tamanho_bytes / 1024 ** 2})
+
+
+# Executa um modo de treino (executado em um processo próprio, para que o pico de memória não se misture)
+def executar_modo(modo, particoes, parametros):
+    if modo == 'memoria':
+        return treinar_em_memoria(particoes)[1]
+    return treinar_particionado(particoes, modo, **parametros)[1]
+
+
+# Compara os modos de treino, um processo novo por modo, um após o outro. Retorna a tabela de resultados
+def comparar_modos(particoes, modos=('floresta', 'sgd', 'memoria'), **parametros):
+    resultados = []
+    for modo in modos:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            resultados.append(executor.submit(executar_modo, modo, particoes, parametros).result())
+    return pd.DataFrame(resultados).set_index('modo')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Treino do modelo lendo a base tratada em blocos')
+    parser.add_argument('--particoes', default=str(PASTA_PARTICOES), help='pasta com as partições Parquet')
+    parser.add_argument('--modelo', default='floresta', choices=['floresta', 'sgd'])
+    parser.add_argument('--memoria-maxima', type=float, default=MEMORIA_MAXIMA, help='limite de memória, em MB')
+    parser.add_argument('--linhas-bloco', type=int, default=LINHAS_BLOCO, help='tamanho máximo de um bloco')
+    parser.add_argument('--arvores-por-bloco', type=int, default=ARVORES_POR_BLOCO)
+    parser.add_argument('--epocas', type=int, default=EPOCAS, help='épocas do SGDRegressor')
+    parser.add_argument('--comparar', action='store_true',
+                        help='compara os modos particionados com o treino com a base inteira na memória')
+    parser.add_argument('--saida-modelo', default=None, help='arquivo do modelo treinado (Pipeline)')
+    args = parser.parse_args()
+
+    particoes = listar_particoes(args.particoes)
+    parametros = {'memoria_maxima': args.memoria_maxima, 'linhas_bloco': args.linhas_bloco,
+                  'arvores_por_bloco': args.arvores_por_bloco, 'epocas': args.epocas}
+    if args.comparar:
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(comparar_modos(particoes, **parametros).round(4))
+    else:
+        pipeline, resultado = treinar_particionado(particoes, args.modelo, **parametros)
+        print(pd.Series(resultado).to_string())
+        if args.saida_modelo is not None:
+            print('Modelo salvo: {}'.format(exportar_modelo_mmap(pipeline, args.saida_modelo)))